@@ -30,9 +30,13 @@ interface DiagramDocument {
   text: string;
   filename: string;
   source_display_name: string;
-  svg_content: string;
+  svg_content: string; // includeSvg=false 时为空，按需从 svg_url 加载
   source_url: string;
   metadata: Record<string, any>;
+  svg_hash?: string;
+  thumbnail_url?: string; // 有栅格图时才有 (db_initializer/build_rasters.py)
+  tiles_url?: string;
+  svg_url?: string;
   [key: string]: any;
 }
 
@@ -493,13 +497,16 @@ Return ONLY a valid JSON object with the following structure. NO MARKDOWN, NO EX
       
       try {
         // 使用LLM生成的关键词检索图表
-        diagramContext = await retrieveDiagrams(diagramAnalysis.keywords, 3);
+        // 传入之前的对话，由图表服务把上下文混入查询向量
+        diagramContext = await retrieveDiagrams(diagramAnalysis.keywords, 3, messages.slice(0, -1));
         console.log(`检索到 ${diagramContext.documents.length} 个相关图表`);
         
         // 新增：验证检索到的图表数据
         diagramContext.documents.forEach((doc, idx) => {
           console.log(`检索到的图表 ${idx+1}: ${doc.source_display_name || doc.filename || 'unnamed'}`);
-          if (!doc.svg_content) {
+          if (!doc.svg_content && doc.svg_url) {
+            console.log(`图表 ${idx+1} 按需加载SVG: ${doc.svg_url}${doc.thumbnail_url ? '，有缩略图' : ''}`);
+          } else if (!doc.svg_content) {
             console.error(`图表 ${idx+1} 缺少svg_content字段!`);
           } else if (doc.svg_content.length < 50) {
             console.error(`图表 ${idx+1} svg_content异常短: ${doc.svg_content.length}字符`);
@@ -525,7 +532,9 @@ Return ONLY a valid JSON object with the following structure. NO MARKDOWN, NO EX
       
       // 验证图表SVG内容
       diagramContext.documents.forEach((doc, idx) => {
-        if (!doc.svg_content || doc.svg_content.length < 50) {
+        if (!doc.svg_content && doc.svg_url) {
+          console.log(`图表 ${idx+1} 由前端按需加载, 标题: ${doc.source_display_name || doc.filename || "未命名"}`);
+        } else if (!doc.svg_content || doc.svg_content.length < 50) {
           console.warn(`图表 ${idx+1} SVG内容异常，长度: ${doc.svg_content?.length || 0}`);
         } else if (!doc.svg_content.includes('<svg')) {
           console.warn(`图表 ${idx+1} 不包含有效的SVG标签`);
@@ -744,12 +753,18 @@ Generate an enhanced version of the initial answer that integrates references to
       index: index + 1,
       title: doc.source_display_name || doc.filename || `BIAN Diagram ${index + 1}`,
       svg_content: doc.svg_content, // 注意：这里使用svg_content匹配前端DiagramDocument类型
-      source_url: doc.source_url
+      source_url: doc.source_url,
+      svg_hash: doc.svg_hash,
+      thumbnail_url: doc.thumbnail_url,
+      tiles_url: doc.tiles_url,
+      svg_url: doc.svg_url
     }));
     
     // 验证转换后的图表数据
     diagramData.forEach((diagram, idx) => {
-      if (!diagram.svg_content || diagram.svg_content.length < 50) {
+      if (!diagram.svg_content && diagram.svg_url) {
+        console.log(`转换后的图表 ${idx+1} 使用按需加载: ${diagram.thumbnail_url || diagram.svg_url}`);
+      } else if (!diagram.svg_content || diagram.svg_content.length < 50) {
         console.warn(`转换后的图表 ${idx+1} SVG数据异常短或为空，长度: ${diagram.svg_content?.length || 0}`);
       } else if (typeof diagram.svg_content === 'string' && !diagram.svg_content.includes('<svg')) {
         console.warn(`转换后的图表 ${idx+1} 可能不包含有效的SVG标签`);
@@ -791,7 +806,7 @@ Generate an enhanced version of the initial answer that integrates references to
             // 验证每个图表的SVG内容
             diagramData.forEach((diagram, idx) => {
               console.log(`流响应中的图表 ${idx + 1}: 标题=${diagram.title}, SVG长度=${diagram.svg_content?.length || 'undefined'}`);
-              if (!diagram.svg_content || !diagram.svg_content.includes('<svg')) {
+              if (!diagram.svg_url && (!diagram.svg_content || !diagram.svg_content.includes('<svg'))) {
                 console.warn(`流响应中的图表 ${idx + 1} SVG内容无效或为空`);
               }
             });
@@ -880,9 +895,17 @@ const retrieveData = async (
   return await response.json() as RetrievalContext;
 };
 
+// 浏览器访问图表服务的地址 (缩略图、瓦片、SVG)。DIAGRAM_API_URL 可能是容器内地址，
+// 此时用 DIAGRAM_PUBLIC_API_URL 指定公开地址
+const diagramPublicApiBase = (): string => {
+  const base = process.env.DIAGRAM_PUBLIC_API_URL || (process.env.DIAGRAM_API_URL || "").replace(/\/retrieve_diagrams\/?$/, "");
+  return base.replace(/\/+$/, "");
+};
+
 const retrieveDiagrams = async (
   keywords: string,
-  numResults: number = 3
+  numResults: number = 3,
+  previousMessages: CoreMessage[] = []
 ): Promise<DiagramRetrievalResponse> => {
   try {
     const diagramApiUrl = process.env.DIAGRAM_API_URL;
@@ -894,16 +917,27 @@ const retrieveDiagrams = async (
     
     console.log(`Retrieving diagrams from: ${diagramApiUrl}`);
     
+    const payload: any = {
+      question: keywords,
+      numResults,
+      rerank: true,
+      // 默认不内联几 MB 的SVG，前端先显示缩略图，放大时再按需加载
+      includeSvg: process.env.DIAGRAM_INLINE_SVG === "true",
+    };
+
+    if (previousMessages.length > 0) {
+      payload.useContext = true;
+      payload.context = {
+        messages: previousMessages.map((message) => ({"role": message.role, "content": message.content})),
+      };
+    }
+
     const response = await fetch(diagramApiUrl, {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
       },
-      body: JSON.stringify({
-        question: keywords,
-        numResults,
-        rerank: true,
-      }),
+      body: JSON.stringify(payload),
     });
 
     if (!response.ok) {
@@ -930,13 +964,23 @@ const retrieveDiagrams = async (
             
             // 也可以尝试从SVG内容中提取文本节点分析标题
             
+            const svgHash: string | undefined = doc.metadata?.svg_hash;
+            const diagramBase = svgHash ? `${diagramPublicApiBase()}/diagrams/${svgHash}` : "";
+            
             return {
               text: doc.text || "",
               filename: doc.filename || "",
               source_display_name: betterName, // 使用改进的名称
               svg_content: doc.svg_content || "",
               source_url: doc.source_url || "",
-              metadata: doc.metadata || {}
+              metadata: doc.metadata || {},
+              svg_hash: svgHash,
+              thumbnail_url: svgHash && doc.metadata?.raster ? `${diagramBase}/thumbnail` : undefined,
+              tiles_url: svgHash && doc.metadata?.raster ? `${diagramBase}/tiles` : undefined,
+              // 非默认版本的图表只在其所在集合中，/svg 需要带上集合名
+              svg_url: svgHash
+                ? `${diagramBase}/svg${doc.metadata?.collection ? `?collection=${encodeURIComponent(doc.metadata.collection)}` : ""}`
+                : undefined
             };
           })
         : []
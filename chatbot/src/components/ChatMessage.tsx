@@ -108,6 +108,9 @@ const ChatMessage: React.FC<ChatMessageProps> = ({ content, diagrams }) => {
                 svgContent={segment.diagram.svg_content}
                 title={segment.diagram.source_display_name || segment.diagram.filename || `BIAN Diagram ${segment.diagramIndex}`}
                 sourceUrl={segment.diagram.source_url || ''}
+                thumbnailUrl={segment.diagram.thumbnail_url}
+                tilesUrl={segment.diagram.tiles_url}
+                svgUrl={segment.diagram.svg_url}
                 index={segment.diagramIndex || 0} // Use original index
               />
             </div>
@@ -1,41 +1,131 @@
 import React, { useState, useEffect } from 'react';
 import DOMPurify from 'dompurify';
-import { X, ZoomIn, ExternalLink } from 'lucide-react';
+import { X, ZoomIn, ZoomOut, ExternalLink } from 'lucide-react';
 
 interface DiagramProps {
   svgContent: string;
   title: string;
   sourceUrl: string;
   index: number;
+  // svgContent 为空时按需加载: 预览用缩略图，放大用瓦片，继续放大才加载完整SVG
+  thumbnailUrl?: string;
+  tilesUrl?: string;
+  svgUrl?: string;
 }
 
-const DiagramViewer: React.FC<DiagramProps> = ({ svgContent, title, sourceUrl, index }) => {
+// 图表服务 /diagrams/{svg_hash}/tiles 返回的瓦片金字塔描述
+interface TileLevel {
+  z: number;
+  width: number;
+  height: number;
+  cols: number;
+  rows: number;
+}
+
+interface TileManifest {
+  tile_size: number;
+  width: number;
+  height: number;
+  levels: TileLevel[]; // 按 z 升序，z 越大越清晰
+}
+
+const DiagramViewer: React.FC<DiagramProps> = ({ svgContent, title, sourceUrl, index, thumbnailUrl, tilesUrl, svgUrl }) => {
   const [isZoomed, setIsZoomed] = useState(false);
   const [sanitizedSvg, setSanitizedSvg] = useState<string>('');
   const [svgError, setSvgError] = useState<string | null>(null);
+  const [loadedSvg, setLoadedSvg] = useState<string>('');
+  const [manifest, setManifest] = useState<TileManifest | null>(null);
+  const [tileLevel, setTileLevel] = useState<number>(0);
+  const [showSvg, setShowSvg] = useState(false); // 放大超过最清晰的瓦片后改用完整SVG
+  const content = svgContent || loadedSvg;
+  const useTiles = !svgContent && !!manifest && !showSvg;
+  const maxTileLevel = manifest ? manifest.levels.length - 1 : 0;
+
+  // 需要矢量图时才加载SVG: 没有缩略图可用，或者放大超过了瓦片的清晰度
+  useEffect(() => {
+    if (svgContent || loadedSvg || !svgUrl) return;
+    if (thumbnailUrl && !showSvg && !(isZoomed && !tilesUrl)) return;
+    let cancelled = false;
+    console.log(`Diagram ${index}: 加载SVG ${svgUrl}`);
+    fetch(svgUrl)
+      .then((response) => {
+        if (!response.ok) throw new Error(`${response.status} ${response.statusText}`);
+        return response.text();
+      })
+      .then((text) => { if (!cancelled) setLoadedSvg(text); })
+      .catch((err) => {
+        console.error(`Diagram ${index}: 加载SVG失败:`, err);
+        if (!cancelled) setSvgError(`加载SVG失败: ${err}`);
+      });
+    return () => { cancelled = true; };
+  }, [svgContent, loadedSvg, svgUrl, thumbnailUrl, tilesUrl, showSvg, isZoomed, index]);
+
+  // 打开放大视图时加载瓦片描述，选择宽度刚好铺满视图的一级
+  useEffect(() => {
+    if (!isZoomed || svgContent || manifest || !tilesUrl) return;
+    let cancelled = false;
+    fetch(tilesUrl)
+      .then((response) => {
+        if (!response.ok) throw new Error(`${response.status} ${response.statusText}`);
+        return response.json();
+      })
+      .then((data: TileManifest) => {
+        if (cancelled) return;
+        const targetWidth = Math.min(window.innerWidth - 64, 1024) * (window.devicePixelRatio || 1);
+        const fitting = data.levels.findIndex((level) => level.width >= targetWidth);
+        setTileLevel(fitting === -1 ? data.levels.length - 1 : fitting);
+        setManifest(data);
+      })
+      .catch((err) => {
+        // 没有瓦片时直接显示SVG
+        console.warn(`Diagram ${index}: 加载瓦片失败，改用SVG:`, err);
+        if (!cancelled) setShowSvg(true);
+      });
+    return () => { cancelled = true; };
+  }, [isZoomed, svgContent, manifest, tilesUrl, index]);
+
+  const zoomIn = () => {
+    if (tileLevel < maxTileLevel) {
+      setTileLevel(tileLevel + 1);
+    } else if (svgUrl) {
+      setShowSvg(true);
+    }
+  };
+
+  const zoomOut = () => {
+    if (showSvg && manifest) {
+      setShowSvg(false);
+    } else if (tileLevel > 0) {
+      setTileLevel(tileLevel - 1);
+    }
+  };
 
   // 在组件初始化时打印SVG内容信息
   useEffect(() => {
-    if (!svgContent) {
+    if (!content) {
+      if (svgUrl) {
+        // 按需加载，等待缩略图或SVG
+        return;
+      }
       console.error(`Diagram ${index}: 没有收到SVG内容`);
       setSvgError('没有收到SVG内容');
       return;
     }
     
-    console.log(`Diagram ${index}: 收到SVG内容，长度为 ${svgContent.length} 字符`);
-    if (svgContent.length < 100) {
-      console.warn(`Diagram ${index}: SVG内容异常短: ${svgContent}`);
+    console.log(`Diagram ${index}: 收到SVG内容，长度为 ${content.length} 字符`);
+    if (content.length < 100) {
+      console.warn(`Diagram ${index}: SVG内容异常短: ${content}`);
     }
     
     // 检查SVG有效性
-    if (!svgContent.includes('<svg')) {
+    if (!content.includes('<svg')) {
       console.error(`Diagram ${index}: 内容中没有找到<svg>标签`);
       setSvgError('SVG内容无效，没有找到<svg>标签');
     }
     
     // 尝试清理SVG
     try {
-      const cleaned = sanitizeSvg(svgContent);
+      const cleaned = sanitizeSvg(content);
       setSanitizedSvg(cleaned);
       console.log(`Diagram ${index}: 清理后的SVG长度为 ${cleaned.length} 字符`);
       
@@ -48,7 +138,7 @@ const DiagramViewer: React.FC<DiagramProps> = ({ svgContent, title, sourceUrl, i
       console.error(`Diagram ${index}: 清理SVG时出错:`, err);
       setSvgError(`清理SVG时出错: ${err}`);
     }
-  }, [svgContent, index]);
+  }, [content, svgUrl, index]);
 
   // 配置 DOMPurify 安全策略 - 扩展以支持更多SVG元素和属性
   const sanitizeSvg = (svg: string) => {
@@ -105,7 +195,7 @@ const DiagramViewer: React.FC<DiagramProps> = ({ svgContent, title, sourceUrl, i
   const renderAsFallback = () => {
     try {
       // 创建blob URL
-      const blob = new Blob([svgContent], { type: 'image/svg+xml' });
+      const blob = new Blob([content], { type: 'image/svg+xml' });
       const svgUrl = URL.createObjectURL(blob);
       
       return (
@@ -126,6 +216,40 @@ const DiagramViewer: React.FC<DiagramProps> = ({ svgContent, title, sourceUrl, i
     }
   };
 
+  // 当前级别的瓦片按网格绝对定位，按设备像素比缩放为CSS像素；视图外的瓦片延迟加载
+  const renderTiles = () => {
+    if (!manifest || !tilesUrl) return null;
+    const level = manifest.levels[tileLevel];
+    const ratio = window.devicePixelRatio || 1;
+    const size = manifest.tile_size;
+    const tiles = [];
+    for (let y = 0; y < level.rows; y++) {
+      for (let x = 0; x < level.cols; x++) {
+        tiles.push(
+          <img
+            key={`${level.z}-${x}-${y}`}
+            src={`${tilesUrl}/${level.z}/${x}/${y}`}
+            alt=""
+            loading="lazy"
+            draggable={false}
+            className="absolute max-w-none"
+            style={{
+              left: (x * size) / ratio,
+              top: (y * size) / ratio,
+              width: Math.min(size, level.width - x * size) / ratio,
+              height: Math.min(size, level.height - y * size) / ratio,
+            }}
+          />
+        );
+      }
+    }
+    return (
+      <div className="relative mx-auto" style={{ width: level.width / ratio, height: level.height / ratio }} aria-label={title}>
+        {tiles}
+      </div>
+    );
+  };
+
   return (
     <>
       <div className="border border-gray-300 dark:border-gray-700 rounded-md p-4 my-3 bg-gray-50 dark:bg-gray-800 shadow-sm overflow-hidden">
@@ -147,10 +271,17 @@ const DiagramViewer: React.FC<DiagramProps> = ({ svgContent, title, sourceUrl, i
         </div>
         */}
         
-        {svgError ? (
+        {thumbnailUrl && !svgContent ? (
+          <div 
+            className="overflow-auto max-h-60 bg-white dark:bg-gray-700 p-2 rounded cursor-pointer mb-2" 
+            onClick={() => setIsZoomed(true)}
+          >
+            <img src={thumbnailUrl} alt={title} loading="lazy" decoding="async" className="w-full h-auto" />
+          </div>
+        ) : svgError ? (
           <div className="text-red-500 mb-2">
             错误: {svgError}
-            <div className="mt-2">{renderAsFallback()}</div>
+            <div className="mt-2">{content && renderAsFallback()}</div>
           </div>
         ) : (
           <div 
@@ -195,15 +326,42 @@ const DiagramViewer: React.FC<DiagramProps> = ({ svgContent, title, sourceUrl, i
             >
               <X className="w-5 h-5" />
             </button>
-            <div className="bg-white dark:bg-gray-700 p-4 rounded-lg"> 
-              {svgError ? (
+            {manifest && !svgContent && (
+              <div className="flex space-x-2 mb-2">
+                <button
+                  onClick={zoomOut}
+                  disabled={!showSvg && tileLevel === 0}
+                  className="p-1 text-gray-500 hover:text-gray-700 dark:text-gray-400 dark:hover:text-white disabled:opacity-30 transition-colors"
+                  title="Zoom out"
+                >
+                  <ZoomOut className="w-5 h-5" />
+                </button>
+                <button
+                  onClick={zoomIn}
+                  disabled={showSvg || (tileLevel === maxTileLevel && !svgUrl)}
+                  className="p-1 text-gray-500 hover:text-gray-700 dark:text-gray-400 dark:hover:text-white disabled:opacity-30 transition-colors"
+                  title="Zoom in"
+                >
+                  <ZoomIn className="w-5 h-5" />
+                </button>
+              </div>
+            )}
+            <div className="bg-white dark:bg-gray-700 p-4 rounded-lg overflow-auto"> 
+              {useTiles ? (
+                renderTiles()
+              ) : svgError ? (
                 <div>
                   <div className="text-red-500 mb-4">错误: {svgError}</div>
-                  {renderAsFallback()}
+                  {content && renderAsFallback()}
                 </div>
               ) : (
                 sanitizedSvg ? (
-                  <div className="svg-container w-full max-w-full overflow-auto" dangerouslySetInnerHTML={{ __html: sanitizedSvg.replace('<svg', '<svg width="100%" height="100%" preserveAspectRatio="xMidYMid meet"') }} />
+                  <div
+                    className="svg-container w-full max-w-full overflow-auto"
+                    /* 从最清晰的瓦片继续放大时，SVG 以两倍宽度显示 */
+                    style={manifest && showSvg ? { width: (manifest.width / (window.devicePixelRatio || 1)) * 2, maxWidth: 'none' } : undefined}
+                    dangerouslySetInnerHTML={{ __html: sanitizedSvg.replace('<svg', '<svg width="100%" height="100%" preserveAspectRatio="xMidYMid meet"') }}
+                  />
                 ) : (
                   <div className="flex justify-center items-center h-40">
                     <div className="animate-spin rounded-full h-12 w-12 border-b-2 border-blue-500"></div>
@@ -6,6 +6,11 @@ export interface DiagramDocument {
   svg_content: string;
   source_url: string;
   metadata: Record<string, any>;
+  // 图表服务以 includeSvg=false 检索时 svg_content 为空，改为按需加载以下地址
+  svg_hash?: string;
+  thumbnail_url?: string;
+  tiles_url?: string;
+  svg_url?: string;
 }
 
 export interface DiagramRetrievalResponse {
@@ -1,16 +1,35 @@
 import os
+import asyncio
 import json
 import logging
+import time
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel, Field
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sentence_transformers import SentenceTransformer
-import chromadb
-from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+from fastapi.responses import FileResponse, Response, StreamingResponse
 import tarfile
 import shutil
 
+from cache import LRUCache
+from capability_graph import NODE_KINDS, CapabilityGraph
+from conversation import ConversationContext
+from corpora import (
+    COLLECTION_MEMORY_BUDGET_MB, DEFAULT_COLLECTION, Corpus, CorpusRegistry, UnknownCollection,
+    artifact_path, collection_name, list_collections,
+)
+from diagram_links import DiagramLinkIndex
+from encoders import load_encoder
+from vector_store import VECTOR_BACKEND, open_vector_store
+from filters import BITMAP_KEYS, FILTER_FIELDS, FilterIndex, compile_where
+from rasters import MANIFEST_FILE, RASTER_MEDIA_TYPE, THUMBNAIL_FILE, is_svg_hash, raster_dir, tile_path
+from serialization import NDJSON_MEDIA_TYPE, cached_fragments, fetch_fragments, render_document, retrieval_body
+from profiling import monitor_event_loop_lag, router as admin_router
+from telemetry import (
+    REQUEST_SECONDS, REQUESTS_IN_FLIGHT, RESPONSE_BYTES, RESULTS_RETURNED, SERVER_TIMING_ENABLED,
+    RequestTimings, log_request, metrics_response_body,
+)
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -19,14 +38,28 @@ logging.basicConfig(
 )
 
 # 常量定义
-COLLECTION_NAME = "bian_diagrams"
+COLLECTION_NAME = DEFAULT_COLLECTION  # 请求未指定 version / collection 时使用，启动时加载且不会被淘汰
 # 从环境变量获取挂载路径，默认为本地开发时的相对路径
 CHROMA_DB_VOLUME_MOUNT_PATH = os.getenv("CHROMA_VOLUME_MOUNT_PATH", "./chroma_db") 
 CHROMA_DB_PATH = os.path.join(CHROMA_DB_VOLUME_MOUNT_PATH, "diagrams_db") 
+# VECTOR_BACKEND=numpy 时使用 db_initializer/export_numpy_index.py 导出的精确检索索引
+# (其他集合的索引与关联索引路径中插入集合名，见 corpora.artifact_path)
+NUMPY_INDEX_PATH = os.getenv("NUMPY_INDEX_PATH", os.path.join(CHROMA_DB_PATH, "numpy_index"))
 # 不在这里创建目录，让 setup_database 控制
 # os.makedirs(CHROMA_DB_PATH, exist_ok=True) 
 MODEL_NAME = "all-MiniLM-L6-v2"
 TOP_K = 1  # 默认返回的图表数量
+# 注入阶段由 db_initializer/build_capability_graph.py 生成，随数据库一起部署
+CAPABILITY_GRAPH_PATH = os.getenv("CAPABILITY_GRAPH_PATH", os.path.join(CHROMA_DB_PATH, "capability_graph.json"))
+LINK_INDEX_PATH = os.getenv("LINK_INDEX_PATH", os.path.join(CHROMA_DB_PATH, "diagram_links.json"))
+# db_initializer/build_rasters.py 生成的缩略图和瓦片 (按 svg_hash 存放，所有集合共用)
+RASTER_PATH = os.getenv("RASTER_PATH", os.path.join(CHROMA_DB_PATH, "rasters"))
+# 缩略图、瓦片和 SVG 都以内容哈希寻址，内容不变 URL 不变，可以永久缓存
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))  # 缓存的查询向量数量
+
+# 相同关键词 (route.ts 经常重复生成) 的查询向量缓存
+query_embedding_cache = LRUCache("query_embedding", EMBEDDING_CACHE_SIZE)
 
 # --- setup_database 函数定义 ---
 def setup_database():
@@ -125,11 +158,24 @@ def setup_database():
         raise
 
 # 定义输入模型
+class DiagramFilters(BaseModel):
+    semantic: Optional[List[str]] = Field(None, description="只返回这些 bizzsemantic 类型的图表")
+    concept: Optional[List[str]] = Field(None, description="只返回这些 bizzconcept 的图表")
+    bizzid: Optional[List[str]] = Field(None, description="只返回这些 bizzid 的图表")
+    landscapeVersion: Optional[List[str]] = Field(None, description="只返回这些 BIAN landscape 版本的图表, 例如 '12-0-0'")
+
 class RetrieveDiagramsRequest(BaseModel):
     question: str = Field(..., description="用户查询")
     numResults: int = Field(TOP_K, description="要返回的结果数量")
     rerank: bool = Field(True, description="是否重新排序结果")
-    context: Optional[Dict[str, Any]] = Field(None, description="可选的对话上下文")
+    context: Optional[Dict[str, Any]] = Field(None, description="可选的对话上下文: {messages: [{role, content}], conversationId?}")
+    useContext: bool = Field(False, description="是否把对话上下文混入查询向量")
+    filters: Optional[DiagramFilters] = Field(None, description="可选的元数据过滤条件 (在向量检索内部执行)")
+    related: int = Field(0, ge=0, le=10, description="为每个结果附带的关联图表数量 (查关联索引，不做额外向量检索)")
+    stream: bool = Field(False, description="以 application/x-ndjson 流式返回，每行一个 DiagramDocument (也可通过 Accept 头选择)")
+    includeSvg: bool = Field(True, description="为 false 时 svg_content 为空，metadata 带 svg_hash 和 raster，客户端通过 /diagrams/{svg_hash}/... 按需加载")
+    version: Optional[str] = Field(None, description="BIAN landscape 版本, 例如 '13-0-0' (检索集合 bian_diagrams_13-0-0)")
+    collection: Optional[str] = Field(None, description="直接指定集合名 (优先于 version)，例如客户自定义语料")
 
 # 定义输出文档模型
 class DiagramDocument(BaseModel):
@@ -143,6 +189,7 @@ class DiagramDocument(BaseModel):
 # 定义响应模型
 class DiagramRetrievalResponse(BaseModel):
     documents: List[DiagramDocument] = Field(..., description="检索到的图表文档")
+    related: List[DiagramDocument] = Field(default_factory=list, description="关联图表 (metadata 中的 related_to 指向对应结果)")
 
 # 创建 FastAPI 应用
 app = FastAPI(
@@ -160,25 +207,55 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 管理员诊断端点 (/admin/profile, /admin/tracemalloc, /admin/loop_lag)
+app.include_router(admin_router)
+
+# 请求并发与端到端延迟
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    REQUESTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = "500"
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+        return response
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        # 使用路由模板作为标签，避免任意 URL 造成标签基数膨胀
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        REQUEST_SECONDS.labels(path=path, status=status).observe(time.perf_counter() - start)
+
 # 加载嵌入模型和数据库的函数
 @app.on_event("startup")
 async def startup_event():
-    global embedding_function, client, collection
+    global embedding_function, corpus_registry, conversation_context, capability_graph
     
     try:
         # --- 首先调用 setup_database ---
         setup_database() 
         
         logging.info(f"Loading embedding model: {MODEL_NAME}...")
-        embedding_function = SentenceTransformerEmbeddingFunction(model_name=MODEL_NAME)
+        # ENCODER_BACKEND=onnx 时使用导出的 ONNX 模型，启动时不导入 torch
+        embedding_function = load_encoder(model_name=MODEL_NAME)
+        conversation_context = ConversationContext(embedding_function)
+        
+        logging.info(f"Opening {VECTOR_BACKEND} vector store at path: {CHROMA_DB_PATH}")
+        # 默认集合在启动时加载并固定，其他版本的集合在首次请求时惰性加载
+        corpus_registry = CorpusRegistry(open_corpus)
+        corpus_registry.pin(COLLECTION_NAME)
         
-        logging.info(f"Initializing ChromaDB client at path: {CHROMA_DB_PATH}")
-        # setup_database 确保了目录存在，无需再次创建
-        client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+        # 业务能力图谱为可选数据，缺失时 /capabilities 返回 503
+        capability_graph = None
+        if os.path.exists(CAPABILITY_GRAPH_PATH):
+            capability_graph = CapabilityGraph.load(CAPABILITY_GRAPH_PATH)
+            logging.info(f"Capability graph loaded: {len(capability_graph)} nodes, {capability_graph.edge_count} edges")
+        else:
+            logging.warning(f"Capability graph not found at {CAPABILITY_GRAPH_PATH}, /capabilities disabled")
         
-        logging.info(f"Getting collection: {COLLECTION_NAME}")
-        # 现在 setup_database 已经运行，get_collection 应该能成功
-        collection = client.get_collection(name=COLLECTION_NAME)
+        # 持续测量事件循环延迟 (保留引用，避免任务被垃圾回收)
+        app.state.loop_lag_task = asyncio.create_task(monitor_event_loop_lag())
         
         logging.info("Startup completed successfully.")
     except Exception as e:
@@ -186,49 +263,344 @@ async def startup_event():
         # 再次抛出，确保启动失败能被捕获
         raise
 
+def open_corpus(name: str) -> Corpus:
+    """打开集合及其附属索引 (由 CorpusRegistry 在首次使用时调用)"""
+    if name != COLLECTION_NAME and name not in list_collections(VECTOR_BACKEND, CHROMA_DB_PATH, NUMPY_INDEX_PATH):
+        raise UnknownCollection(name)
+    # setup_database 确保了目录存在，无需再次创建；Chroma 后端通过 get_collection 打开集合，
+    # 多个集合共用一个客户端，HNSW 段缓存与集合 LRU 使用同一内存预算
+    store = open_vector_store(
+        VECTOR_BACKEND, CHROMA_DB_PATH, name, artifact_path(NUMPY_INDEX_PATH, name),
+        memory_limit_bytes=COLLECTION_MEMORY_BUDGET_MB * 1024 * 1024,
+    )
+    # 预计算过滤位图 (位序与向量存储的行序一致)
+    filter_index = FilterIndex.build(store)
+    # 图表关联索引可选，缺失时 related 选项不返回任何关联图表
+    link_index = None
+    link_index_path = artifact_path(LINK_INDEX_PATH, name)
+    if os.path.exists(link_index_path):
+        link_index = DiagramLinkIndex.load(link_index_path)
+        logging.info(f"Diagram link index loaded for {name}: {len(link_index)} diagrams")
+    else:
+        logging.warning(f"Diagram link index not found at {link_index_path}, related expansion disabled for {name}")
+    return Corpus(name, store, filter_index, link_index)
+
+async def resolve_corpus(version: Optional[str], collection: Optional[str]) -> Corpus:
+    """请求参数 -> 已打开的集合；首次使用的集合在线程池中加载，不阻塞事件循环"""
+    try:
+        name = collection_name(version, collection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    corpus = corpus_registry.loaded(name)
+    if corpus is not None:
+        return corpus
+    try:
+        return await asyncio.to_thread(corpus_registry.get, name)
+    except UnknownCollection:
+        raise HTTPException(status_code=404, detail=f"Collection {name} not found")
+
+def embed_query(text: str) -> List[float]:
+    """计算查询向量，重复的查询直接命中缓存"""
+    vector = query_embedding_cache.get(text)
+    if vector is None:
+        vector = embedding_function([text])[0]
+        vector = vector.tolist() if hasattr(vector, "tolist") else list(vector)
+        query_embedding_cache.put(text, vector)
+    return vector
+
+def plan_documents(ids: List[str], related_ids: List[tuple], include_svg: bool = True,
+                   collection: Optional[str] = None) -> List[tuple]:
+    """按输出顺序列出 (id, 是否为关联图表, 显示名称, 额外元数据)"""
+    plan = [(doc_id, False, f"BIAN Diagram {i+1}", None) for i, doc_id in enumerate(ids)]
+    plan += [
+        (neighbor, True, f"Related BIAN Diagram {i+1}", {"related_to": f"diagram_{related_to}.svg", "relation": relation})
+        for i, (neighbor, related_to, relation) in enumerate(related_ids)
+    ]
+    if not include_svg:
+        # 不内联 SVG 时告诉客户端去哪里取: 有栅格图时先显示缩略图，否则按需加载 /svg
+        # (/svg 需要 ?collection= 才能在非默认集合中找到该图表)
+        plan = [
+            (doc_id, is_related, display_name, {
+                **(extra_metadata or {}),
+                "svg_hash": doc_id,
+                "collection": collection,
+                "raster": os.path.exists(os.path.join(raster_dir(RASTER_PATH, doc_id), MANIFEST_FILE)),
+            })
+            for doc_id, is_related, display_name, extra_metadata in plan
+        ]
+    return plan
+
+def finish_request(event: Dict[str, Any], returned: int, related: int, response_bytes: int, timings: RequestTimings):
+    RESULTS_RETURNED.observe(returned)
+    RESPONSE_BYTES.labels(path="/retrieve_diagrams").observe(response_bytes)
+    log_request({**event, "returned": returned, "related": related, "response_bytes": response_bytes}, timings)
+
+def stream_documents(corpus: Corpus, plan: List[tuple], event: Dict[str, Any], timings: RequestTimings,
+                     include_svg: bool = True):
+    """
+    NDJSON: 每解析出一个文档就输出一行。缓存未命中时先单独读取第一条，
+    尽早发出首字节，之后其余未命中的文档合并为一次读取
+    (同步生成器，由 Starlette 在线程池中迭代，不阻塞事件循环)
+    """
+    returned = related = size = 0
+    fragments = cached_fragments((doc_id for doc_id, _, _, _ in plan), corpus.name)
+    attempted = set(fragments)
+    try:
+        for position, (doc_id, is_related, display_name, extra_metadata) in enumerate(plan):
+            if doc_id not in attempted:
+                pending = [doc_id] if not returned + related else [
+                    pending_id for pending_id, _, _, _ in plan[position:] if pending_id not in attempted
+                ]
+                with timings.stage("fetch"):
+                    fragments.update(fetch_fragments(corpus.store, pending, corpus.name))
+                attempted.update(pending)
+            fragment = fragments.get(doc_id)
+            if fragment is None:
+                continue
+            line = render_document(fragment, display_name, extra_metadata, include_svg) + b"\n"
+            if is_related:
+                related += 1
+            else:
+                returned += 1
+            size += len(line)
+            yield line
+    except Exception as e:
+        # 响应头已发出，无法再返回 500，只能记录并结束流
+        logging.error(f"Error streaming diagrams: {e}")
+    finally:
+        finish_request(event, returned, related, size, timings)
+
 # 检索图表端点
 @app.post("/retrieve_diagrams", response_model=DiagramRetrievalResponse)
-async def retrieve_diagrams(request: RetrieveDiagramsRequest):
+async def retrieve_diagrams(request: RetrieveDiagramsRequest, http_request: Request):
+    timings = RequestTimings()
+    with timings.stage("collection"):
+        corpus = await resolve_corpus(request.version, request.collection)
+    filter_index = corpus.filter_index
     try:
-        logging.info(f"Received query: {request.question}")
-        
-        results = collection.query(
-            query_texts=[request.question],
-            n_results=request.numResults
-        )
-        
-        if not results or not results['ids'] or len(results['ids'][0]) == 0:
+        # 过滤条件在检索内部执行 (Chroma where / NumPy 掩码)，位图给出命中数量:
+        # 命中为空时直接跳过向量化和检索，否则 n_results 不超过命中数量
+        where = None
+        n_results = request.numResults
+        if request.filters:
+            filters = request.filters.model_dump(exclude_none=True)
+            where = compile_where(filters)
+            if where is not None:
+                n_results = min(n_results, filter_index.count(filters))
+
+        ids = []
+        if n_results > 0:
+            # 各阶段分开计时: 向量化 -> 向量检索 (只取 id) -> 元数据读取 -> 序列化
+            with timings.stage("embed"):
+                query_embedding = embed_query(request.question)
+
+            if request.useContext and request.context:
+                # 历史消息向量按会话缓存，每轮通常只需新编码一条
+                with timings.stage("context"):
+                    query_embedding = conversation_context.blend(
+                        request.question,
+                        query_embedding,
+                        request.context.get("messages") or [],
+                        conversation_id=request.context.get("conversationId"),
+                    )
+
+            with timings.stage("search"):
+                ids = corpus.store.search(
+                    [query_embedding],
+                    n_results,
+                    filters=filters if where is not None else None,
+                    filter_index=filter_index,
+                )[0]
+
+        # 关联图表直接查邻接索引，与检索结果在同一次读取中获取
+        related_ids = []
+        link_index = corpus.link_index
+        if ids and request.related and link_index is not None:
+            with timings.stage("related"):
+                allowed = set(filter_index.matching_ids(filters)) if where is not None else None
+                exclude = set(ids)
+                for doc_id in ids:
+                    for neighbor, relation in link_index.related(doc_id, request.related, exclude):
+                        if allowed is not None and neighbor not in allowed:
+                            continue
+                        exclude.add(neighbor)
+                        related_ids.append((neighbor, doc_id, relation))
+
+        if not ids:
             logging.warning("No results found for the query")
-            return DiagramRetrievalResponse(documents=[])
-        
-        documents = []
-        for i, doc_id in enumerate(results['ids'][0]):
-            metadata = results['metadatas'][0][i] if results['metadatas'] else {}
-            svg_content = metadata.get('svg_content', '')
-            text_elements = metadata.get('text_elements', [])
-            original_metadata = metadata.get('metadata', {})
-            description = metadata.get('description', '')
-            if not description and text_elements:
-                description = " ".join(text_elements)
-            source_url = metadata.get('source_url', '')
-            
-            doc = DiagramDocument(
-                text=description,
-                filename=f"diagram_{doc_id}.svg",
-                source_display_name=original_metadata.get('title', f"BIAN Diagram {i+1}"),
-                svg_content=svg_content,
-                source_url=source_url,
-                metadata=original_metadata
-            )
-            documents.append(doc)
-        
-        logging.info(f"Returning {len(documents)} diagrams")
-        return DiagramRetrievalResponse(documents=documents)
+        plan = plan_documents(ids, related_ids, request.includeSvg, corpus.name)
+        event = {
+            "event": "retrieve_diagrams",
+            "question": request.question,
+            "collection": corpus.name,
+            "num_results": request.numResults,
+            "filtered": where is not None,
+            "context": bool(request.useContext and request.context),
+        }
+
+        if request.stream or NDJSON_MEDIA_TYPE in http_request.headers.get("accept", ""):
+            return StreamingResponse(stream_documents(corpus, plan, event, timings, request.includeSvg), media_type=NDJSON_MEDIA_TYPE)
+
+        with timings.stage("fetch"):
+            # 片段按 id 缓存，只读取未命中的记录
+            fragments = cached_fragments((doc_id for doc_id, _, _, _ in plan), corpus.name)
+            fragments.update(fetch_fragments(
+                corpus.store, [doc_id for doc_id, _, _, _ in plan if doc_id not in fragments], corpus.name
+            ))
+
+        with timings.stage("serialize"):
+            documents = []
+            related_documents = []
+            for doc_id, is_related, display_name, extra_metadata in plan:
+                fragment = fragments.get(doc_id)
+                if fragment is None:
+                    continue
+                rendered = render_document(fragment, display_name, extra_metadata, request.includeSvg)
+                (related_documents if is_related else documents).append(rendered)
+            body = retrieval_body(documents, related_documents)
+
+        finish_request(event, len(documents), len(related_documents), len(body), timings)
+
+        headers = {"Server-Timing": timings.server_timing_header()} if SERVER_TIMING_ENABLED else None
+        # 直接返回拼接好的字节，避免 FastAPI 通过 response_model 再次校验和序列化
+        return Response(content=body, media_type="application/json", headers=headers)
     
     except Exception as e:
         logging.error(f"Error retrieving diagrams: {e}")
         raise HTTPException(status_code=500, detail=f"Error retrieving diagrams: {str(e)}")
 
+# 图表的缩略图、瓦片和完整 SVG (以 svg_hash 寻址，长期缓存)
+def require_svg_hash(svg_hash: str) -> str:
+    if not is_svg_hash(svg_hash):
+        raise HTTPException(status_code=404, detail="Diagram not found")
+    return svg_hash
+
+def raster_file(path: str, media_type: str) -> FileResponse:
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Raster not found (run db_initializer/build_rasters.py)")
+    return FileResponse(path, media_type=media_type, headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL})
+
+@app.get("/diagrams/{svg_hash}/thumbnail")
+async def get_thumbnail(svg_hash: str):
+    return raster_file(os.path.join(raster_dir(RASTER_PATH, require_svg_hash(svg_hash)), THUMBNAIL_FILE), RASTER_MEDIA_TYPE)
+
+@app.get("/diagrams/{svg_hash}/tiles")
+async def get_tile_manifest(svg_hash: str):
+    """瓦片金字塔的尺寸和各级行列数"""
+    return raster_file(os.path.join(raster_dir(RASTER_PATH, require_svg_hash(svg_hash)), MANIFEST_FILE), "application/json")
+
+@app.get("/diagrams/{svg_hash}/tiles/{z}/{x}/{y}")
+async def get_tile(svg_hash: str, z: int, x: int, y: int):
+    if min(z, x, y) < 0:
+        raise HTTPException(status_code=404, detail="Tile not found")
+    return raster_file(tile_path(RASTER_PATH, require_svg_hash(svg_hash), z, x, y), RASTER_MEDIA_TYPE)
+
+@app.get("/diagrams/{svg_hash}/svg")
+async def get_svg(
+    svg_hash: str,
+    version: Optional[str] = Query(None, description="BIAN landscape 版本, 例如 '13-0-0'"),
+    collection: Optional[str] = Query(None, description="集合名 (优先于 version)"),
+):
+    """完整 SVG，客户端放大到瓦片不够清晰时才加载"""
+    require_svg_hash(svg_hash)
+    corpus = await resolve_corpus(version, collection)
+    records = await asyncio.to_thread(corpus.store.get, [svg_hash])
+    if not records["ids"]:
+        raise HTTPException(status_code=404, detail="Diagram not found")
+    svg_content = (records["metadatas"][0] or {}).get("svg_content", "")
+    return Response(
+        content=svg_content,
+        media_type="image/svg+xml",
+        headers={
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+            # 直接打开该 URL 时也不执行 SVG 中的脚本
+            "Content-Security-Policy": "default-src 'none'; style-src 'unsafe-inline'",
+            "X-Content-Type-Options": "nosniff",
+        },
+    )
+
+# 业务能力图谱: 查找与遍历
+def require_capability_graph() -> CapabilityGraph:
+    if capability_graph is None:
+        raise HTTPException(status_code=503, detail="Capability graph is not loaded")
+    return capability_graph
+
+def parse_kinds(kinds: Optional[str]) -> Optional[set]:
+    if not kinds:
+        return None
+    requested = {kind.strip() for kind in kinds.split(",") if kind.strip()}
+    unknown = requested - set(NODE_KINDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown node kinds: {sorted(unknown)}; expected {list(NODE_KINDS)}")
+    return requested
+
+def require_node(graph: CapabilityGraph, node_id: int) -> int:
+    if not 0 <= node_id < len(graph):
+        raise HTTPException(status_code=404, detail=f"Node {node_id} not found")
+    return node_id
+
+@app.get("/capabilities")
+async def find_capabilities(
+    q: str = Query("", description="按名称查找 (完全匹配 > 前缀 > 子串)"),
+    kind: Optional[str] = Query(None, description=f"节点类型: {', '.join(NODE_KINDS)}"),
+    limit: int = Query(20, ge=1, le=500),
+):
+    graph = require_capability_graph()
+    kinds = parse_kinds(kind)
+    if kinds and len(kinds) > 1:
+        raise HTTPException(status_code=400, detail="kind accepts a single node kind")
+    node_ids = graph.search(q, kind=next(iter(kinds)) if kinds else None, limit=limit)
+    return {"counts": graph.counts(), "nodes": [graph.describe(node_id) for node_id in node_ids]}
+
+@app.get("/capabilities/{node_id}")
+async def get_capability_node(node_id: int):
+    graph = require_capability_graph()
+    require_node(graph, node_id)
+    neighbors: Dict[str, List[Dict[str, Any]]] = {}
+    for neighbor in graph.neighbors(node_id):
+        neighbors.setdefault(graph.kind(neighbor), []).append(graph.describe(neighbor))
+    return {"node": graph.describe(node_id), "neighbors": neighbors}
+
+@app.get("/capabilities/{node_id}/traverse")
+async def traverse_capabilities(
+    node_id: int,
+    depth: int = Query(2, ge=1, le=6, description="最大跳数"),
+    kinds: Optional[str] = Query(None, description="只返回这些类型的节点，逗号分隔，例如 diagram,process"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    graph = require_capability_graph()
+    require_node(graph, node_id)
+    found = graph.traverse(node_id, depth=depth, kinds=parse_kinds(kinds), limit=limit)
+    return {
+        "node": graph.describe(node_id),
+        "results": [{**graph.describe(neighbor), "distance": distance} for neighbor, distance in found],
+    }
+
+# 可用的过滤取值及其图表数量
+@app.get("/filters")
+async def list_filters(
+    version: Optional[str] = Query(None, description="BIAN landscape 版本, 例如 '13-0-0'"),
+    collection: Optional[str] = Query(None, description="集合名 (优先于 version)"),
+):
+    filter_index = (await resolve_corpus(version, collection)).filter_index
+    return {
+        field: filter_index.values(key)
+        for field, key in FILTER_FIELDS.items()
+        if key in BITMAP_KEYS
+    }
+
+# 已打开的集合 (最近使用的在前，含加载耗时和估算内存) 与存储中可用的集合
+@app.get("/collections")
+async def list_corpora():
+    available = await asyncio.to_thread(list_collections, VECTOR_BACKEND, CHROMA_DB_PATH, NUMPY_INDEX_PATH)
+    return corpus_registry.describe(available)
+
+# Prometheus 指标端点
+@app.get("/metrics")
+async def metrics():
+    body, content_type = metrics_response_body()
+    return Response(content=body, media_type=content_type)
+
 # 健康检查端点
 @app.get("/health")
 async def health_check():
@@ -0,0 +1,264 @@
+"""
+/retrieve_diagrams 负载与延迟基准测试。
+
+按 inject_data.py 的 schema 构建指定规模的合成 ChromaDB 集合，在进程内启动
+api.py (uvicorn)，以给定并发回放 BIAN 关键词查询，按 numResults 和响应模式
+分别报告吞吐量、p50/p95/p99 延迟、响应字节数和每次查询的 CPU 时间。
+
+用法 (在 diagramRAG 目录下运行):
+    python benchmarks/bench_api.py --size 5000 --concurrency 8 --requests 400 --num-results 1,5,10
+    python benchmarks/bench_api.py --size 50000 --embeddings random --output api_bench.json
+
+注意: CPU 时间为整个进程 (服务端 + 压测客户端) 的 CPU 时间除以查询数。
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
+os.environ.setdefault('ANONYMIZED_TELEMETRY', 'False')
+
+from harness import StageRecorder, add_import_paths, environment_info, percentile, write_report  # noqa: E402
+from fixtures import load_fixture_pages, synthesize_corpus  # noqa: E402
+
+add_import_paths()
+from bian_scraper.svg_extractor import extract_svg_data  # noqa: E402
+
+# 模拟 route.ts 中 LLM 生成的图表查询关键词
+KEYWORD_WORKLOAD = [
+    "Customer Onboarding interaction, Party Lifecycle Management",
+    "Payment Order execution, Payment Execution service domain",
+    "Consumer Loan fulfillment, Loan arrangement",
+    "Current Account, Positioning and Account Management",
+    "Customer Segment Performance analysis, Business Development",
+    "Card Authorization, Card Transaction Capture",
+    "Party Reference Data Directory",
+    "Fraud detection, Fraud Evaluation",
+    "Customer Relationship Management, Customer Contact",
+    "Product Design, Product Deployment",
+    "Collateral Asset Administration, Credit Risk",
+    "Regulatory Compliance, Regulatory Reporting",
+]
+
+# 响应模式 -> 附加到请求体的字段
+RESPONSE_MODES = {
+    'json': {},
+    'ndjson': {'stream': True},
+}
+
+EMBEDDING_DIMENSION = 384  # all-MiniLM-L6-v2
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def build_collection(db_path: str, size: int, embeddings_mode: str, seed: int, recorder: StageRecorder):
+    """按 inject_data.py 的 schema 构建合成集合"""
+    import inject_data
+
+    pages = load_fixture_pages()
+    corpus = synthesize_corpus(pages, size, seed=seed)
+    with recorder.stage('build_corpus', items=size):
+        descriptions = []
+        for item in corpus:
+            data = extract_svg_data(item['svg_content']) or {'metadata': {}, 'text_elements': []}
+            item['metadata'] = data['metadata']
+            item['text_elements'] = data['text_elements']
+            item['svg_hash'] = hashlib.sha256(item['svg_content'].encode('utf-8')).hexdigest()
+            descriptions.append(inject_data.generate_svg_description(item['metadata'], item['text_elements']))
+
+    with recorder.stage('build_embeddings', items=size):
+        if embeddings_mode == 'model':
+            model = inject_data.load_encoder(model_name=inject_data.EMBEDDING_MODEL_NAME)
+            embeddings = model.encode(descriptions, batch_size=64, show_progress_bar=False).tolist()
+        else:
+            rng = random.Random(seed)
+            embeddings = []
+            for _ in range(size):
+                vector = [rng.gauss(0, 1) for _ in range(EMBEDDING_DIMENSION)]
+                norm = sum(v * v for v in vector) ** 0.5
+                embeddings.append([v / norm for v in vector])
+
+    client = inject_data.chromadb.PersistentClient(path=db_path)
+    collection = client.get_or_create_collection(name=inject_data.COLLECTION_NAME)
+    with recorder.stage('build_upsert', items=size):
+        batch_size = 500
+        for start in range(0, size, batch_size):
+            batch = corpus[start:start + batch_size]
+            collection.upsert(
+                ids=[i['svg_hash'] for i in batch],
+                embeddings=embeddings[start:start + batch_size],
+                metadatas=[inject_data.build_chroma_metadata(i) for i in batch],
+                documents=descriptions[start:start + batch_size],
+            )
+    # 让 api.setup_database 跳过解压
+    with open(os.path.join(db_path, '.initialized'), 'w') as f:
+        f.write('initialized')
+    return collection
+
+
+def start_server(port: int):
+    import uvicorn
+    import api
+
+    server = uvicorn.Server(uvicorn.Config(api.app, host='127.0.0.1', port=port, log_level='warning'))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("API server failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+async def run_cell(base_url: str, num_results: int, mode: str, concurrency: int, total: int, seed: int) -> dict:
+    """以固定并发发送 total 个请求，返回该 (numResults, mode) 组合的统计"""
+    import httpx
+
+    rng = random.Random(seed)
+    queries = [rng.choice(KEYWORD_WORKLOAD) for _ in range(total)]
+    latencies = []
+    first_byte = []
+    payload_bytes = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        async def one(question: str):
+            nonlocal errors
+            body = {'question': question, 'numResults': num_results, **RESPONSE_MODES[mode]}
+            async with semaphore:
+                start = time.perf_counter()
+                ttfb = None
+                size = 0
+                try:
+                    async with client.stream('POST', '/retrieve_diagrams', json=body) as response:
+                        async for chunk in response.aiter_bytes():
+                            if ttfb is None:
+                                ttfb = time.perf_counter() - start
+                            size += len(chunk)
+                except httpx.HTTPError:
+                    errors += 1
+                    return
+                elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                errors += 1
+                return
+            latencies.append(elapsed)
+            first_byte.append(ttfb if ttfb is not None else elapsed)
+            payload_bytes.append(size)
+
+        # 预热, 不计入统计
+        await one(KEYWORD_WORKLOAD[0])
+        latencies.clear()
+        first_byte.clear()
+        payload_bytes.clear()
+
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(one(q) for q in queries))
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+
+    done = len(latencies)
+    return {
+        'num_results': num_results,
+        'mode': mode,
+        'concurrency': concurrency,
+        'requests': total,
+        'errors': errors,
+        'throughput_rps': round(done / wall, 2) if wall else None,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+            'p95': round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+            'p99': round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+            'max': round(max(latencies) * 1000, 2) if latencies else None,
+        },
+        'ttfb_ms': {
+            'p50': round(percentile(first_byte, 50) * 1000, 2) if first_byte else None,
+            'p95': round(percentile(first_byte, 95) * 1000, 2) if first_byte else None,
+        },
+        'payload_bytes_mean': round(sum(payload_bytes) / done) if done else None,
+        'cpu_ms_per_query': round(cpu / done * 1000, 3) if done else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load and latency benchmark for /retrieve_diagrams")
+    parser.add_argument('--size', type=int, default=2000, help="合成集合中的图表数量")
+    parser.add_argument('--embeddings', choices=('model', 'random'), default='model',
+                        help="集合向量来源: model 用真实模型编码描述，random 用随机单位向量 (大规模时更快)")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help="每个 (numResults, mode) 组合的请求数")
+    parser.add_argument('--num-results', default='1,5,10', help="逗号分隔的 numResults 取值")
+    parser.add_argument('--modes', default=','.join(RESPONSE_MODES), help=f"逗号分隔的响应模式 (可选: {','.join(RESPONSE_MODES)})")
+    parser.add_argument('--vector-backend', choices=('chroma', 'numpy'), default='chroma',
+                        help="API 使用的向量存储后端 (numpy 时从合成集合导出精确检索索引)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--keep-db', action='store_true', help="保留临时数据库目录")
+    parser.add_argument('--output', help="JSON 报告输出路径，默认打印到 stdout")
+    args = parser.parse_args()
+
+    num_results = [int(n) for n in args.num_results.split(',') if n.strip()]
+    modes = [m.strip() for m in args.modes.split(',') if m.strip()]
+    unknown = [m for m in modes if m not in RESPONSE_MODES]
+    if unknown:
+        parser.error(f"Unknown response modes: {unknown}")
+
+    mount_dir = tempfile.mkdtemp(prefix='bench_api_')
+    # api.py 在导入时读取该环境变量，必须在导入前设置
+    os.environ['CHROMA_VOLUME_MOUNT_PATH'] = mount_dir
+    os.environ['VECTOR_BACKEND'] = args.vector_backend
+    db_path = os.path.join(mount_dir, 'diagrams_db')
+    os.makedirs(db_path)
+    recorder = StageRecorder()
+    try:
+        collection = build_collection(db_path, args.size, args.embeddings, args.seed, recorder)
+        if args.vector_backend == 'numpy':
+            from vector_store import export_numpy_index
+
+            with recorder.stage('export_numpy', items=args.size):
+                export_numpy_index(collection, os.path.join(db_path, 'numpy_index'))
+        with recorder.stage('server_startup'):
+            port = free_port()
+            server, thread = start_server(port)
+        base_url = f"http://127.0.0.1:{port}"
+
+        cells = []
+        for mode in modes:
+            for n in num_results:
+                cells.append(asyncio.run(run_cell(base_url, n, mode, args.concurrency, args.requests, args.seed)))
+
+        server.should_exit = True
+        thread.join(timeout=10)
+    finally:
+        if not args.keep_db:
+            shutil.rmtree(mount_dir, ignore_errors=True)
+
+    write_report({
+        'benchmark': 'api',
+        'environment': environment_info(),
+        'config': {
+            'size': args.size,
+            'embeddings': args.embeddings,
+            'vector_backend': args.vector_backend,
+            'concurrency': args.concurrency,
+            'requests_per_cell': args.requests,
+        },
+        'setup': recorder.stages,
+        'results': cells,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+SVG 提取基准测试: 对比共享的单次解析提取器 (bian_scraper/svg_extractor.py)
+与此前 spider 和 extract_bian_svg.py 中的两套实现，
+以及 BeautifulSoup 与正则扫描两种在 HTML 中定位 <svg> 的方式。
+
+用法 (在 diagramRAG 目录下运行):
+    python benchmarks/bench_extract.py --count 2000 --texts 200
+    python benchmarks/bench_extract.py --html page1.html page2.html
+
+结果以 JSON 输出到 stdout。
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+
+from bs4 import BeautifulSoup
+from lxml import etree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bian_scraper'))
+from bian_scraper import svg_extractor  # noqa: E402
+
+SVG_METADATA_ATTRIBUTES = ['bizzid', 'bizzsemantic', 'bizzconcept']
+SVG_NS = {'svg': 'http://www.w3.org/2000/svg'}
+
+
+# --- 旧实现 (基线，从原代码原样保留) ---
+def legacy_spider_extract(svg_string: str) -> dict | None:
+    """原 BianSvgSpider.extract_svg_data (去掉日志)"""
+    try:
+        parser = etree.XMLParser(remove_blank_text=True, recover=True)
+        svg_bytes = io.BytesIO(svg_string.encode('utf-8'))
+        tree = etree.parse(svg_bytes, parser)
+        root = tree.getroot()
+        if root is None:
+            return None
+        tag_local_name = root.tag.split('}', 1)[1] if '}' in root.tag else root.tag
+        if tag_local_name != 'svg':
+            return None
+        extracted_data = {'metadata': {}, 'text_elements': []}
+        for attr in SVG_METADATA_ATTRIBUTES:
+            extracted_data['metadata'][attr] = root.get(attr)
+        text_nodes = root.xpath('.//svg:text//text()', namespaces=SVG_NS)
+        extracted_data['text_elements'] = [text.strip() for text in text_nodes if text.strip()]
+        return extracted_data
+    except Exception:
+        return None
+
+
+def legacy_validator_extract(svg_string: str) -> dict | None:
+    """原 extract_bian_svg.extract_svg_data (去掉打印)"""
+    try:
+        parser = etree.XMLParser(remove_blank_text=True)
+        svg_bytes = io.BytesIO(svg_string.encode('utf-8'))
+        tree = etree.parse(svg_bytes, parser)
+        root = tree.getroot()
+        extracted_data = {'metadata': {}, 'text_elements': []}
+        for attr in SVG_METADATA_ATTRIBUTES:
+            extracted_data['metadata'][attr] = root.get(attr) or None
+        text_nodes = root.xpath('.//svg:text//text()', namespaces=SVG_NS)
+        extracted_data['text_elements'] = [text.strip() for text in text_nodes if text.strip()]
+        return extracted_data
+    except Exception:
+        return None
+
+
+def legacy_find_svg_content(html_content: str) -> list[str]:
+    """原 extract_bian_svg.find_svg_content"""
+    soup = BeautifulSoup(html_content, 'lxml')
+    return [str(svg) for svg in soup.find_all('svg')]
+
+
+# --- 合成语料 ---
+def make_svg(index: int, n_texts: int, rng: random.Random) -> str:
+    """生成一个结构类似 BIAN 视图的 SVG (分组、矩形、路径、多行文本、链接)"""
+    parts = [
+        f'<svg version="1.1" xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+        f'bizzid="{50000 + index}" bizzsemantic="view" bizzconcept="ServiceDomain" width="1200" height="900">'
+    ]
+    for i in range(n_texts):
+        x, y = rng.randint(0, 1100), rng.randint(0, 850)
+        parts.append(
+            f'<g><a xlink:href="../objects/object_{rng.randint(1, 99999)}.html">'
+            f'<rect x="{x}" y="{y}" width="120" height="40" fill="#ffe"/>'
+            f'<path d="M{x} {y} L{x + 120} {y + 40}" stroke="#333"/></a>'
+            f'<text x="{x + 4}" y="{y + 16}"><tspan>Service Domain {index}-{i}</tspan>'
+            f'<tspan x="{x + 4}" dy="14">Control Record {rng.randint(0, 999)}</tspan></text></g>'
+        )
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+def time_call(func, inputs, repeat: int) -> dict:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in inputs:
+            func(item)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {'seconds': round(best, 6), 'items_per_second': round(len(inputs) / best, 2) if best else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SVG extraction benchmark")
+    parser.add_argument('--count', type=int, default=1000, help="合成 SVG 数量")
+    parser.add_argument('--texts', type=int, default=100, help="每个合成 SVG 的文本节点组数")
+    parser.add_argument('--html', nargs='*', default=[], help="额外的真实 HTML 页面 (用于 HTML 扫描对比)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--processes', type=int, default=None, help="extract_many 的进程数")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    svgs = [make_svg(i, args.texts, rng) for i in range(args.count)]
+    html_pages = []
+    for path in args.html:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            html_pages.append(f.read())
+    for page in html_pages:
+        svgs.extend(svg_extractor.iter_svg_fragments(page))
+
+    # 确认新旧实现提取结果一致
+    mismatches = 0
+    for svg in svgs:
+        new, old = svg_extractor.extract_svg_data(svg), legacy_spider_extract(svg)
+        if (new is None) != (old is None) or (new and (new['metadata'], new['text_elements']) != (old['metadata'], old['text_elements'])):
+            mismatches += 1
+
+    report = {
+        'corpus': {
+            'svgs': len(svgs),
+            'bytes': sum(len(s.encode('utf-8')) for s in svgs),
+            'html_pages': len(html_pages),
+        },
+        'parity_mismatches': mismatches,
+        'extract': {
+            'legacy_spider': time_call(legacy_spider_extract, svgs, args.repeat),
+            'legacy_validator': time_call(legacy_validator_extract, svgs, args.repeat),
+            'shared': time_call(svg_extractor.extract_svg_data, svgs, args.repeat),
+        },
+    }
+    start = time.perf_counter()
+    svg_extractor.extract_many(svgs, processes=args.processes)
+    elapsed = time.perf_counter() - start
+    report['extract']['shared_pool'] = {
+        'seconds': round(elapsed, 6),
+        'items_per_second': round(len(svgs) / elapsed, 2) if elapsed else None,
+        'processes': args.processes or os.cpu_count(),
+    }
+    if html_pages:
+        report['find_svg'] = {
+            'legacy_beautifulsoup': time_call(legacy_find_svg_content, html_pages, args.repeat),
+            'regex_scan': time_call(lambda page: list(svg_extractor.iter_svg_fragments(page)), html_pages, args.repeat),
+        }
+
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
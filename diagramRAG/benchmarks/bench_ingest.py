@@ -0,0 +1,115 @@
+"""
+离线注入基准测试: 基于 db_initializer/ 中的 MHTML fixture 合成语料，
+依次测量 HTML 扫描、SVG 提取、哈希、描述生成、Embedding 和 ChromaDB upsert
+各阶段的吞吐量与峰值 RSS，并输出 JSON 报告，便于在版本之间比较。
+
+用法 (在 diagramRAG 目录下运行):
+    python benchmarks/bench_ingest.py --size 2000 --output ingest_bench.json
+    python benchmarks/bench_ingest.py --size 500 --stages scan,extract,hash,describe
+
+Embedding 阶段需要本地已缓存的模型；脚本默认设置 HF_HUB_OFFLINE=1，不会访问网络。
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
+os.environ.setdefault('ANONYMIZED_TELEMETRY', 'False')
+
+from harness import StageRecorder, add_import_paths, environment_info, write_report  # noqa: E402
+from fixtures import load_fixture_pages, synthesize_corpus  # noqa: E402
+
+add_import_paths()
+from bian_scraper.svg_extractor import extract_svg_data, iter_svg_fragments  # noqa: E402
+
+ALL_STAGES = ('scan', 'extract', 'hash', 'describe', 'embed', 'upsert')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingestion benchmark built on the bundled MHTML fixtures")
+    parser.add_argument('--size', type=int, default=1000, help="合成语料中的 SVG 数量")
+    parser.add_argument('--stages', default=','.join(ALL_STAGES), help=f"要运行的阶段，逗号分隔 (可选: {','.join(ALL_STAGES)})")
+    parser.add_argument('--scan-repeat', type=int, default=200, help="HTML 扫描阶段重复扫描 fixture 页面的次数")
+    parser.add_argument('--batch-size', type=int, default=None, help="embed/upsert 批大小，默认使用 inject_data.BATCH_SIZE")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="JSON 报告输出路径，默认打印到 stdout")
+    args = parser.parse_args()
+    stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+
+    import inject_data  # 在 argparse 之后导入，--help 不需要 chromadb 等依赖
+
+    batch_size = args.batch_size or inject_data.BATCH_SIZE
+    pages = load_fixture_pages()
+    corpus = synthesize_corpus(pages, args.size, seed=args.seed)
+    recorder = StageRecorder()
+
+    if 'scan' in stages:
+        html_pages = [page['html'] for page in pages] * args.scan_repeat
+        with recorder.stage('scan', items=len(html_pages), nbytes=sum(len(h) for h in html_pages)):
+            for html in html_pages:
+                for _ in iter_svg_fragments(html):
+                    pass
+
+    with recorder.stage('extract', items=len(corpus), nbytes=sum(len(i['svg_content']) for i in corpus),
+                        enabled='extract' in stages):
+        for item in corpus:
+            data = extract_svg_data(item['svg_content']) or {'metadata': {}, 'text_elements': []}
+            item['metadata'] = data['metadata']
+            item['text_elements'] = data['text_elements']
+
+    with recorder.stage('hash', items=len(corpus), enabled='hash' in stages):
+        for item in corpus:
+            item['svg_hash'] = hashlib.sha256(item['svg_content'].encode('utf-8')).hexdigest()
+
+    with recorder.stage('describe', items=len(corpus), enabled='describe' in stages) as record:
+        descriptions = [inject_data.generate_svg_description(i['metadata'], i['text_elements']) for i in corpus]
+        record['bytes'] = sum(len(d) for d in descriptions)
+
+    embeddings = None
+    if 'embed' in stages or 'upsert' in stages:
+        with recorder.stage('model_load'):
+            model = inject_data.load_encoder(model_name=inject_data.EMBEDDING_MODEL_NAME)
+        with recorder.stage('embed', items=len(descriptions)):
+            embeddings = []
+            for start in range(0, len(descriptions), batch_size):
+                embeddings.extend(model.encode(descriptions[start:start + batch_size], show_progress_bar=False).tolist())
+
+    if 'upsert' in stages:
+        db_dir = tempfile.mkdtemp(prefix='bench_chroma_')
+        try:
+            client = inject_data.chromadb.PersistentClient(path=db_dir)
+            collection = client.get_or_create_collection(name=inject_data.COLLECTION_NAME)
+            with recorder.stage('upsert', items=len(corpus)):
+                for start in range(0, len(corpus), batch_size):
+                    batch = corpus[start:start + batch_size]
+                    collection.upsert(
+                        ids=[i['svg_hash'] for i in batch],
+                        embeddings=embeddings[start:start + batch_size],
+                        metadatas=[inject_data.build_chroma_metadata(i) for i in batch],
+                        documents=descriptions[start:start + batch_size],
+                    )
+            recorder.stages['upsert']['db_bytes'] = sum(
+                os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(db_dir) for f in files
+            )
+        finally:
+            shutil.rmtree(db_dir, ignore_errors=True)
+
+    write_report({
+        'benchmark': 'ingest',
+        'environment': environment_info(),
+        'config': {
+            'size': args.size,
+            'batch_size': batch_size,
+            'seed': args.seed,
+            'fixtures': [os.path.basename(page['path']) for page in pages],
+            'embedding_model': inject_data.EMBEDDING_MODEL_NAME,
+            'encoder_backend': inject_data.ENCODER_BACKEND,
+        },
+        'stages': recorder.stages,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
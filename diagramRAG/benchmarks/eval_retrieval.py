@@ -0,0 +1,431 @@
+"""
+离线检索质量 / 延迟评估: 从本地 ChromaDB 集合构建弱标注的 查询 -> 图表 数据集，
+对每种编码器 × 描述 × 索引组合并排报告 recall@k、hit@k、MRR、p50/p95 延迟、
+索引大小和构建时间。用于在换用更小或量化的编码器、int8 向量、不同的 TOP_K
+或截断描述之前，先知道每项改动损失多少检索质量。
+
+弱标注 (来自注入时写入的元数据):
+- concept: 查询为 bizzconcept 名称，相关图表为概念相同的所有图表
+- title:   查询为时序图标题 (第一个文本元素，去掉 "sd " 前缀)，相关图表为
+           bizzid 相同的所有图表 (同一模型元素出现在多个页面或版本中)
+
+用法 (在 diagramRAG 目录下运行，不访问网络):
+    python benchmarks/eval_retrieval.py
+    python benchmarks/eval_retrieval.py --encoders stored,onnx,onnx-int8 --indexes exact,int8,chroma
+    python benchmarks/eval_retrieval.py --encoders sentence-transformers:paraphrase-MiniLM-L3-v2 \\
+        --descriptions stored,15,5 --k 1,3,5,10 --output retrieval_eval.json
+
+编码器 (--encoders):
+    stored                        集合中已有的向量，查询用默认编码器 (即线上配置)
+    sentence-transformers[:模型]   用该模型重新编码全部描述 (模型需已在本地缓存)
+    onnx / onnx-int8              ONNX Runtime fp32 / int8 量化模型 (先运行 db_initializer/export_onnx.py)
+描述 (--descriptions):
+    stored                        集合中保存的描述
+    <N>                           用 generate_svg_description 重新生成，最多包含 N 个文本元素
+索引 (--indexes):
+    exact                         export_numpy_index 导出的 NumpyVectorStore (精确余弦)
+    int8                          每个向量按最大绝对值缩放为 int8 的精确检索
+    chroma                        临时 ChromaDB 集合 (HNSW)
+
+索引大小只计向量和索引结构 (构建评估索引时不写入元数据)。
+"""
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
+os.environ.setdefault('ANONYMIZED_TELEMETRY', 'False')
+
+import numpy as np  # noqa: E402
+
+from harness import DIAGRAM_RAG_DIR, StageRecorder, add_import_paths, environment_info, percentile, write_report  # noqa: E402
+
+add_import_paths()
+from bian_scraper.svg_extractor import extract_svg_data  # noqa: E402
+from diagram_links import domain_key  # noqa: E402
+
+ALL_INDEXES = ('exact', 'int8', 'chroma')
+QUERY_BATCH_SIZE = 256
+UPSERT_BATCH_SIZE = 500
+
+# 时序图标题的前缀 ("sd Analyse Customer Segment Performance")
+_TITLE_PREFIX_RE = re.compile(r'^sd\s+', re.IGNORECASE)
+
+
+def load_corpus(collection, page_size: int = 500) -> dict:
+    """逐页读取集合中的全部 id、向量、元数据和描述"""
+    ids, vectors, metadatas, documents = [], [], [], []
+    offset = 0
+    while True:
+        page = collection.get(include=['embeddings', 'metadatas', 'documents'], limit=page_size, offset=offset)
+        page_ids = page.get('ids') or []
+        if not page_ids:
+            break
+        ids.extend(page_ids)
+        vectors.extend(np.asarray(v, dtype=np.float32) for v in page['embeddings'])
+        metadatas.extend(m or {} for m in page['metadatas'])
+        documents.extend(d or '' for d in page['documents'])
+        offset += len(page_ids)
+        if len(page_ids) < page_size:
+            break
+    return {'ids': ids, 'embeddings': normalize(np.vstack(vectors)) if vectors else None,
+            'metadatas': metadatas, 'documents': documents}
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+
+def diagram_title(metadata: dict) -> str | None:
+    try:
+        texts = json.loads(metadata.get('text_elements_preview') or '[]')
+    except ValueError:
+        return None
+    if not texts or not isinstance(texts[0], str):
+        return None
+    title = _TITLE_PREFIX_RE.sub('', texts[0].strip())
+    return title if len(title) >= 3 and not title.startswith(':') else None
+
+
+def build_labels(metadatas: list, max_group: int, max_queries: int | None, seed: int) -> list:
+    """
+    从元数据构建弱标注查询: [{'kind', 'question', 'relevant': 图表位置集合}]。
+    相关图表超过 max_group 张的概念太宽泛 (例如 'Customer')，不作为查询。
+    """
+    by_concept, by_bizzid, titles = {}, {}, {}
+    for position, metadata in enumerate(metadatas):
+        concept = metadata.get('bizzconcept')
+        if concept:
+            by_concept.setdefault(domain_key(concept), (concept.strip(), set()))[1].add(position)
+        bizzid = metadata.get('bizzid')
+        if bizzid and bizzid != 'N/A':
+            by_bizzid.setdefault(bizzid, set()).add(position)
+            title = diagram_title(metadata)
+            if title:
+                titles.setdefault(bizzid, title)
+
+    queries = [
+        {'kind': 'concept', 'question': concept, 'relevant': positions}
+        for concept, positions in by_concept.values() if len(positions) <= max_group
+    ]
+    queries += [
+        {'kind': 'title', 'question': title, 'relevant': by_bizzid[bizzid]}
+        for bizzid, title in titles.items() if len(by_bizzid[bizzid]) <= max_group
+    ]
+    if max_queries and len(queries) > max_queries:
+        queries = random.Random(seed).sample(queries, max_queries)
+    return queries
+
+
+def load_variant_encoder(spec: str, default_model: str):
+    from encoders import OnnxEncoder, load_encoder
+
+    backend, _, model_name = spec.partition(':')
+    if backend in ('onnx', 'onnx-int8'):
+        return OnnxEncoder(quantized=backend == 'onnx-int8')
+    if backend == 'stored':
+        # 集合中的向量由默认编码器生成，查询也用它
+        return load_encoder(model_name=default_model)
+    return load_encoder(backend, model_name=model_name or default_model)
+
+
+def encoder_detail(encoder) -> str:
+    return getattr(encoder, 'model_path', None) or getattr(encoder, 'model_name', None) or encoder.backend
+
+
+class InMemoryCollection:
+    """export_numpy_index 使用的集合接口 (分页 get)，把评估向量导出为 NumPy 索引"""
+
+    def __init__(self, ids: list, embeddings: np.ndarray):
+        self.ids = ids
+        self.embeddings = embeddings
+
+    def get(self, include=None, limit=None, offset=0):
+        end = len(self.ids) if limit is None else offset + limit
+        count = len(self.ids[offset:end])
+        return {
+            'ids': self.ids[offset:end],
+            'embeddings': self.embeddings[offset:end],
+            'metadatas': [{}] * count,
+            'documents': [''] * count,
+        }
+
+
+class Int8Index:
+    """
+    对称 int8 量化: 每个向量按最大绝对值缩放到 [-127, 127]，检索时反量化计算点积。
+    内存为 float32 的四分之一；延迟包含每次检索把 int8 矩阵转换为 float32 的开销。
+    """
+
+    def __init__(self, ids: list, embeddings: np.ndarray):
+        self.ids = ids
+        scales = np.abs(embeddings).max(axis=1) / 127
+        scales[scales == 0] = 1.0
+        self.codes = np.round(embeddings / scales[:, None]).astype(np.int8)
+        self.scales = scales.astype(np.float32)
+
+    def estimated_bytes(self) -> int:
+        return int(self.codes.nbytes + self.scales.nbytes)
+
+    def search(self, query_embeddings, n_results: int, filters=None, filter_index=None) -> list:
+        queries = normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        scores = (queries @ self.codes.T.astype(np.float32)) * self.scales
+        k = min(n_results, len(self.ids))
+        if k < len(self.ids):
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(len(self.ids)), scores.shape)
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind='stable')
+        return [[self.ids[i] for i in row] for row in np.take_along_axis(top, order, axis=1).tolist()]
+
+
+def directory_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def build_index(kind: str, ids: list, embeddings: np.ndarray, work_dir: str):
+    """构建一种评估索引，返回 (索引, 字节数, 构建秒数)"""
+    from vector_store import ChromaVectorStore, NumpyVectorStore, export_numpy_index
+
+    start = time.perf_counter()
+    if kind == 'exact':
+        directory = os.path.join(work_dir, 'numpy_index')
+        export_numpy_index(InMemoryCollection(ids, embeddings), directory)
+        index = NumpyVectorStore.open(directory)
+        return index, directory_bytes(directory), time.perf_counter() - start
+    if kind == 'int8':
+        index = Int8Index(ids, embeddings)
+        return index, index.estimated_bytes(), time.perf_counter() - start
+    if kind == 'chroma':
+        import chromadb
+        from chromadb.config import Settings
+
+        directory = os.path.join(work_dir, 'chroma')
+        client = chromadb.PersistentClient(path=directory, settings=Settings(anonymized_telemetry=False))
+        collection = client.get_or_create_collection(name='eval')
+        for offset in range(0, len(ids), UPSERT_BATCH_SIZE):
+            collection.upsert(
+                ids=ids[offset:offset + UPSERT_BATCH_SIZE],
+                embeddings=embeddings[offset:offset + UPSERT_BATCH_SIZE].tolist(),
+            )
+        return ChromaVectorStore(collection), directory_bytes(directory), time.perf_counter() - start
+    raise ValueError(f"Unknown index: {kind} (expected one of {', '.join(ALL_INDEXES)})")
+
+
+def batch_search(index, query_vectors: np.ndarray, depth: int) -> list:
+    ranked = []
+    for offset in range(0, len(query_vectors), QUERY_BATCH_SIZE):
+        ranked.extend(index.search(query_vectors[offset:offset + QUERY_BATCH_SIZE], depth))
+    return ranked
+
+
+def quality_metrics(queries: list, ranked: list, positions: dict, ks: list) -> dict:
+    """recall@k (找回的相关图表占比)、hit@k (前 k 个中至少一个相关) 和 MRR"""
+    if not queries:
+        return {'queries': 0}
+    hits = {k: 0 for k in ks}
+    recalls = {k: 0.0 for k in ks}
+    reciprocal_ranks = 0.0
+    for query, result in zip(queries, ranked):
+        relevant = query['relevant']
+        flags = [positions[doc_id] in relevant for doc_id in result]
+        first = next((rank for rank, flag in enumerate(flags, 1) if flag), None)
+        reciprocal_ranks += 1 / first if first else 0.0
+        for k in ks:
+            found = sum(flags[:k])
+            hits[k] += found > 0
+            recalls[k] += found / len(relevant)
+    total = len(queries)
+    metrics = {'queries': total}
+    metrics.update({f'recall@{k}': round(recalls[k] / total, 4) for k in ks})
+    metrics.update({f'hit@{k}': round(hits[k] / total, 4) for k in ks})
+    metrics['mrr'] = round(reciprocal_ranks / total, 4)
+    return metrics
+
+
+def measure_latency(encoder, index, questions: list, depth: int) -> dict:
+    """逐条查询 (与 API 相同: 单条编码 + 单条检索) 的延迟分布"""
+    encode_times, search_times, total_times = [], [], []
+    # 预热, 不计入统计
+    index.search(encoder.encode(questions[:1]), depth)
+    for question in questions:
+        start = time.perf_counter()
+        vector = encoder.encode([question])
+        encoded = time.perf_counter()
+        index.search(vector, depth)
+        done = time.perf_counter()
+        encode_times.append(encoded - start)
+        search_times.append(done - encoded)
+        total_times.append(done - start)
+
+    def summary(values):
+        return {
+            'p50': round(percentile(values, 50) * 1000, 3) if values else None,
+            'p95': round(percentile(values, 95) * 1000, 3) if values else None,
+        }
+
+    return {'queries': len(questions), 'encode': summary(encode_times), 'search': summary(search_times),
+            'total': summary(total_times)}
+
+
+def print_table(results: list, ks: list):
+    """把各组合的主要指标并排打印到 stderr (JSON 报告照常输出)"""
+    columns = ['encoder', 'descriptions', 'index'] + [f'recall@{k}' for k in ks] + ['hit@1', 'mrr', 'p50_ms', 'p95_ms', 'index_mb', 'build_s']
+    rows = []
+    for result in results:
+        metrics = result['metrics']['all']
+        rows.append([
+            result['encoder'], result['descriptions'], result['index'],
+            *[f"{metrics.get(f'recall@{k}', 0):.3f}" for k in ks],
+            f"{metrics.get('hit@1', 0):.3f}" if 'hit@1' in metrics else '-',
+            f"{metrics.get('mrr', 0):.3f}",
+            f"{result['latency_ms']['total']['p50']}", f"{result['latency_ms']['total']['p95']}",
+            f"{result['index_bytes'] / 1024 / 1024:.2f}", f"{result['build_seconds']:.2f}",
+        ])
+    widths = [max(len(str(row[i])) for row in rows + [columns]) for i in range(len(columns))]
+    for row in [columns] + rows:
+        print('  '.join(str(value).ljust(width) for value, width in zip(row, widths)), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline retrieval quality vs latency evaluation over the local ChromaDB collection")
+    parser.add_argument('--chroma-path', default=None, help="ChromaDB 目录，默认 diagramRAG/chroma_db_diagrams (inject_data.CHROMA_DB_PATH)")
+    parser.add_argument('--version', help="BIAN landscape 版本 (例如 13-0-0)，评估集合 bian_diagrams_<版本>")
+    parser.add_argument('--collection', help="直接指定集合名 (优先于 --version)")
+    parser.add_argument('--encoders', default='stored', help="编码器变体，逗号分隔 (stored, sentence-transformers[:模型], onnx, onnx-int8)")
+    parser.add_argument('--descriptions', default='stored', help="描述变体，逗号分隔 (stored 或最多文本元素数，例如 15,5,0)")
+    parser.add_argument('--indexes', default=','.join(ALL_INDEXES), help=f"索引变体，逗号分隔 (可选: {','.join(ALL_INDEXES)})")
+    parser.add_argument('--k', default='1,3,5,10', help="计算 recall@k / hit@k 的 k 值，逗号分隔")
+    parser.add_argument('--max-group', type=int, default=50, help="相关图表超过该数量的标签不作为查询")
+    parser.add_argument('--max-queries', type=int, default=2000, help="最多评估的查询数 (超出时随机抽样)")
+    parser.add_argument('--latency-queries', type=int, default=200, help="逐条测量延迟的查询数")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="JSON 报告输出路径，默认打印到 stdout")
+    args = parser.parse_args()
+    encoder_specs = [s.strip() for s in args.encoders.split(',') if s.strip()]
+    description_specs = [s.strip() for s in args.descriptions.split(',') if s.strip()]
+    index_kinds = [s.strip() for s in args.indexes.split(',') if s.strip()]
+    ks = sorted({int(k) for k in args.k.split(',') if k.strip()})
+    depth = max(ks)
+
+    import inject_data  # 在 argparse 之后导入，--help 不需要 chromadb 等依赖
+    from corpora import collection_name
+    from vector_store import ChromaVectorStore
+
+    chroma_path = args.chroma_path or os.path.normpath(os.path.join(DIAGRAM_RAG_DIR, inject_data.CHROMA_DB_PATH))
+    target_collection = collection_name(args.version, args.collection)
+    recorder = StageRecorder()
+
+    with recorder.stage('load_corpus') as record:
+        corpus = load_corpus(ChromaVectorStore.open(chroma_path, target_collection).collection)
+        record['items'] = len(corpus['ids'])
+    if not corpus['ids']:
+        print(f"Collection {target_collection} in {chroma_path} is empty", file=sys.stderr)
+        exit(1)
+    positions = {doc_id: i for i, doc_id in enumerate(corpus['ids'])}
+
+    queries = build_labels(corpus['metadatas'], args.max_group, args.max_queries, args.seed)
+    if not queries:
+        print("No weakly labeled queries could be built (no bizzconcept or diagram titles in the metadata)", file=sys.stderr)
+        exit(1)
+    questions = [query['question'] for query in queries]
+    kinds = sorted({query['kind'] for query in queries})
+    latency_questions = random.Random(args.seed).sample(questions, min(args.latency_queries, len(questions)))
+
+    text_elements = None
+    if any(spec != 'stored' for spec in description_specs):
+        with recorder.stage('extract_text', items=len(corpus['ids'])):
+            text_elements = [
+                (extract_svg_data(metadata.get('svg_content') or '') or {}).get('text_elements') or []
+                for metadata in corpus['metadatas']
+            ]
+
+    results = []
+    work_root = tempfile.mkdtemp(prefix='eval_retrieval_')
+    try:
+        for encoder_spec in encoder_specs:
+            with recorder.stage(f'model_load:{encoder_spec}'):
+                encoder = load_variant_encoder(encoder_spec, inject_data.EMBEDDING_MODEL_NAME)
+            with recorder.stage(f'encode_queries:{encoder_spec}', items=len(questions)):
+                query_vectors = normalize(encoder.encode(questions, batch_size=64))
+
+            for description_spec in description_specs:
+                if encoder_spec == 'stored' and description_spec != 'stored':
+                    # 集合中的向量只对应集合中保存的描述
+                    print(f"Skipping stored vectors with descriptions={description_spec}", file=sys.stderr)
+                    continue
+                if encoder_spec == 'stored':
+                    embeddings, encode_seconds = corpus['embeddings'], 0.0
+                else:
+                    if description_spec == 'stored':
+                        descriptions = corpus['documents']
+                    else:
+                        max_texts = int(description_spec)
+                        descriptions = [
+                            inject_data.generate_svg_description(metadata, texts, max_texts)
+                            for metadata, texts in zip(corpus['metadatas'], text_elements)
+                        ]
+                    with recorder.stage(f'encode_corpus:{encoder_spec}:{description_spec}', items=len(descriptions)) as record:
+                        embeddings = normalize(encoder.encode(descriptions, batch_size=64))
+                    encode_seconds = record['seconds']
+
+                for index_kind in index_kinds:
+                    work_dir = tempfile.mkdtemp(dir=work_root)
+                    index, index_bytes, build_seconds = build_index(index_kind, corpus['ids'], embeddings, work_dir)
+                    ranked = batch_search(index, query_vectors, depth)
+                    metrics = {'all': quality_metrics(queries, ranked, positions, ks)}
+                    for kind in kinds:
+                        subset = [(q, r) for q, r in zip(queries, ranked) if q['kind'] == kind]
+                        metrics[kind] = quality_metrics([q for q, _ in subset], [r for _, r in subset], positions, ks)
+                    results.append({
+                        'encoder': encoder_spec,
+                        'encoder_detail': encoder_detail(encoder),
+                        'descriptions': description_spec,
+                        'index': index_kind,
+                        'metrics': metrics,
+                        'latency_ms': measure_latency(encoder, index, latency_questions, depth),
+                        'index_bytes': index_bytes,
+                        'build_seconds': round(build_seconds, 3),
+                        'corpus_encode_seconds': round(encode_seconds, 3),
+                    })
+                    if hasattr(index, 'close'):
+                        index.close()
+    finally:
+        shutil.rmtree(work_root, ignore_errors=True)
+
+    if results:
+        print_table(results, ks)
+    write_report({
+        'benchmark': 'retrieval_eval',
+        'environment': environment_info(),
+        'config': {
+            'chroma_path': chroma_path,
+            'collection': target_collection,
+            'corpus_size': len(corpus['ids']),
+            'dimension': int(corpus['embeddings'].shape[1]),
+            'encoders': encoder_specs,
+            'descriptions': description_specs,
+            'indexes': index_kinds,
+            'k': ks,
+            'max_group': args.max_group,
+            'seed': args.seed,
+        },
+        'labels': {
+            'queries': len(queries),
+            'by_kind': {kind: sum(1 for q in queries if q['kind'] == kind) for kind in kinds},
+            'mean_relevant': round(sum(len(q['relevant']) for q in queries) / len(queries), 2),
+        },
+        'stages': recorder.stages,
+        'results': results,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
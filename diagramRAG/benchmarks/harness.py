@@ -0,0 +1,134 @@
+"""
+基准测试公共工具: 分阶段计时、峰值 RSS 采样和 JSON 报告。
+
+每个阶段的峰值 RSS 由后台线程按固定间隔读取 /proc/self/status 得到；
+在没有 /proc 的平台上退化为 resource.getrusage 的进程级峰值。
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DIAGRAM_RAG_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+
+def add_import_paths():
+    """让基准脚本可以导入 api.py、db_initializer/ 和 bian_scraper/ 中的模块"""
+    for path in (
+        DIAGRAM_RAG_DIR,
+        os.path.join(DIAGRAM_RAG_DIR, 'db_initializer'),
+        os.path.join(DIAGRAM_RAG_DIR, 'bian_scraper'),
+    ):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+def current_rss_bytes() -> int | None:
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 以 KB 为单位，macOS 以字节为单位
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        return None
+
+
+class RssSampler:
+    """后台采样当前进程 RSS，记录采样期间的峰值"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss_bytes()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+class StageRecorder:
+    """收集各阶段的耗时、条目数、字节数和峰值 RSS"""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name: str, items: int = 0, nbytes: int = 0, enabled: bool = True):
+        """计时一个阶段；enabled=False 时照常执行但不记录 (用于被跳过但其输出仍被后续阶段需要的阶段)"""
+        record = {'items': items, 'bytes': nbytes}
+        cpu_start = time.process_time()
+        with RssSampler() as sampler:
+            start = time.perf_counter()
+            yield record
+            elapsed = time.perf_counter() - start
+        record['seconds'] = round(elapsed, 6)
+        record['cpu_seconds'] = round(time.process_time() - cpu_start, 6)
+        record['items_per_second'] = round(record['items'] / elapsed, 2) if elapsed and record['items'] else None
+        record['peak_rss_mb'] = round(sampler.peak / (1024 * 1024), 2) if sampler.peak else None
+        if enabled:
+            self.stages[name] = record
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=DIAGRAM_RAG_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment_info() -> dict:
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def percentile(values: list, pct: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def write_report(report: dict, output: str | None):
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
@@ -0,0 +1,17 @@
+# Duplicate filter that fingerprints requests by canonical URL.
+#
+# With JOBDIR set (scrapy crawl bian_svg -s JOBDIR=crawls/bian-12-0-0) the
+# seen-set is persisted to JOBDIR/requests.seen, so an interrupted crawl can be
+# resumed without re-rendering pages it already visited.
+
+import hashlib
+
+from scrapy.dupefilters import RFPDupeFilter
+
+from bian_scraper.urls import canonicalize_url
+
+
+class CanonicalURLDupeFilter(RFPDupeFilter):
+    def request_fingerprint(self, request):
+        url = canonicalize_url(request.url) or request.url
+        return hashlib.sha1(f"{request.method} {url}".encode('utf-8')).hexdigest()
@@ -0,0 +1,183 @@
+# Shared crawl state for sharded crawls (see run_sharded.py).
+#
+# Several `scrapy crawl bian_svg` worker processes pull pages from one durable
+# frontier instead of each keeping its own scheduler queue, and share one
+# politeness budget per domain. Both live in SQLite files that every worker
+# opens; SQLite's write lock makes leasing and token accounting atomic across
+# processes on the same host.
+
+import os
+import socket
+import time
+
+from bian_scraper.storage import SqliteStore
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class Frontier(SqliteStore):
+    """
+    Durable URL queue with leases.
+
+    Every canonical URL is stored once, so the frontier also deduplicates across
+    workers. A worker leases a small batch of the highest-priority pending URLs;
+    the lease expires if the worker dies, and the URL is handed to another
+    worker. Each lease counts as an attempt; URLs that keep failing are parked
+    as 'failed' after `max_attempts`. Killing every worker and starting them
+    again resumes the crawl where it stopped.
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS urls (
+            url TEXT PRIMARY KEY,
+            priority INTEGER NOT NULL DEFAULT 0,
+            state TEXT NOT NULL DEFAULT 'pending',
+            lease_owner TEXT,
+            lease_expires REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            discovered_at REAL NOT NULL,
+            finished_at REAL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS urls_by_state ON urls (state, priority DESC)",
+    )
+
+    def __init__(self, path: str, lease_seconds: float = 600, max_attempts: int = 3):
+        super().__init__(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def add(self, urls) -> int:
+        """Queue (url, priority) pairs; URLs already known in any state are ignored."""
+        now = time.time()
+        cursor = self.conn.executemany(
+            "INSERT OR IGNORE INTO urls (url, priority, discovered_at) VALUES (?, ?, ?)",
+            ((url, priority, now) for url, priority in urls),
+        )
+        self.conn.commit()
+        return cursor.rowcount
+
+    def lease(self, worker: str, limit: int) -> list:
+        """Lease up to `limit` URLs (pending, or leased by a worker whose lease expired)."""
+        now = time.time()
+        with self.conn:
+            # Take the write lock up front so two workers never lease the same URL
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.execute(
+                "UPDATE urls SET state = ?, lease_owner = NULL, finished_at = ? "
+                "WHERE attempts >= ? AND (state = ? OR (state = ? AND lease_expires <= ?))",
+                (FAILED, now, self.max_attempts, PENDING, LEASED, now),
+            )
+            rows = self.conn.execute(
+                "SELECT url FROM urls WHERE state = ? OR (state = ? AND lease_expires <= ?) "
+                "ORDER BY priority DESC, rowid LIMIT ?",
+                (PENDING, LEASED, now, limit),
+            ).fetchall()
+            urls = [row[0] for row in rows]
+            self.conn.executemany(
+                "UPDATE urls SET state = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE url = ?",
+                ((LEASED, worker, now + self.lease_seconds, url) for url in urls),
+            )
+        return urls
+
+    def renew(self, worker: str):
+        """Extend every lease held by `worker` (its pages are still queued or downloading)."""
+        self.conn.execute(
+            "UPDATE urls SET lease_expires = ? WHERE state = ? AND lease_owner = ?",
+            (time.time() + self.lease_seconds, LEASED, worker),
+        )
+        self.conn.commit()
+
+    def complete(self, url: str, worker: str):
+        self.conn.execute(
+            "UPDATE urls SET state = ?, lease_owner = NULL, finished_at = ? WHERE url = ? AND lease_owner = ?",
+            (DONE, time.time(), url, worker),
+        )
+        self.conn.commit()
+
+    def fail(self, url: str, worker: str):
+        """Give a URL back for another attempt, or park it once it is out of attempts."""
+        self.conn.execute(
+            "UPDATE urls SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, lease_owner = NULL, "
+            "lease_expires = NULL, finished_at = ? WHERE url = ? AND lease_owner = ?",
+            (self.max_attempts, FAILED, PENDING, time.time(), url, worker),
+        )
+        self.conn.commit()
+
+    def release(self, worker: str, refund_attempt: bool = True) -> int:
+        """
+        Return the unfinished leases of `worker`: on a clean shutdown (the
+        attempt is refunded), or when a restarted worker with a stable id
+        reclaims what its crashed predecessor held (the attempt still counts).
+        """
+        cursor = self.conn.execute(
+            "UPDATE urls SET state = ?, lease_owner = NULL, lease_expires = NULL, attempts = MAX(attempts - ?, 0) "
+            "WHERE state = ? AND lease_owner = ?",
+            (PENDING, 1 if refund_attempt else 0, LEASED, worker),
+        )
+        self.conn.commit()
+        return cursor.rowcount
+
+    def drained(self) -> bool:
+        """True when nothing is pending and no live lease could still discover new URLs."""
+        row = self.conn.execute(
+            "SELECT 1 FROM urls WHERE state = ? OR (state = ? AND lease_expires > ?) LIMIT 1",
+            (PENDING, LEASED, time.time()),
+        ).fetchone()
+        if row is not None:
+            return False
+        # Expired leases are retried by whoever asks next, unless out of attempts
+        row = self.conn.execute(
+            "SELECT 1 FROM urls WHERE state = ? AND attempts < ? LIMIT 1",
+            (LEASED, self.max_attempts),
+        ).fetchone()
+        return row is None
+
+    def counts(self) -> dict:
+        return dict(self.conn.execute("SELECT state, COUNT(*) FROM urls GROUP BY state").fetchall())
+
+
+class TokenBuckets(SqliteStore):
+    """
+    Per-key token buckets shared by every process that opens the same file.
+    `rate` tokens per second refill a bucket of `capacity`; one token = one request.
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS buckets (
+            key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """,
+    )
+
+    def acquire(self, key: str, rate: float, capacity: float) -> float:
+        """
+        Take one token if available and return 0; otherwise take nothing and
+        return how many seconds to wait before trying again.
+        """
+        now = time.time()
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            row = self.conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self.conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                (key, tokens, now),
+            )
+        return wait
@@ -3,11 +3,22 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import asyncio
+import os
+import time
+from urllib.parse import urlparse
+
 from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import HtmlResponse
+from scrapy.utils.project import data_path
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
 
+from bian_scraper.frontier import TokenBuckets
+from bian_scraper.storage import RenderCache
+
 
 class BianScraperSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -101,3 +112,154 @@ class BianScraperDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class RenderCacheMiddleware:
+    """
+    Persistent cache of Playwright-rendered pages, keyed by URL.
+
+    Entries younger than RENDER_CACHE_MAX_AGE are served straight from disk.
+    Older entries that carry an ETag or Last-Modified are revalidated with a
+    plain conditional GET (no browser); only pages the origin reports as
+    changed are rendered again. RENDER_CACHE_MAX_AGE = 0 never expires entries,
+    matching HTTPCACHE_EXPIRATION_SECS.
+    """
+
+    def __init__(self, settings, stats):
+        if not settings.getbool("RENDER_CACHE_ENABLED"):
+            raise NotConfigured
+        self.max_age = settings.getint("RENDER_CACHE_MAX_AGE", 0)
+        self.revalidate = settings.getbool("RENDER_CACHE_REVALIDATE", True)
+        self.cache_dir = data_path(settings.get("RENDER_CACHE_DIR", "rendercache"), createdir=True)
+        self.stats = stats
+        self.cache = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        s = cls(crawler.settings, crawler.stats)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def spider_opened(self, spider):
+        self.cache = RenderCache(os.path.join(self.cache_dir, "pages.sqlite"))
+        spider.logger.info(f"Render cache opened at {self.cache.path} (max age {self.max_age}s)")
+
+    def spider_closed(self, spider):
+        if self.cache is not None:
+            self.cache.close()
+
+    def process_request(self, request, spider):
+        if not request.meta.get("playwright") or request.meta.get("render_cache_bypass"):
+            return None
+
+        entry = self.cache.get(request.url)
+        if entry is None:
+            self.stats.inc_value("render_cache/miss", spider=spider)
+            return None
+
+        age = time.time() - entry["validated_at"]
+        if self.max_age == 0 or age < self.max_age:
+            self.stats.inc_value("render_cache/hit", spider=spider)
+            return self._cached_response(request, entry)
+
+        if not self.revalidate or not (entry["etag"] or entry["last_modified"]):
+            self.stats.inc_value("render_cache/expired", spider=spider)
+            return None
+
+        # Stale but revalidatable: ask the origin with a cheap conditional GET
+        # that skips the browser (scrapy-playwright falls back to the plain
+        # HTTP handler when meta['playwright'] is false).
+        headers = request.headers.copy()
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        meta = dict(request.meta, playwright=False, render_cache_revalidating=True)
+        self.stats.inc_value("render_cache/revalidate", spider=spider)
+        return request.replace(headers=headers, meta=meta, dont_filter=True)
+
+    def process_response(self, request, response, spider):
+        if request.meta.get("render_cache_revalidating"):
+            entry = self.cache.get(request.url)
+            if response.status == 304 and entry is not None:
+                self.cache.touch(request.url)
+                self.stats.inc_value("render_cache/not_modified", spider=spider)
+                return self._cached_response(request, entry)
+            # Page changed (or the origin ignored the validators): render it again.
+            headers = request.headers.copy()
+            headers.pop("If-None-Match", None)
+            headers.pop("If-Modified-Since", None)
+            meta = dict(request.meta, playwright=True, render_cache_revalidating=False, render_cache_bypass=True)
+            self.stats.inc_value("render_cache/changed", spider=spider)
+            return request.replace(headers=headers, meta=meta, dont_filter=True)
+
+        if request.meta.get("playwright") and response.status == 200 and "render_cache" not in response.flags:
+            self.cache.put(
+                request.url,
+                response.body,
+                getattr(response, "encoding", None),
+                self._header(response, "ETag"),
+                self._header(response, "Last-Modified"),
+            )
+            self.stats.inc_value("render_cache/store", spider=spider)
+        return response
+
+    @staticmethod
+    def _header(response, name):
+        value = response.headers.get(name)
+        return value.decode("latin-1") if value else None
+
+    @staticmethod
+    def _cached_response(request, entry):
+        return HtmlResponse(
+            url=request.url,
+            body=entry["body"],
+            encoding=entry["encoding"],
+            request=request,
+            flags=["render_cache"],
+        )
+
+
+class GlobalRateLimitMiddleware:
+    """
+    Politeness budget shared by all workers of a sharded crawl: every request
+    that reaches the network takes a token from a per-domain bucket stored in
+    GLOBAL_RATE_LIMIT_PATH. Sits after RenderCacheMiddleware, so pages served
+    from the render cache cost nothing. Disabled unless the path is set
+    (run_sharded.py sets it; single-process crawls keep DOWNLOAD_DELAY and
+    AutoThrottle).
+    """
+
+    def __init__(self, path, rate, burst, stats):
+        self.buckets = TokenBuckets(path)
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        path = settings.get("GLOBAL_RATE_LIMIT_PATH")
+        if not path:
+            raise NotConfigured
+        s = cls(path, settings.getfloat("GLOBAL_RATE_LIMIT", 0.5), settings.getfloat("GLOBAL_RATE_BURST", 2), crawler.stats)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def spider_closed(self, spider):
+        self.buckets.close()
+
+    async def process_request(self, request, spider):
+        domain = urlparse(request.url).netloc.lower()
+        waited = 0.0
+        while True:
+            wait = self.buckets.acquire(domain, self.rate, self.burst)
+            if not wait:
+                break
+            waited += wait
+            await asyncio.sleep(wait)
+        if waited:
+            self.stats.inc_value("global_rate_limit/delayed", spider=spider)
+            self.stats.inc_value("global_rate_limit/wait_seconds", int(round(waited)), spider=spider)
+        return None
@@ -3,11 +3,165 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+import hashlib
+import json
+import logging
+import os
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
+from scrapy.exceptions import DropItem
+from scrapy.settings import SETTINGS_PRIORITIES
 
+from bian_scraper.urls import landscape_spool_path
+
+logger = logging.getLogger(__name__)
+
+
+def read_spool_hashes(path: str) -> set:
+    """Collect the svg_hash of every record already in a spool file."""
+    hashes = set()
+    if not os.path.exists(path):
+        return hashes
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                svg_hash = json.loads(line).get('svg_hash')
+            except json.JSONDecodeError:
+                continue  # Truncated last line of an interrupted crawl
+            if svg_hash:
+                hashes.add(svg_hash)
+    return hashes
+
+
+def configured_spool_path(settings) -> tuple:
+    """SVG_SPOOL_PATH and whether it was set explicitly (command line or spider) rather than by settings.py."""
+    priority = settings.getpriority('SVG_SPOOL_PATH')
+    return settings.get('SVG_SPOOL_PATH', 'svg_spool.jl'), priority is not None and priority > SETTINGS_PRIORITIES['project']
+
+
+def spider_spool_path(path: str, explicit: bool, spider) -> str:
+    """
+    The project default spool gets the crawled landscape's version, so a crawl
+    of another version neither appends to the default spool nor drops the
+    diagrams it shares with it as duplicates. Explicit paths are kept as given.
+    """
+    if explicit or not path:
+        return path
+    return landscape_spool_path(path, getattr(spider, 'landscape', None))
+
+
+def merge_spools(shard_paths, output_path: str) -> dict:
+    """
+    Merge the per-worker spools of a sharded crawl into one spool, keeping the
+    first record of every svg_hash (each worker only deduplicates its own
+    output). Written to a temporary file and renamed, then marked done, so
+    `inject_data.py --follow` never sees a half-merged spool.
+    """
+    seen = set()
+    stats = {'shards': 0, 'records': 0, 'duplicates': 0, 'truncated': 0}
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        for path in shard_paths:
+            if not os.path.exists(path):
+                continue
+            stats['shards'] += 1
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        stats['truncated'] += 1  # Last line of a worker that was killed mid-write
+                        continue
+                    svg_hash = record.get('svg_hash')
+                    if svg_hash in seen:
+                        stats['duplicates'] += 1
+                        continue
+                    seen.add(svg_hash)
+                    out.write(line if line.endswith('\n') else line + '\n')
+                    stats['records'] += 1
+    os.replace(tmp_path, output_path)
+    with open(output_path + '.done', 'w') as f:
+        f.write('done')
+    return stats
+
+
+class SvgDedupPipeline:
+    """
+    Hashes every SVG as it is scraped and drops repeats, so a diagram shown on
+    several pages is only spooled (and later embedded) once. Hashes already in
+    the spool file are preloaded, so resumed crawls do not re-emit them.
+    """
+
+    def __init__(self, spool_path: str, stats, explicit_path: bool = False):
+        self.spool_path = spool_path
+        self.explicit_path = explicit_path
+        self.stats = stats
+        self.seen = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        spool_path, explicit = configured_spool_path(crawler.settings)
+        return cls(spool_path, crawler.stats, explicit)
+
+    def open_spider(self, spider):
+        self.spool_path = spider_spool_path(self.spool_path, self.explicit_path, spider)
+        if self.spool_path:
+            self.seen = read_spool_hashes(self.spool_path)
+            spider.logger.info(f"Loaded {len(self.seen)} known SVG hashes from {self.spool_path}")
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        svg_content = adapter.get('svg_content')
+        if not svg_content:
+            raise DropItem(f"Empty SVG content from {adapter.get('source_url')}")
+        svg_hash = hashlib.sha256(svg_content.encode('utf-8')).hexdigest()
+        if svg_hash in self.seen:
+            self.stats.inc_value('svg/duplicate', spider=spider)
+            raise DropItem(f"Duplicate SVG {svg_hash[:12]} from {adapter.get('source_url')}")
+        self.seen.add(svg_hash)
+        adapter['svg_hash'] = svg_hash
+        self.stats.inc_value('svg/unique', spider=spider)
+        return item
+
+
+class SvgSpoolPipeline:
+    """
+    Appends each item as one compact JSON line to SVG_SPOOL_PATH and flushes it,
+    so `inject_data.py --follow` can embed and upsert diagrams while the crawl is
+    still running. A `<spool>.done` marker is written when the spider closes.
+    """
+
+    def __init__(self, spool_path: str, explicit_path: bool = False):
+        self.spool_path = spool_path
+        self.explicit_path = explicit_path
+        self.done_marker = None
+        self.file = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        spool_path, explicit = configured_spool_path(crawler.settings)
+        return cls(spool_path, explicit)
+
+    def open_spider(self, spider):
+        self.spool_path = spider_spool_path(self.spool_path, self.explicit_path, spider)
+        self.done_marker = self.spool_path + '.done'
+        if os.path.exists(self.done_marker):
+            os.remove(self.done_marker)
+        parent = os.path.dirname(self.spool_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.file = open(self.spool_path, 'a', encoding='utf-8')
+        spider.logger.info(f"Spooling SVG items to {self.spool_path}")
+
+    def close_spider(self, spider):
+        if self.file is not None:
+            self.file.close()
+        with open(self.done_marker, 'w') as f:
+            f.write('done')
 
-class BianScraperPipeline:
     def process_item(self, item, spider):
+        record = ItemAdapter(item).asdict()
+        self.file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.file.flush()
         return item
@@ -0,0 +1,48 @@
+# Playwright rendering helpers: which requests a page may make, and what a
+# rendered page has to wait for before its HTML is handed back to the spider.
+
+from urllib.parse import urlparse
+
+from scrapy_playwright.page import PageMethod
+
+# Diagrams are inline <svg> built from the page's HTML and scripts, so nothing
+# else a BIAN page pulls in is needed to extract them.
+BLOCKED_RESOURCE_TYPES = frozenset({
+    'image', 'media', 'font', 'stylesheet', 'texttrack', 'eventsource', 'websocket', 'manifest',
+})
+BLOCKED_HOSTS = (
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'facebook.net',
+    'linkedin.com',
+    'hotjar.com',
+    'hubspot.com',
+)
+
+# Resolve as soon as an <svg> is in the DOM; pages that never get one resolve at
+# the load event (cheap, since heavy resources are blocked) instead of timing out.
+SVG_READY_JS = "() => document.querySelector('svg') !== null || document.readyState === 'complete'"
+
+
+def should_abort_request(request) -> bool:
+    """PLAYWRIGHT_ABORT_REQUEST predicate: drop resources diagram extraction does not need."""
+    if request.resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = urlparse(request.url).netloc.lower()
+    return any(host == blocked or host.endswith('.' + blocked) for blocked in BLOCKED_HOSTS)
+
+
+def playwright_meta(context: str, navigation_timeout: int, svg_wait_timeout: int) -> dict:
+    """Request meta for rendering a page in a pooled browser context."""
+    return {
+        'playwright': True,
+        'playwright_context': context,
+        'playwright_page_goto_kwargs': {
+            'wait_until': 'domcontentloaded',
+            'timeout': navigation_timeout,
+        },
+        'playwright_page_methods': [
+            PageMethod('wait_for_function', SVG_READY_JS, timeout=svg_wait_timeout),
+        ],
+    }
@@ -53,6 +53,12 @@ CONCURRENT_REQUESTS_PER_DOMAIN = 2 # Limit concurrent requests to bian.org
 #DOWNLOADER_MIDDLEWARES = {
 #    "bian_scraper.middlewares.BianScraperDownloaderMiddleware": 543,
 #}
+DOWNLOADER_MIDDLEWARES = {
+    # Runs after HttpCompression/Redirect on the way back, so it stores final, decoded pages
+    "bian_scraper.middlewares.RenderCacheMiddleware": 580,
+    # Only active in sharded crawls; after the render cache so cache hits are free
+    "bian_scraper.middlewares.GlobalRateLimitMiddleware": 590,
+}
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -62,9 +68,15 @@ CONCURRENT_REQUESTS_PER_DOMAIN = 2 # Limit concurrent requests to bian.org
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    "bian_scraper.pipelines.BianScraperPipeline": 300,
-#}
+ITEM_PIPELINES = {
+    "bian_scraper.pipelines.SvgDedupPipeline": 300,
+    "bian_scraper.pipelines.SvgSpoolPipeline": 800,
+}
+# JSON Lines spool consumed by db_initializer/inject_data.py (run it with
+# --follow to ingest while the crawl is still running). Crawls of another
+# landscape (-a version=13-0-0) write svg_spool.13-0-0.jl unless this is
+# overridden with -s.
+SVG_SPOOL_PATH = "svg_spool.jl"
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -87,11 +99,49 @@ AUTOTHROTTLE_DEBUG = False # Set to True if you want to see detailed throttling
 #HTTPCACHE_IGNORE_HTTP_CODES = []
 #HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
 
+# Persistent cache of Playwright-rendered pages (see RenderCacheMiddleware).
+# Scrapy's HTTPCACHE cannot be used here: it would key rendered and plain
+# responses identically and never revalidate with the origin.
+RENDER_CACHE_ENABLED = True
+RENDER_CACHE_DIR = "rendercache"  # Relative to the project data dir (.scrapy/)
+RENDER_CACHE_MAX_AGE = 24 * 3600  # Serve cached renders without contacting bian.org for a day (0 = never expire)
+RENDER_CACHE_REVALIDATE = True  # After that, send If-None-Match / If-Modified-Since before re-rendering
+
+# Tiered fetching: download pages with plain HTTP first and escalate to
+# Playwright only when the static HTML lacks SVGs or .html links. The tier that
+# worked is remembered per URL under .scrapy/fetchtiers for the next crawl.
+FETCH_TIERS_ENABLED = True
+FETCH_TIERS_DIR = "fetchtiers"
+
+# Frontier dedup and ordering. Requests are fingerprinted by canonical URL
+# (bian_scraper.urls); run with -s JOBDIR=crawls/<name> to persist the seen-set
+# and pending queue so an interrupted crawl resumes where it stopped.
+DUPEFILTER_CLASS = "bian_scraper.dupefilters.CanonicalURLDupeFilter"
+# View/object pages get a higher base priority; each level of depth costs 1
+DEPTH_PRIORITY = 1
+DEPTH_LIMIT = 0  # No depth limit
+DEPTH_STATS_VERBOSE = True
+
+# Sharded crawls (run_sharded.py): N worker processes lease pages from one
+# SQLite frontier and share one per-domain token bucket, so render throughput
+# scales across cores while bian.org sees the same total request rate. The
+# launcher sets FRONTIER_PATH / FRONTIER_WORKER / GLOBAL_RATE_LIMIT_PATH per
+# worker; leaving them empty keeps the single-process crawl above.
+FRONTIER_PATH = None
+FRONTIER_WORKER = None  # Defaults to <hostname>-<pid>
+FRONTIER_LEASE_BATCH = 4  # Pages leased at a time (small, so a dead worker strands little)
+FRONTIER_LEASE_SECONDS = 600  # A page is handed to another worker if not finished by then
+FRONTIER_MAX_ATTEMPTS = 3
+GLOBAL_RATE_LIMIT_PATH = None
+GLOBAL_RATE_LIMIT = 0.5  # Requests per second to bian.org across all workers (= 1 / DOWNLOAD_DELAY)
+GLOBAL_RATE_BURST = 2
+
 # Set settings whose default value is deprecated to a future-proof value
 TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
 FEED_EXPORT_ENCODING = "utf-8"
 
-# Enable Playwright downloader handler
+# Enable Playwright downloader handler. Requests without meta['playwright']
+# fall through to Scrapy's regular HTTP handler, which the plain tier relies on.
 DOWNLOAD_HANDLERS = {
     "http": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
     "https": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
@@ -100,19 +150,51 @@ DOWNLOAD_HANDLERS = {
 # Required for Playwright asynchronous operations within Twisted's reactor
 TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
 
-# (Optional but recommended) Configure Playwright settings if needed
-# For example, specify browser type or headless mode
+# (Optional) Specify the browser type; launch options are set further below
 # PLAYWRIGHT_BROWSER_TYPE = 'chromium' # 'chromium', 'firefox', or 'webkit'
-# PLAYWRIGHT_LAUNCH_OPTIONS = {
-#     "headless": True # Run in headless mode (no visible browser window)
-# }
 
 # (Keep the USER_AGENT and LOG_LEVEL settings we added before)
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 LOG_LEVEL = 'DEBUG' # Keep DEBUG for now to see detailed logs
 
-# Increase Playwright navigation timeout further to handle very slow pages
-PLAYWRIGHT_DEFAULT_NAVIGATION_TIMEOUT = 1200000  # Timeout in milliseconds (120 seconds)
+# Navigation only waits for DOMContentLoaded and then for an <svg> (see
+# bian_scraper.rendering), so short timeouts plus retries beat one very long
+# timeout that can hold a slot for minutes.
+PLAYWRIGHT_DEFAULT_NAVIGATION_TIMEOUT = 30000  # Timeout in milliseconds (30 seconds)
+PLAYWRIGHT_SVG_WAIT_TIMEOUT = 15000  # How long a rendered page may take to produce its <svg>
+
+# Pool of reusable browser contexts; rendered requests are assigned round-robin
+PLAYWRIGHT_CONTEXT_POOL_SIZE = 2
+PLAYWRIGHT_CONTEXTS = {
+    f"render-{i}": {"service_workers": "block"}
+    for i in range(PLAYWRIGHT_CONTEXT_POOL_SIZE)
+}
+PLAYWRIGHT_MAX_CONTEXTS = PLAYWRIGHT_CONTEXT_POOL_SIZE
+PLAYWRIGHT_MAX_PAGES_PER_CONTEXT = CONCURRENT_REQUESTS_PER_DOMAIN
+PLAYWRIGHT_LAUNCH_OPTIONS = {
+    "headless": True,
+    "args": ["--disable-gpu", "--disable-dev-shm-usage", "--disable-extensions"],
+}
+# Skip images, fonts, stylesheets, media and analytics while rendering
+PLAYWRIGHT_ABORT_REQUEST = "bian_scraper.rendering.should_abort_request"
+
+# Retry pages whose render timed out instead of failing them outright
+RETRY_ENABLED = True
+RETRY_TIMES = 3
+RETRY_EXCEPTIONS = [
+    "twisted.internet.defer.TimeoutError",
+    "twisted.internet.error.TimeoutError",
+    "twisted.internet.error.DNSLookupError",
+    "twisted.internet.error.ConnectionRefusedError",
+    "twisted.internet.error.ConnectionDone",
+    "twisted.internet.error.ConnectError",
+    "twisted.internet.error.ConnectionLost",
+    "twisted.internet.error.TCPTimedOutError",
+    "twisted.web.client.ResponseFailed",
+    IOError,
+    "scrapy.core.downloader.handlers.http11.TunnelError",
+    "playwright.async_api.TimeoutError",
+]
 
 # Make sure ROBOTSTXT_OBEY is False if you encounter issues with robots.txt blocking Playwright
 # ROBOTSTXT_OBEY = False
@@ -1,18 +1,30 @@
 import scrapy
-from lxml import etree
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
+from scrapy.utils.project import data_path
 from urllib.parse import urljoin, urlparse
-import io
+import itertools
+import os
 import logging # Import logging
 
+from bian_scraper.frontier import Frontier, default_worker_id
+from bian_scraper.rendering import playwright_meta
+from bian_scraper.storage import FetchTierStore
+from bian_scraper.svg_extractor import extract_svg_data
+from bian_scraper.urls import DEFAULT_LANDSCAPE, canonicalize_url, landscape_prefix, normalize_version, url_priority
+
 # --- Configuration ---
 # Use the URL that requires JS rendering
 # Change START_URL to the Service Landscape root
-START_URL = "https://bian.org/servicelandscape-12-0-0/views.html"
+START_URL = f"https://bian.org/{DEFAULT_LANDSCAPE}/views.html"
+# Other landscape versions: scrapy crawl bian_svg -a version=13-0-0
+# (spooled to svg_spool.13-0-0.jl unless SVG_SPOOL_PATH is set explicitly)
+START_URL_TEMPLATE = "https://bian.org/servicelandscape-{version}/views.html"
 ALLOWED_DOMAIN = "bian.org"
-# BIAN specific attributes to extract from the root <svg> tag
-SVG_METADATA_ATTRIBUTES = ['bizzid', 'bizzsemantic', 'bizzconcept']
-# Define the SVG namespace - essential for XPath queries
-SVG_NS = {'svg': 'http://www.w3.org/2000/svg'}
+# Fetch tiers, cheapest first. Pages are downloaded with plain HTTP and only
+# escalated to Playwright when the static HTML lacks the SVGs or links we need.
+TIER_PLAIN = 'plain'
+TIER_PLAYWRIGHT = 'playwright'
 
 
 class BianSvgSpider(scrapy.Spider):
@@ -26,34 +38,138 @@ class BianSvgSpider(scrapy.Spider):
     # Custom settings moved to settings.py, but can be kept here too
     # custom_settings = { ... }
 
-    def start_requests(self):
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.tiered_fetch = crawler.settings.getbool('FETCH_TIERS_ENABLED', True)
+        tier_dir = data_path(crawler.settings.get('FETCH_TIERS_DIR', 'fetchtiers'), createdir=True)
+        spider.tiers = FetchTierStore(os.path.join(tier_dir, 'tiers.sqlite'))
+        # Rendered pages are spread round-robin over the pooled browser contexts
+        contexts = list(crawler.settings.getdict('PLAYWRIGHT_CONTEXTS')) or ['default']
+        spider.render_contexts = itertools.cycle(contexts)
+        spider.navigation_timeout = crawler.settings.getint('PLAYWRIGHT_DEFAULT_NAVIGATION_TIMEOUT', 30000)
+        spider.svg_wait_timeout = crawler.settings.getint('PLAYWRIGHT_SVG_WAIT_TIMEOUT', 15000)
+        # -a version=13-0-0 (or 13.0.0) crawls another landscape; -a start_url=... overrides it entirely
+        version = getattr(spider, 'version', None)
+        if not getattr(spider, 'start_url', None):
+            spider.start_url = START_URL_TEMPLATE.format(version=normalize_version(version)) if version else START_URL
+        # Only pages of the start URL's landscape version are crawled
+        spider.landscape = landscape_prefix(spider.start_url)
+        if spider.landscape is None:
+            raise ValueError(f"Start URL is not inside a service landscape: {spider.start_url}")
+        # Sharded mode: pages come from the shared frontier instead of being
+        # scheduled locally (see run_sharded.py and bian_scraper.frontier)
+        spider.frontier = None
+        frontier_path = crawler.settings.get('FRONTIER_PATH')
+        if frontier_path:
+            spider.frontier = Frontier(
+                frontier_path,
+                lease_seconds=crawler.settings.getfloat('FRONTIER_LEASE_SECONDS', 600),
+                max_attempts=crawler.settings.getint('FRONTIER_MAX_ATTEMPTS', 3),
+            )
+            spider.worker_id = crawler.settings.get('FRONTIER_WORKER') or default_worker_id()
+            spider.lease_batch = crawler.settings.getint('FRONTIER_LEASE_BATCH', 4)
+            # A restarted shard picks its predecessor's pages straight back up
+            reclaimed = spider.frontier.release(spider.worker_id, refund_attempt=False)
+            if reclaimed:
+                spider.logger.info(f"Worker {spider.worker_id} reclaimed {reclaimed} pages from a previous run")
+            crawler.signals.connect(spider.frontier_idle, signal=signals.spider_idle)
+        return spider
+
+    def closed(self, reason):
+        self.tiers.close()
+        if self.frontier is not None:
+            released = self.frontier.release(self.worker_id)
+            self.log(f"Worker {self.worker_id} released {released} unfinished pages; frontier: {self.frontier.counts()}", level=logging.INFO)
+            self.frontier.close()
+
+    def tier_meta(self, tier: str) -> dict:
+        """Request meta for fetching a page on the given tier."""
+        if tier == TIER_PLAYWRIGHT:
+            meta = playwright_meta(next(self.render_contexts), self.navigation_timeout, self.svg_wait_timeout)
+        else:
+            meta = {'playwright': False}
+        meta['fetch_tier'] = tier
+        return meta
+
+    def make_page_request(self, url: str) -> scrapy.Request:
         """
-        Generate initial requests using Playwright.
+        Build a page request on the cheapest tier known to work for this URL.
+        Unknown URLs start on the plain tier unless tiered fetching is disabled.
+        `url` must already be canonical; diagram pages get a higher priority.
         """
-        self.log(f"Generating initial Playwright request for: {START_URL}", level=logging.INFO)
-        yield scrapy.Request(
-            START_URL,
-            meta={'playwright': True}, # <<< Tell Scrapy to use Playwright for this request
-            callback=self.parse
-            # Initial depth is implicitly 0
+        if self.tiered_fetch:
+            tier = self.tiers.get(url) or TIER_PLAIN
+        else:
+            tier = TIER_PLAYWRIGHT
+        return scrapy.Request(
+            url,
+            callback=self.parse,
+            priority=url_priority(url),
+            meta={
+                **self.tier_meta(tier),
+                'fetch_tier_key': url,  # Survives redirects, unlike response.url
+            }
         )
 
+    def needs_rendering(self, svg_elements, links) -> bool:
+        """A plain download is usable only if it already carries both SVGs and .html links."""
+        has_svg = len(svg_elements) > 0
+        has_html_links = any(link.split('#', 1)[0].split('?', 1)[0].endswith('.html') for link in links)
+        return not (has_svg and has_html_links)
+
+    def start_requests(self):
+        """
+        Generate the initial request on the cheapest known tier.
+        In sharded mode, seed the frontier (a no-op if another worker or an
+        earlier run already did) and start on a leased batch instead.
+        """
+        if self.frontier is not None:
+            start_url = canonicalize_url(self.start_url)
+            self.frontier.add([(start_url, url_priority(start_url))])
+            yield from self.leased_requests()
+            return
+        request = self.make_page_request(canonicalize_url(self.start_url))
+        self.log(f"Generating initial {request.meta['fetch_tier']} request for: {self.start_url}", level=logging.INFO)
+        yield request
+
     def parse(self, response):
         """
-        Parses the page content (now rendered by Playwright).
-        Extracts SVG data and follows internal HTML links.
+        Parses the page content (plain HTML or rendered by Playwright).
+        Escalates plain pages that lack SVGs or links to Playwright, otherwise
+        extracts SVG data and follows internal HTML links.
         """
-        # The response object now contains the HTML *after* JS execution
-        self.log(f"Processing page (rendered by Playwright): {response.url}", level=logging.INFO)
+        tier = response.meta.get('fetch_tier', TIER_PLAYWRIGHT)
+        tier_key = response.meta.get('fetch_tier_key', response.url)
+        self.log(f"Processing page ({tier} tier): {response.url}", level=logging.INFO)
 
-        # --- Extract SVG Data ---
-        # This XPath should now work on the JS-rendered content
         svg_elements = response.xpath('//svg')
+        links = response.xpath('//a/@href').getall()
+
+        if tier == TIER_PLAIN and self.needs_rendering(svg_elements, links):
+            self.log(f"Static HTML of {response.url} lacks SVGs or links, escalating to Playwright", level=logging.INFO)
+            self.crawler.stats.inc_value('fetch_tier/escalated')
+            yield response.request.replace(
+                meta=dict(response.meta, **self.tier_meta(TIER_PLAYWRIGHT)),
+                dont_filter=True
+            )
+            return
+
+        # Remember what worked so the next crawl goes straight to this tier
+        if self.tiers.get(tier_key) != tier:
+            self.tiers.set(tier_key, tier)
+        self.crawler.stats.inc_value(f'fetch_tier/{tier}')
+
+        # --- Extract SVG Data ---
         self.log(f"Found {len(svg_elements)} SVG element(s) on {response.url}", level=logging.INFO)
 
         if not svg_elements:
              self.log(f"No SVG elements found using XPath '//svg' on {response.url}", level=logging.WARNING)
 
+        # Internal page links, canonicalized once: followed below and kept on
+        # each item so ingestion can build the diagram link graph
+        page_links = self.internal_links(response.url, links)
+
         for i, svg_selector in enumerate(svg_elements):
             self.log(f"Processing SVG #{i+1} on {response.url}", level=logging.DEBUG)
             svg_string = svg_selector.get()
@@ -66,7 +182,10 @@ class BianSvgSpider(scrapy.Spider):
                     'svg_index': i + 1,
                     'metadata': svg_data['metadata'],
                     'text_elements': svg_data['text_elements'],
-                    'svg_content': svg_string
+                    'svg_content': svg_string,
+                    # Pages the diagram itself links to (its shapes are anchors)
+                    'links': self.internal_links(response.url, svg_data['links']),
+                    'page_links': page_links,
                 }
             else:
                  self.log(f"Failed to extract data from SVG #{i+1} on {response.url}. extract_svg_data returned None.", level=logging.WARNING)
@@ -78,68 +197,90 @@ class BianSvgSpider(scrapy.Spider):
         # self.log(f"Current depth: {current_depth}", level=logging.DEBUG)
         # if current_depth < 1: # REMOVE DEPTH LIMIT
         self.log(f"Following links from {response.url}", level=logging.DEBUG)
-        links = response.xpath('//a/@href').getall()
         self.log(f"Found {len(links)} potential links", level=logging.DEBUG)
-        followed_count = 0
-        for link in links:
-            absolute_url = urljoin(response.url, link)
-            parsed_url = urlparse(absolute_url)
-
-            if parsed_url.netloc == ALLOWED_DOMAIN and absolute_url.endswith('.html'):
-                 self.log(f"Found valid internal HTML link to follow: {absolute_url}", level=logging.DEBUG)
-                 followed_count += 1
-                 # Also use Playwright for followed links
-                 yield scrapy.Request(
-                     absolute_url,
-                     callback=self.parse,
-                     meta={
-                         'playwright': True, # <<< Use Playwright here too
-                         # 'depth': current_depth + 1 # Remove depth tracking
-                     }
-                 )
-        self.log(f"Finished checking links on {response.url}. Followed {followed_count} valid links.", level=logging.DEBUG)
+        if self.frontier is not None:
+            # Discovered pages go to the shared frontier; whichever worker leases them fetches them
+            added = self.frontier.add((url, url_priority(url)) for url in page_links)
+            self.crawler.stats.inc_value('frontier/discovered', added)
+            self.frontier.complete(response.meta.get('frontier_url', tier_key), self.worker_id)
+            self.crawler.stats.inc_value('frontier/completed')
+            return
+        for absolute_url in page_links:
+            self.log(f"Found valid internal HTML link to follow: {absolute_url}", level=logging.DEBUG)
+            # Followed links start on their cheapest known tier too
+            yield self.make_page_request(absolute_url)
+        self.log(f"Finished checking links on {response.url}. Followed {len(page_links)} valid links.", level=logging.DEBUG)
         # else: # REMOVE DEPTH LIMIT
         #     self.log(f"Not following links from {response.url} (depth limit reached)", level=logging.DEBUG) # REMOVE DEPTH LIMIT
 
 
+    def leased_requests(self) -> list:
+        """Lease the next batch of pages from the frontier and build their requests."""
+        self.frontier.renew(self.worker_id)
+        requests = []
+        for url in self.frontier.lease(self.worker_id, self.lease_batch):
+            request = self.make_page_request(url)
+            # The frontier already deduplicates; a page re-leased after an
+            # expired lease must not be dropped by this worker's dupefilter
+            request = request.replace(
+                meta=dict(request.meta, frontier_url=url),
+                errback=self.frontier_failed,
+                dont_filter=True,
+            )
+            requests.append(request)
+        self.crawler.stats.inc_value('frontier/leased', len(requests))
+        return requests
+
+    def frontier_idle(self, spider):
+        """
+        spider_idle handler: keep the worker alive while the frontier has work.
+        Other workers may still be discovering pages, so an empty lease only
+        ends the crawl once nothing is pending or leased anywhere.
+        """
+        requests = self.leased_requests()
+        for request in requests:
+            self.crawler.engine.crawl(request)
+        if requests or not self.frontier.drained():
+            raise DontCloseSpider
+
+    def frontier_failed(self, failure):
+        """Errback of leased pages: hand the page back after Scrapy's own retries gave up."""
+        request = failure.request
+        self.log(f"Failed {request.url}: {failure.value!r}", level=logging.WARNING)
+        self.frontier.fail(request.meta['frontier_url'], self.worker_id)
+        self.crawler.stats.inc_value('frontier/failed')
+
+    def internal_links(self, base_url: str, hrefs) -> list:
+        """
+        Canonical URLs of the internal .html pages among `hrefs`, deduplicated in
+        document order. Canonicalizing collapses query order, fragments, host and
+        version-prefix variants of a page; other landscape versions are dropped.
+        """
+        seen = set()
+        internal = []
+        for href in hrefs:
+            try:
+                absolute_url = canonicalize_url(urljoin(base_url, href), self.landscape)
+            except ValueError:
+                continue  # Malformed href (e.g. unbalanced IPv6 brackets)
+            if absolute_url is None or absolute_url in seen:
+                continue
+            seen.add(absolute_url)
+            parsed_url = urlparse(absolute_url)
+            if parsed_url.netloc == ALLOWED_DOMAIN and parsed_url.path.endswith('.html'):
+                internal.append(absolute_url)
+        return internal
+
     def extract_svg_data(self, svg_string: str, source_url: str, svg_index: int) -> dict | None:
-        """Parses a single SVG string and extracts metadata and text using lxml."""
+        """Extracts metadata and text from a single SVG string (one lxml parse, queried with XPath; see svg_extractor)."""
         self.log(f"[Extract Func] Parsing SVG #{svg_index} from {source_url}", level=logging.DEBUG)
-        try:
-            parser = etree.XMLParser(remove_blank_text=True, recover=True)
-            svg_bytes = io.BytesIO(svg_string.encode('utf-8'))
-            tree = etree.parse(svg_bytes, parser)
-            root = tree.getroot()
-
-            if root is None:
-                self.log(f"[Extract Func] Failed to parse SVG #{svg_index}: Root element is None.", level=logging.WARNING)
-                return None
-
-            if '}' in root.tag:
-                tag_local_name = root.tag.split('}', 1)[1]
-            else:
-                tag_local_name = root.tag
-
-            if tag_local_name != 'svg':
-                 self.log(f"[Extract Func] Parsed root element for SVG #{svg_index} is not SVG: <{root.tag}>. Skipping.", level=logging.WARNING)
-                 return None
-
-            self.log(f"[Extract Func] Root element is <{root.tag}>. Proceeding with extraction for SVG #{svg_index}.", level=logging.DEBUG)
-            extracted_data = {'metadata': {}, 'text_elements': []}
-            for attr in SVG_METADATA_ATTRIBUTES:
-                attr_value = root.get(attr)
-                extracted_data['metadata'][attr] = attr_value
-                self.log(f"[Extract Func] SVG #{svg_index} Metadata '{attr}': {attr_value}", level=logging.DEBUG)
-
-            text_nodes = root.xpath('.//svg:text//text()', namespaces=SVG_NS)
-            extracted_data['text_elements'] = [text.strip() for text in text_nodes if text.strip()]
-            self.log(f"[Extract Func] SVG #{svg_index} Found {len(extracted_data['text_elements'])} text elements.", level=logging.DEBUG)
-
-            self.log(f"[Extract Func] Successfully parsed SVG #{svg_index}.", level=logging.DEBUG)
-            return extracted_data
-        except etree.XMLSyntaxError as e:
-            self.log(f"[Extract Func] Error parsing SVG #{svg_index} XML: {e}. SVG snippet: {svg_string[:200]}...", level=logging.ERROR)
+        extracted_data = extract_svg_data(svg_string)
+        if extracted_data is None:
+            self.log(f"[Extract Func] SVG #{svg_index} is not a parseable <svg>. SVG snippet: {svg_string[:200]}...", level=logging.WARNING)
             return None
-        except Exception as e:
-            self.log(f"[Extract Func] An unexpected error occurred during SVG #{svg_index} parsing: {e}", level=logging.ERROR)
-            return None 
\ No newline at end of file
+        self.log(
+            f"[Extract Func] SVG #{svg_index} Metadata: {extracted_data['metadata']}, "
+            f"{len(extracted_data['text_elements'])} text elements, {extracted_data['shape_count']} shapes.",
+            level=logging.DEBUG
+        )
+        return extracted_data
@@ -0,0 +1,120 @@
+# Persistent, on-disk crawl state shared across crawls.
+#
+# Everything lives in small SQLite files under the Scrapy project data
+# directory (.scrapy/), next to where HttpCacheMiddleware would keep its cache.
+
+import logging
+import os
+import sqlite3
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+class SqliteStore:
+    """Thin wrapper around a SQLite file used for crawl state."""
+
+    SCHEMA = ()
+
+    def __init__(self, path: str):
+        self.path = path
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        # Scrapy callbacks and middlewares all run on the reactor thread, but the
+        # asyncio reactor may hop threads for Playwright, so do not pin the connection.
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in self.SCHEMA:
+            self.conn.execute(statement)
+        self.conn.commit()
+
+    def close(self):
+        try:
+            self.conn.commit()
+            self.conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Error closing {self.path}: {e}")
+
+
+class RenderCache(SqliteStore):
+    """
+    Rendered HTML keyed by URL, with the validators (ETag / Last-Modified)
+    the origin sent when the page was last fetched.
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS pages (
+            url TEXT PRIMARY KEY,
+            body BLOB NOT NULL,
+            encoding TEXT,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at REAL NOT NULL,
+            validated_at REAL NOT NULL
+        )
+        """,
+    )
+
+    def get(self, url: str) -> dict | None:
+        row = self.conn.execute(
+            "SELECT body, encoding, etag, last_modified, fetched_at, validated_at FROM pages WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        body, encoding, etag, last_modified, fetched_at, validated_at = row
+        return {
+            'url': url,
+            'body': zlib.decompress(body),
+            'encoding': encoding or 'utf-8',
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': fetched_at,
+            'validated_at': validated_at,
+        }
+
+    def put(self, url: str, body: bytes, encoding: str | None, etag: str | None, last_modified: str | None):
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pages (url, body, encoding, etag, last_modified, fetched_at, validated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (url, zlib.compress(body, 6), encoding, etag, last_modified, now, now),
+        )
+        self.conn.commit()
+
+    def touch(self, url: str):
+        """Mark an entry as revalidated (origin answered 304 Not Modified)."""
+        self.conn.execute("UPDATE pages SET validated_at = ? WHERE url = ?", (time.time(), url))
+        self.conn.commit()
+
+
+class FetchTierStore(SqliteStore):
+    """
+    Remembers, per URL, the cheapest fetch tier that produced a usable page
+    ('plain' HTTP download or 'playwright' rendering).
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS tiers (
+            url TEXT PRIMARY KEY,
+            tier TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """,
+    )
+
+    def get(self, url: str) -> str | None:
+        row = self.conn.execute("SELECT tier FROM tiers WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, url: str, tier: str):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO tiers (url, tier, updated_at) VALUES (?, ?, ?)",
+            (url, tier, time.time()),
+        )
+        self.conn.commit()
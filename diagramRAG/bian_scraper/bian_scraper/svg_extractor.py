@@ -0,0 +1,134 @@
+# SVG extraction shared by the spider and the validation script
+# (db_initializer/extract_bian_svg.py).
+#
+# Each SVG is parsed once, straight from the str (no re-encoding into a
+# BytesIO), by lxml's C tree builder; root attributes, <text> content, link
+# targets and element/shape counts are then read with precompiled XPath
+# expressions and C-level iteration. A pure SAX/iterparse pass was measured
+# too (benchmarks/bench_extract.py) but its per-event Python callbacks made it
+# about twice as slow as building the tree in C.
+
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from lxml import etree
+
+# BIAN specific attributes to extract from the root <svg> tag
+SVG_METADATA_ATTRIBUTES = ['bizzid', 'bizzsemantic', 'bizzconcept']
+SVG_NAMESPACE = 'http://www.w3.org/2000/svg'
+XLINK_NAMESPACE = 'http://www.w3.org/1999/xlink'
+SHAPE_TAGS = ('rect', 'circle', 'ellipse', 'line', 'polyline', 'polygon', 'path', 'image', 'use')
+
+# Below this many SVGs a process pool costs more than it saves
+PARALLEL_THRESHOLD = 256
+
+# Comments and scripts are matched (and skipped) so '<svg' inside them is ignored
+_SVG_TAG_RE = re.compile(
+    r'<!--.*?-->|<script\b.*?</script\s*>|<(/?)svg(?=[\s>/])',
+    re.IGNORECASE | re.DOTALL,
+)
+
+_PARSER = etree.XMLParser(recover=True, huge_tree=True, resolve_entities=False)
+
+
+class _Queries:
+    """Precompiled queries for SVGs with or without the SVG default namespace."""
+
+    def __init__(self, namespace: str | None):
+        ns = {'svg': namespace, 'xlink': XLINK_NAMESPACE} if namespace else {'xlink': XLINK_NAMESPACE}
+        prefix = 'svg:' if namespace else ''
+        # Text and link targets come back from one evaluation, in document order
+        self.texts_and_links = etree.XPath(
+            f".//{prefix}text//text() | .//{prefix}a/@href | .//{prefix}a/@xlink:href",
+            namespaces=ns,
+        )
+        self.element_count = etree.XPath("count(.//*) + 1")
+        self.shape_tags = tuple(f"{{{namespace}}}{tag}" if namespace else tag for tag in SHAPE_TAGS)
+
+
+_NAMESPACED = _Queries(SVG_NAMESPACE)
+_PLAIN = _Queries(None)
+
+
+def extract_svg_data(svg_string: str) -> dict | None:
+    """
+    Parse one SVG string and extract everything ingestion needs in one go.
+
+    Returns a dict with 'metadata' (the BIAN root attributes, None when
+    missing), 'text_elements', 'links', 'element_count' and 'shape_count',
+    or None when the string is not an SVG or cannot be parsed.
+    """
+    try:
+        try:
+            root = etree.fromstring(svg_string, _PARSER)
+        except ValueError:
+            # str input with an XML encoding declaration must be given as bytes
+            root = etree.fromstring(svg_string.encode('utf-8'), _PARSER)
+    except etree.XMLSyntaxError:
+        return None
+    if root is None or not isinstance(root.tag, str):
+        return None
+
+    qname = etree.QName(root)
+    if qname.localname != 'svg':
+        return None
+    queries = _NAMESPACED if qname.namespace == SVG_NAMESPACE else _PLAIN
+
+    text_elements = []
+    links = []
+    for node in queries.texts_and_links(root):
+        if node.is_attribute:
+            links.append(str(node))
+        else:
+            text = node.strip()
+            if text:
+                text_elements.append(text)
+
+    return {
+        'metadata': {attr: root.get(attr) for attr in SVG_METADATA_ATTRIBUTES},
+        'text_elements': text_elements,
+        'links': links,
+        'element_count': int(queries.element_count(root)),
+        'shape_count': sum(1 for _ in root.iter(*queries.shape_tags)),
+    }
+
+
+def extract_many(svg_strings: list, processes: int | None = None, chunksize: int = 32) -> list:
+    """
+    Extract a batch of SVGs, fanning out to a process pool for large batches.
+    Results are returned in input order.
+    """
+    if processes == 1 or len(svg_strings) < PARALLEL_THRESHOLD:
+        return [extract_svg_data(svg) for svg in svg_strings]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(extract_svg_data, svg_strings, chunksize=chunksize))
+
+
+def iter_svg_fragments(html: str):
+    """
+    Yield every top-level <svg>...</svg> fragment of an HTML document as the
+    original source text, scanning tags with a regex instead of parsing the page.
+    """
+    depth = 0
+    start = None
+    for match in _SVG_TAG_RE.finditer(html):
+        if match.group(1) is None:
+            continue  # Comment or script block
+        closing = match.group(1) == '/'
+        if not closing:
+            tag_end = html.find('>', match.end())
+            if tag_end != -1 and html[tag_end - 1] == '/':
+                # Self-closing <svg/>: a complete (empty) fragment on its own
+                if depth == 0:
+                    yield html[match.start():tag_end + 1]
+                continue
+            if depth == 0:
+                start = match.start()
+            depth += 1
+        elif depth:
+            depth -= 1
+            if depth == 0:
+                end = html.find('>', match.end())
+                if end == -1:
+                    return
+                yield html[start:end + 1]
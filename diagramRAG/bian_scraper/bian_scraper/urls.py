@@ -0,0 +1,106 @@
+# URL canonicalization and crawl-order scoring for bian.org pages.
+#
+# BIAN pages are reachable under many spellings (query params in any order,
+# fragments, www./bare host, differently cased landscape prefixes), which
+# Scrapy's fingerprint dedup treats as distinct pages.
+
+import os
+import posixpath
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# e.g. /servicelandscape-12-0-0/..., /ServiceLandscape_12.0.0/...
+LANDSCAPE_PREFIX_RE = re.compile(r'^/servicelandscape[-_.](\d+)[-_.](\d+)[-_.](\d+)(?=/|$)', re.IGNORECASE)
+VERSION_RE = re.compile(r'^(\d+)[-_.](\d+)[-_.](\d+)$')
+# Landscape crawled when no version is given; its spool keeps the plain file name
+DEFAULT_LANDSCAPE = 'servicelandscape-12-0-0'
+# Query parameters that never change the page content
+IGNORED_QUERY_PARAMS = frozenset({'fbclid', 'gclid', 'msclkid', '_ga', 'ref'})
+IGNORED_QUERY_PREFIXES = ('utm_',)
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Crawl-order scores: pages that carry diagrams are fetched first
+PAGE_PRIORITIES = (
+    ('view_', 100),
+    ('object_', 80),
+)
+
+
+def normalize_version(version: str) -> str:
+    """'13.0.0' / '13_0_0' / '13-0-0' -> '13-0-0'"""
+    match = VERSION_RE.match(version.strip())
+    if not match:
+        raise ValueError(f"Invalid landscape version: {version!r} (expected e.g. '13-0-0')")
+    return '-'.join(match.groups())
+
+
+def landscape_spool_path(path: str, landscape: str | None) -> str:
+    """
+    Spool path for a landscape: the default landscape keeps `path`, other
+    versions get theirs inserted before the extension (svg_spool.13-0-0.jl),
+    the same rule db_initializer applies (corpora.spool_path).
+    """
+    if not landscape or landscape == DEFAULT_LANDSCAPE:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{landscape[len('servicelandscape-'):]}{ext}"
+
+
+def landscape_prefix(url: str) -> str | None:
+    """Return the canonical landscape prefix of a URL, e.g. 'servicelandscape-12-0-0'."""
+    match = LANDSCAPE_PREFIX_RE.match(urlsplit(url).path)
+    if not match:
+        return None
+    return 'servicelandscape-{}-{}-{}'.format(*match.groups())
+
+
+def canonicalize_url(url: str, landscape: str | None = None) -> str | None:
+    """
+    Normalize a bian.org URL so that every spelling of a page maps to one string.
+
+    Lowercases scheme and host, drops 'www.', default ports and the fragment,
+    removes tracking parameters, sorts the query string and rewrites the
+    landscape prefix to its canonical form. When `landscape` is given, URLs
+    under a different landscape version return None, as do malformed URLs
+    (bad port, unbalanced IPv6 brackets) so one broken href cannot abort a page.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = (parts.scheme or 'https').lower()
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    netloc = host
+    if port and port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{port}"
+
+    path = parts.path or '/'
+    path = posixpath.normpath(path) if path != '/' else path
+    if parts.path.endswith('/') and not path.endswith('/'):
+        path += '/'
+    path = re.sub(r'/{2,}', '/', path)
+    match = LANDSCAPE_PREFIX_RE.match(path)
+    if match:
+        prefix = 'servicelandscape-{}-{}-{}'.format(*match.groups())
+        if landscape and prefix != landscape:
+            return None
+        path = '/' + prefix + path[match.end():]
+
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in IGNORED_QUERY_PARAMS and not key.lower().startswith(IGNORED_QUERY_PREFIXES)
+    ]
+    query.sort()
+    return urlunsplit((scheme, netloc, path, urlencode(query), ''))
+
+
+def url_priority(url: str) -> int:
+    """Scheduler priority for a page: diagram-bearing views and objects first."""
+    name = posixpath.basename(urlsplit(url).path).lower()
+    for prefix, priority in PAGE_PRIORITIES:
+        if name.startswith(prefix):
+            return priority
+    return 0
@@ -0,0 +1,147 @@
+# Sharded crawl launcher.
+#
+#     python run_sharded.py --workers 4                 # crawl servicelandscape-12-0-0
+#     python run_sharded.py --workers 4 --version 13-0-0   # -> svg_spool.13-0-0.jl
+#
+# Starts N `scrapy crawl bian_svg` workers that lease pages from one SQLite
+# frontier and share one per-domain token bucket (bian_scraper.frontier), so
+# Playwright rendering runs on N cores while bian.org sees at most
+# GLOBAL_RATE_LIMIT requests per second in total. Each worker appends to its own
+# spool; when all workers have finished the spools are merged (deduplicated by
+# svg_hash) into the spool db_initializer/inject_data.py reads.
+#
+# Crawl state lives under --crawl-dir. Running the same command again after a
+# crash or Ctrl-C resumes: finished pages are skipped, leases of dead workers
+# expire and are handed out again.
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from bian_scraper.frontier import Frontier
+from bian_scraper.pipelines import merge_spools
+from bian_scraper.spiders.bian_svg_spider import START_URL, START_URL_TEMPLATE
+from bian_scraper.urls import landscape_prefix, landscape_spool_path, normalize_version
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+POLL_INTERVAL = 2.0
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def shard_spool(crawl_dir: str, shard: int) -> str:
+    return os.path.join(crawl_dir, 'spools', f'shard-{shard}.jl')
+
+
+def worker_command(args, shard: int) -> list:
+    crawl_dir = os.path.abspath(args.crawl_dir)
+    settings = {
+        'FRONTIER_PATH': os.path.join(crawl_dir, 'frontier.sqlite'),
+        'FRONTIER_WORKER': f'shard-{shard}',  # Stable, so a restarted shard reclaims its own leases
+        'GLOBAL_RATE_LIMIT_PATH': os.path.join(crawl_dir, 'ratelimit.sqlite'),
+        'GLOBAL_RATE_LIMIT': args.rate,
+        'GLOBAL_RATE_BURST': args.burst,
+        'SVG_SPOOL_PATH': shard_spool(crawl_dir, shard),
+        'LOG_FILE': os.path.join(crawl_dir, 'logs', f'shard-{shard}.log'),
+        'LOG_LEVEL': args.log_level,
+        # The shared token bucket is the politeness limit; per-process delays would only divide it further
+        'DOWNLOAD_DELAY': 0,
+        'AUTOTHROTTLE_ENABLED': False,
+    }
+    command = [sys.executable, '-m', 'scrapy', 'crawl', 'bian_svg']
+    for name, value in settings.items():
+        command += ['-s', f'{name}={value}']
+    if args.version:
+        command += ['-a', f'version={args.version}']
+    return command
+
+
+def run_workers(args) -> bool:
+    """Run the workers to completion, restarting crashed ones while the frontier has work."""
+    os.makedirs(os.path.join(args.crawl_dir, 'spools'), exist_ok=True)
+    os.makedirs(os.path.join(args.crawl_dir, 'logs'), exist_ok=True)
+    frontier = Frontier(os.path.join(args.crawl_dir, 'frontier.sqlite'))
+    logging.info(f"Frontier before start: {frontier.counts() or 'empty'}")
+
+    workers = {}
+    restarts = {shard: 0 for shard in range(args.workers)}
+    for shard in range(args.workers):
+        workers[shard] = subprocess.Popen(worker_command(args, shard), cwd=PROJECT_DIR)
+        logging.info(f"Started shard-{shard} (pid {workers[shard].pid})")
+
+    ok = True
+    last_report = time.time()
+    try:
+        while workers:
+            time.sleep(POLL_INTERVAL)
+            for shard, process in list(workers.items()):
+                code = process.poll()
+                if code is None:
+                    continue
+                del workers[shard]
+                if code == 0:
+                    logging.info(f"shard-{shard} finished")
+                elif restarts[shard] < args.max_restarts and not frontier.drained():
+                    restarts[shard] += 1
+                    workers[shard] = subprocess.Popen(worker_command(args, shard), cwd=PROJECT_DIR)
+                    logging.warning(f"shard-{shard} exited with {code}, restart {restarts[shard]}/{args.max_restarts}")
+                else:
+                    ok = False
+                    logging.error(f"shard-{shard} exited with {code}")
+            if time.time() - last_report >= 30:
+                logging.info(f"Frontier: {frontier.counts()}, workers running: {len(workers)}")
+                last_report = time.time()
+    except KeyboardInterrupt:
+        # Workers got the SIGINT too and shut down gracefully, releasing their leases
+        logging.warning("Interrupted; waiting for workers to stop. Run the same command again to resume.")
+        for process in workers.values():
+            process.wait()
+        ok = False
+    finally:
+        logging.info(f"Frontier: {frontier.counts()}")
+        frontier.close()
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a sharded BIAN SVG crawl over a shared SQLite frontier")
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help="Worker processes (each with its own browser)")
+    parser.add_argument('--version', help="Landscape version to crawl, e.g. 13-0-0 (default: the spider's START_URL)")
+    parser.add_argument('--crawl-dir', default=None, help="Frontier, rate-limit state, shard spools and logs (default crawls/sharded-<landscape>)")
+    parser.add_argument('--output', default=None, help="Merged spool for db_initializer/inject_data.py (default svg_spool.jl, svg_spool.<version>.jl for other versions)")
+    parser.add_argument('--rate', type=float, default=0.5, help="Total requests per second to bian.org across all workers")
+    parser.add_argument('--burst', type=float, default=2, help="Token bucket capacity")
+    parser.add_argument('--max-restarts', type=int, default=3, help="Restarts per crashed worker")
+    parser.add_argument('--log-level', default='INFO', help="Scrapy log level of the workers")
+    parser.add_argument('--merge-only', action='store_true', help="Only merge the shard spools of an earlier run (even if it did not finish)")
+    args = parser.parse_args()
+
+    try:
+        start_url = START_URL_TEMPLATE.format(version=normalize_version(args.version)) if args.version else START_URL
+    except ValueError as e:
+        parser.error(str(e))
+    landscape = landscape_prefix(start_url)
+    if not args.crawl_dir:
+        args.crawl_dir = os.path.join(PROJECT_DIR, 'crawls', f'sharded-{landscape}')
+    if not args.output:
+        # Same per-version spool name as a single-process crawl of that version
+        args.output = landscape_spool_path(os.path.join(PROJECT_DIR, 'svg_spool.jl'), landscape)
+
+    if not args.merge_only and not run_workers(args):
+        # Keep the previous merged spool: replacing it with a partial one (and
+        # its .done marker) would let inject_data.py --follow treat the crawl as finished
+        logging.warning("Not every page was crawled; run the same command again to resume (spools not merged)")
+        exit(1)
+    shard_paths = sorted(
+        os.path.join(args.crawl_dir, 'spools', name)
+        for name in os.listdir(os.path.join(args.crawl_dir, 'spools'))
+        if name.endswith('.jl')
+    )
+    stats = merge_spools(shard_paths, args.output)
+    logging.info(
+        f"Merged {stats['shards']} shard spools into {args.output}: {stats['records']} diagrams, "
+        f"{stats['duplicates']} cross-shard duplicates, {stats['truncated']} truncated lines"
+    )
@@ -0,0 +1,42 @@
+# 进程内 LRU 缓存，命中/未命中计入 diagram_rag_cache_requests_total
+import threading
+from collections import OrderedDict
+
+from telemetry import record_cache_lookup
+
+_MISSING = object()
+
+
+class LRUCache:
+    """线程安全的定长 LRU 缓存"""
+
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is not _MISSING:
+                self._data.move_to_end(key)
+        hit = value is not _MISSING
+        record_cache_lookup(self.name, hit)
+        return value if hit else default
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
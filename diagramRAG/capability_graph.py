@@ -0,0 +1,298 @@
+# 业务能力图谱: 客户旅程阶段 -> 服务时刻 -> 业务能力 (L1 > L2 > 能力) / L2 流程 -> BIAN 图表
+#
+# 图在注入阶段由 db_initializer/build_capability_graph.py 预先构建并保存为 JSON，
+# API 启动时加载。节点名称统一驻留在一张字符串表中，边以 CSR 邻接数组
+# (offsets/targets) 保存，查询邻居只是一次数组切片，不需要向量检索。
+import csv
+import json
+import logging
+import re
+from array import array
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# 节点类型
+STAGE = "stage"
+MOMENT = "moment"
+L1 = "l1"
+L2 = "l2"
+CAPABILITY = "capability"
+PROCESS = "process"
+DIAGRAM = "diagram"
+NODE_KINDS = (STAGE, MOMENT, L1, L2, CAPABILITY, PROCESS, DIAGRAM)
+
+# CSV 由 Excel 导出，编码为 Windows-1252
+CSV_ENCODING = "cp1252"
+
+_LEVEL_SUFFIX_RE = re.compile(r"\s*\(L\d\)\s*$")
+_PROCESS_RE = re.compile(r"^([A-Z]+\d+(?:\.\d+)*)\s*[-–—]\s*(.+)$")
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# 匹配图表文本时忽略的词
+_STOPWORDS = frozenset({"and", "or", "of", "the", "a", "an", "to", "for", "in", "on", "with", "management", "manage"})
+
+
+def parse_capability_csv(path: str) -> Iterator[Dict]:
+    """
+    逐行解析客户旅程映射 CSV，返回:
+    {stage, moment, capabilities: [(l1, l2, capability)], processes: [(code, name)]}
+    CJM Stage 为空的行沿用上一行的阶段
+    """
+    stage = ""
+    with open(path, newline="", encoding=CSV_ENCODING) as f:
+        for row in csv.DictReader(f):
+            stage = (row.get("CJM Stage") or "").strip() or stage
+            moment = (row.get("Customer Journey Service Moment") or "").strip()
+            if not moment:
+                continue
+            capabilities = []
+            for line in (row.get("Enabled by Business Capability") or "").splitlines():
+                parts = [_LEVEL_SUFFIX_RE.sub("", part).strip() for part in line.split(">")]
+                if len(parts) == 3 and all(parts):
+                    capabilities.append(tuple(parts))
+            processes = []
+            for line in (row.get("Enabled by Process") or "").splitlines():
+                match = _PROCESS_RE.match(line.strip())
+                if match:
+                    processes.append((match.group(1), match.group(2).strip()))
+            yield {"stage": stage, "moment": moment, "capabilities": capabilities, "processes": processes}
+
+
+def _tokens(text: str) -> Tuple[str, ...]:
+    # 简单去掉复数 s，使 "Leads" 与 "Lead" 匹配
+    return tuple(
+        token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token
+        for token in _TOKEN_RE.findall(text.lower())
+        if token not in _STOPWORDS
+    )
+
+
+class CapabilityGraphBuilder:
+    """收集节点和边，build() 时压缩为 CapabilityGraph"""
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+        self.kinds: List[int] = []
+        self.names: List[int] = []
+        self.labels: List[int] = []
+        self._node_ids: Dict[Tuple[int, str], int] = {}
+        self.edges: Set[Tuple[int, int]] = set()
+        self.diagram_urls: Dict[int, str] = {}
+
+    def intern(self, text: str) -> int:
+        string_id = self._string_ids.get(text)
+        if string_id is None:
+            string_id = self._string_ids[text] = len(self.strings)
+            self.strings.append(text)
+        return string_id
+
+    def node(self, kind: str, name: str, label: Optional[str] = None) -> int:
+        kind_id = NODE_KINDS.index(kind)
+        key = (kind_id, name)
+        node_id = self._node_ids.get(key)
+        if node_id is None:
+            node_id = self._node_ids[key] = len(self.kinds)
+            self.kinds.append(kind_id)
+            self.names.append(self.intern(name))
+            self.labels.append(self.intern(label or name))
+        return node_id
+
+    def link(self, a: int, b: int):
+        if a != b:
+            self.edges.add((a, b))
+            self.edges.add((b, a))
+
+    def add_csv(self, path: str) -> int:
+        rows = 0
+        for row in parse_capability_csv(path):
+            rows += 1
+            stage = self.node(STAGE, row["stage"])
+            moment = self.node(MOMENT, row["moment"])
+            self.link(stage, moment)
+            for l1_name, l2_name, capability_name in row["capabilities"]:
+                l1 = self.node(L1, l1_name)
+                # 同名 L2/能力可能出现在不同父级下，名称带上路径保证唯一
+                l2 = self.node(L2, f"{l1_name} > {l2_name}", l2_name)
+                capability = self.node(CAPABILITY, f"{l1_name} > {l2_name} > {capability_name}", capability_name)
+                self.link(l1, l2)
+                self.link(l2, capability)
+                self.link(moment, capability)
+            for code, process_name in row["processes"]:
+                self.link(moment, self.node(PROCESS, code, f"{code} - {process_name}"))
+        return rows
+
+    def add_diagrams(self, diagrams: Iterable[Dict], max_per_capability: int = 20) -> int:
+        """
+        通过图表的文本元素把能力链接到图表: 能力名称的关键词全部 (或至少两个且过半) 出现在某个
+        文本元素中，或文本元素的关键词都包含在能力名称中，即视为一次命中；每个能力保留命中最多的图表
+        diagrams: {id, text_elements, source_url?, bizzid?, bizzconcept?}
+        """
+        capabilities = [
+            (node_id, set(_tokens(self.strings[self.labels[node_id]])))
+            for node_id, kind in enumerate(self.kinds)
+            if NODE_KINDS[kind] == CAPABILITY
+        ]
+        # 关键词 -> 包含该词的能力，避免每个文本元素都与全部能力比较
+        by_token: Dict[str, List[int]] = {}
+        for position, (_, tokens) in enumerate(capabilities):
+            for token in tokens:
+                by_token.setdefault(token, []).append(position)
+
+        hits: Dict[int, Dict[int, int]] = {}
+        diagram_count = 0
+        for diagram in diagrams:
+            diagram_count += 1
+            matched: Dict[int, int] = {}
+            for element in set(diagram.get("text_elements") or []):
+                element_tokens = set(_tokens(element))
+                if not element_tokens:
+                    continue
+                candidates = {p for token in element_tokens for p in by_token.get(token, ())}
+                for position in candidates:
+                    capability_tokens = capabilities[position][1]
+                    shared = len(capability_tokens & element_tokens)
+                    if (
+                        shared == len(capability_tokens)
+                        or (shared >= 2 and 2 * shared >= len(capability_tokens))
+                        or (len(element_tokens) >= 2 and element_tokens <= capability_tokens)
+                    ):
+                        matched[position] = matched.get(position, 0) + 1
+            if not matched:
+                continue
+            label = diagram.get("bizzconcept") or "BIAN Diagram"
+            if diagram.get("bizzid"):
+                label = f"{label} ({diagram['bizzid']})"
+            diagram_node = self.node(DIAGRAM, diagram["id"], label)
+            if diagram.get("source_url"):
+                self.diagram_urls[diagram_node] = diagram["source_url"]
+            for position, count in matched.items():
+                hits.setdefault(position, {})[diagram_node] = count
+
+        links = 0
+        for position, by_diagram in hits.items():
+            ranked = sorted(by_diagram.items(), key=lambda item: (-item[1], item[0]))[:max_per_capability]
+            for diagram_node, _ in ranked:
+                self.link(capabilities[position][0], diagram_node)
+                links += 1
+        logging.info(f"Linked {len(hits)} capabilities to diagrams ({links} links from {diagram_count} diagrams)")
+        return links
+
+    def build(self) -> "CapabilityGraph":
+        offsets = array("I", [0] * (len(self.kinds) + 1))
+        for source, _ in self.edges:
+            offsets[source + 1] += 1
+        for i in range(len(self.kinds)):
+            offsets[i + 1] += offsets[i]
+        targets = array("I", [0] * len(self.edges))
+        fill = array("I", offsets[:-1])
+        for source, target in sorted(self.edges):
+            targets[fill[source]] = target
+            fill[source] += 1
+        return CapabilityGraph(
+            self.strings, array("B", self.kinds), array("I", self.names), array("I", self.labels),
+            offsets, targets, self.diagram_urls,
+        )
+
+
+class CapabilityGraph:
+    """只读的能力图谱: 驻留字符串表 + CSR 邻接数组"""
+
+    def __init__(self, strings, kinds, names, labels, offsets, targets, diagram_urls=None):
+        self.strings = strings
+        self.kinds = kinds
+        self.names = names
+        self.labels = labels
+        self.offsets = offsets
+        self.targets = targets
+        self.diagram_urls = diagram_urls or {}
+        self._lower_labels = [strings[label].lower() for label in labels]
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets) // 2
+
+    def kind(self, node_id: int) -> str:
+        return NODE_KINDS[self.kinds[node_id]]
+
+    def neighbors(self, node_id: int) -> array:
+        return self.targets[self.offsets[node_id]:self.offsets[node_id + 1]]
+
+    def describe(self, node_id: int) -> Dict:
+        node = {
+            "id": node_id,
+            "kind": self.kind(node_id),
+            "name": self.strings[self.names[node_id]],
+            "label": self.strings[self.labels[node_id]],
+        }
+        if node_id in self.diagram_urls:
+            node["source_url"] = self.diagram_urls[node_id]
+        return node
+
+    def search(self, query: str, kind: Optional[str] = None, limit: int = 20) -> List[int]:
+        """按名称查找节点: 完全匹配优先，其次前缀，再次子串"""
+        query = query.strip().lower()
+        kind_id = NODE_KINDS.index(kind) if kind else None
+        ranked = []
+        for node_id, label in enumerate(self._lower_labels):
+            if kind_id is not None and self.kinds[node_id] != kind_id:
+                continue
+            position = label.find(query)
+            if position < 0:
+                continue
+            rank = 0 if label == query else 1 if position == 0 else 2
+            ranked.append((rank, len(label), node_id))
+        ranked.sort()
+        return [node_id for _, _, node_id in ranked[:limit]]
+
+    def traverse(self, start: int, depth: int = 2, kinds: Optional[Set[str]] = None, limit: int = 100) -> List[Tuple[int, int]]:
+        """从 start 出发广度优先遍历，返回 (节点, 距离)；kinds 只过滤返回的节点，不限制路径"""
+        kind_ids = {NODE_KINDS.index(kind) for kind in kinds} if kinds else None
+        seen = {start}
+        queue = deque([(start, 0)])
+        found = []
+        while queue:
+            node_id, distance = queue.popleft()
+            if distance >= depth:
+                continue
+            for neighbor in self.neighbors(node_id):
+                if neighbor in seen:
+                    continue
+                seen.add(neighbor)
+                if kind_ids is None or self.kinds[neighbor] in kind_ids:
+                    found.append((neighbor, distance + 1))
+                    if len(found) >= limit:
+                        return found
+                queue.append((neighbor, distance + 1))
+        return found
+
+    def counts(self) -> Dict[str, int]:
+        counts = dict.fromkeys(NODE_KINDS, 0)
+        for kind in self.kinds:
+            counts[NODE_KINDS[kind]] += 1
+        return counts
+
+    def save(self, path: str):
+        data = {
+            "strings": self.strings,
+            "kinds": list(self.kinds),
+            "names": list(self.names),
+            "labels": list(self.labels),
+            "offsets": list(self.offsets),
+            "targets": list(self.targets),
+            "diagram_urls": {str(node_id): url for node_id, url in self.diagram_urls.items()},
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> "CapabilityGraph":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            data["strings"], array("B", data["kinds"]), array("I", data["names"]), array("I", data["labels"]),
+            array("I", data["offsets"]), array("I", data["targets"]),
+            {int(node_id): url for node_id, url in data.get("diagram_urls", {}).items()},
+        )
@@ -0,0 +1,132 @@
+# 对话上下文查询向量: 把最近几轮对话按衰减权重混入当前问题的向量，
+# 让追问 ("那它的流程图呢?") 不必先经 LLM 改写关键词也能检索到相关图表
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from cache import LRUCache
+
+CONTEXT_MAX_MESSAGES = int(os.getenv("CONTEXT_MAX_MESSAGES", "4"))  # 最多参与混合的历史消息数
+CONTEXT_WEIGHT = float(os.getenv("CONTEXT_WEIGHT", "0.3"))  # 上下文在最终向量中的总权重
+CONTEXT_DECAY = float(os.getenv("CONTEXT_DECAY", "0.5"))  # 每往前一轮，权重乘以该系数
+CONTEXT_ROLES = tuple(os.getenv("CONTEXT_ROLES", "user").split(","))  # 参与混合的消息角色
+CONTEXT_TIME_BUDGET_MS = float(os.getenv("CONTEXT_TIME_BUDGET_MS", "50"))  # 每个请求计算新消息向量的时间预算
+CONVERSATION_CACHE_SIZE = int(os.getenv("CONVERSATION_CACHE_SIZE", "512"))  # 缓存的会话数量
+MAX_MESSAGE_CHARS = 1000  # 编码器只看前 256 个 token，更长的文本截断即可
+
+
+def message_text(content: Any) -> str:
+    """CoreMessage.content 可能是字符串，也可能是 [{type: 'text', text: ...}] 形式的分段"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(
+            part.get("text", "") for part in content
+            if isinstance(part, dict) and part.get("type", "text") == "text"
+        )
+    return ""
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class ConversationContext:
+    """
+    按会话缓存历史消息的向量: 每轮对话只需为新出现的消息编码一次
+    (通常只有上一轮的问题)，之前各轮直接从缓存读取
+    """
+
+    def __init__(self, encode: Callable[[List[str]], Sequence], cache_size: int = CONVERSATION_CACHE_SIZE):
+        self.encode = encode
+        self.conversations = LRUCache("conversation_context", cache_size)
+        self._lock = threading.Lock()
+        # 单条消息编码耗时的滑动平均 (秒)，用于在时间预算内决定编码几条
+        self._seconds_per_message = 0.01
+
+    def _recent_messages(self, messages: List[Dict[str, Any]], question: str) -> List[str]:
+        texts = []
+        for message in messages:
+            if not isinstance(message, dict) or message.get("role") not in CONTEXT_ROLES:
+                continue
+            text = message_text(message.get("content")).strip()[:MAX_MESSAGE_CHARS]
+            if text:
+                texts.append(text)
+        # 部分调用方会把当前问题作为最后一条消息一起传入
+        if texts and texts[-1] == question.strip()[:MAX_MESSAGE_CHARS]:
+            texts.pop()
+        return texts[-CONTEXT_MAX_MESSAGES:] if CONTEXT_MAX_MESSAGES > 0 else []
+
+    def message_vectors(self, conversation_id: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """返回与 texts 对应的向量；超出时间预算而未编码的消息为 None"""
+        cached = self.conversations.get(conversation_id)
+        if cached is None:
+            cached = {}
+        digests = [_digest(text) for text in texts]
+        missing = [i for i, digest in enumerate(digests) if digest not in cached]
+
+        if missing:
+            # 在预算内优先编码最近的消息
+            affordable = max(1, int(CONTEXT_TIME_BUDGET_MS / 1000 / self._seconds_per_message))
+            missing = missing[-affordable:]
+            start = time.perf_counter()
+            vectors = self.encode([texts[i] for i in missing])
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._seconds_per_message = 0.8 * self._seconds_per_message + 0.2 * elapsed / len(missing)
+            cached = dict(cached)
+            for i, vector in zip(missing, vectors):
+                cached[digests[i]] = np.asarray(vector, dtype=np.float32)
+            # 只保留当前窗口内的消息，避免长会话无限增长
+            cached = {digest: cached[digest] for digest in digests if digest in cached}
+            self.conversations.put(conversation_id, cached)
+            if elapsed * 1000 > CONTEXT_TIME_BUDGET_MS:
+                logging.info(f"Context encoding took {elapsed * 1000:.1f}ms for {len(missing)} messages (budget {CONTEXT_TIME_BUDGET_MS}ms)")
+
+        return [cached.get(digest) for digest in digests]
+
+    def blend(
+        self,
+        question: str,
+        query_vector: Sequence[float],
+        messages: List[Dict[str, Any]],
+        conversation_id: Optional[str] = None,
+        weight: float = CONTEXT_WEIGHT,
+    ) -> List[float]:
+        """
+        (1 - weight) * 问题向量 + weight * 历史消息的衰减加权平均，再归一化
+        没有可用的历史消息时原样返回问题向量
+        """
+        texts = self._recent_messages(messages or [], question)
+        if not texts or weight <= 0:
+            return list(query_vector)
+        if not conversation_id:
+            # 未提供会话 id 时，以第一条消息标识会话 (同一会话各轮请求中不变)
+            first = messages[0] if isinstance(messages[0], dict) else {}
+            conversation_id = _digest(message_text(first.get("content")))
+
+        context = None
+        total = 0.0
+        vectors = self.message_vectors(conversation_id, texts)
+        for age, vector in enumerate(reversed(vectors)):
+            if vector is None:
+                continue
+            w = CONTEXT_DECAY ** age
+            context = vector * w if context is None else context + vector * w
+            total += w
+        if context is None:
+            return list(query_vector)
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        blended = (1 - weight) * _normalize(query) + weight * _normalize(context / total)
+        return _normalize(blended).tolist()
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
@@ -0,0 +1,211 @@
+# 多版本集合: 一个 API 进程按请求的 version / collection 惰性打开集合
+#
+# 每个 BIAN landscape 版本 (或客户自定义语料) 注入到独立的集合中，集合名为
+# bian_diagrams_<版本>，例如 bian_diagrams_13-0-0；DEFAULT_LANDSCAPE_VERSION
+# 对应原有的 bian_diagrams 集合。集合的附属文件 (NumPy 索引、关联索引) 在默认
+# 路径中插入集合名，例如 diagram_links.bian_diagrams_13-0-0.json。
+#
+# 打开的集合 (向量存储 + 过滤位图 + 关联索引) 放在按估算内存限制大小的 LRU 中，
+# 超出预算时淘汰最久未用的集合，下次请求时重新加载；加载耗时计入 Prometheus。
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from filters import landscape_version
+from telemetry import COLLECTION_EVICTIONS, COLLECTION_LOAD_SECONDS, COLLECTION_MEMORY_BYTES, COLLECTIONS_OPEN
+
+DEFAULT_COLLECTION = os.getenv("COLLECTION_NAME", "bian_diagrams")
+DEFAULT_LANDSCAPE_VERSION = os.getenv("DEFAULT_LANDSCAPE_VERSION", "12-0-0")  # 该版本对应 DEFAULT_COLLECTION
+COLLECTION_MEMORY_BUDGET_MB = int(os.getenv("COLLECTION_MEMORY_BUDGET_MB", "1024"))  # 打开的集合的估算内存上限
+MAX_OPEN_COLLECTIONS = int(os.getenv("MAX_OPEN_COLLECTIONS", "8"))
+
+# ChromaDB 集合名的限制: 3-63 个字符，字母数字开头和结尾；同时保证可以安全地用作文件名
+_COLLECTION_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{1,61}[A-Za-z0-9]$")
+_VERSION_RE = re.compile(r"^(\d+)[-_.](\d+)[-_.](\d+)$")
+
+
+class UnknownCollection(LookupError):
+    pass
+
+
+def normalize_version(version: str) -> str:
+    """'12.0.0' / '12_0_0' / 'servicelandscape-12-0-0' -> '12-0-0'"""
+    version = version.strip()
+    match = _VERSION_RE.match(version)
+    if match:
+        return "-".join(match.groups())
+    parsed = landscape_version(version)
+    if parsed is None:
+        raise ValueError(f"Invalid landscape version: {version!r} (expected e.g. '12-0-0')")
+    return parsed
+
+
+def collection_name(version: Optional[str] = None, collection: Optional[str] = None) -> str:
+    """请求参数 -> 集合名。collection 优先；都未给出时使用默认集合"""
+    if collection:
+        if not _COLLECTION_NAME_RE.match(collection):
+            raise ValueError(f"Invalid collection name: {collection!r}")
+        return collection
+    if version:
+        version = normalize_version(version)
+        if version == DEFAULT_LANDSCAPE_VERSION:
+            return DEFAULT_COLLECTION
+        return f"{DEFAULT_COLLECTION}_{version}"
+    return DEFAULT_COLLECTION
+
+
+def artifact_path(default_path: str, collection: str) -> str:
+    """集合附属文件的路径: 默认集合使用原路径，其他集合在扩展名前插入集合名"""
+    if collection == DEFAULT_COLLECTION:
+        return default_path
+    root, ext = os.path.splitext(default_path.rstrip(os.sep))
+    return f"{root}.{collection}{ext}"
+
+
+def spool_path(default_path: str, version: str) -> str:
+    """
+    某个版本的爬虫 spool 路径: 默认版本使用原路径，其他版本在扩展名前插入版本号
+    (svg_spool.13-0-0.jl)，与爬虫的 bian_scraper.urls.landscape_spool_path 一致
+    """
+    version = normalize_version(version)
+    if version == DEFAULT_LANDSCAPE_VERSION:
+        return default_path
+    root, ext = os.path.splitext(default_path)
+    return f"{root}.{version}{ext}"
+
+
+def list_collections(backend: str, chroma_path: str, numpy_path: str) -> List[str]:
+    """存储中可用的集合名 (不打开集合)"""
+    if backend == "numpy":
+        names = [DEFAULT_COLLECTION] if os.path.isdir(numpy_path) else []
+        parent, prefix = os.path.split(numpy_path.rstrip(os.sep))
+        prefix += "."
+        if os.path.isdir(parent or "."):
+            for entry in sorted(os.listdir(parent or ".")):
+                name = entry[len(prefix):]
+                if entry.startswith(prefix) and _COLLECTION_NAME_RE.match(name) and os.path.isdir(os.path.join(parent, entry)):
+                    names.append(name)
+        return names
+    from vector_store import chroma_client
+
+    # chromadb 0.6 起 list_collections 返回集合名，之前的版本返回 Collection 对象
+    return sorted(getattr(c, "name", c) for c in chroma_client(chroma_path).list_collections())
+
+
+class Corpus:
+    """一个已打开的集合及其查询时需要的索引"""
+
+    def __init__(self, name: str, store, filter_index, link_index=None, load_seconds: float = 0.0):
+        self.name = name
+        self.store = store
+        self.filter_index = filter_index
+        self.link_index = link_index
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.memory_bytes = (
+            store.estimated_bytes()
+            + filter_index.estimated_bytes()
+            + (link_index.estimated_bytes() if link_index is not None else 0)
+        )
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "backend": self.store.backend,
+            "count": len(self.filter_index.ids),
+            "memory_mb": round(self.memory_bytes / 1024 / 1024, 2),
+            "load_seconds": round(self.load_seconds, 3),
+            "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.loaded_at)),
+            "related": self.link_index is not None,
+        }
+
+
+class CorpusRegistry:
+    """
+    按估算内存限制大小的集合 LRU。首次使用时调用 opener(name) 加载；同一集合的并发首次请求
+    只加载一次。pinned 中的集合 (启动时加载的默认集合) 不会被淘汰。
+    被淘汰的集合只是不再被引用，正在使用它的请求不受影响。
+    """
+
+    def __init__(self, opener: Callable[[str], Corpus], memory_budget_bytes: int = COLLECTION_MEMORY_BUDGET_MB * 1024 * 1024,
+                 max_open: int = MAX_OPEN_COLLECTIONS):
+        self.opener = opener
+        self.memory_budget_bytes = memory_budget_bytes
+        self.max_open = max(1, max_open)
+        self.pinned: set = set()
+        self._open: "OrderedDict[str, Corpus]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+
+    def loaded(self, name: str) -> Optional[Corpus]:
+        """已打开时返回集合 (并标记为最近使用)，否则返回 None，不触发加载"""
+        with self._lock:
+            corpus = self._open.get(name)
+            if corpus is not None:
+                self._open.move_to_end(name)
+            return corpus
+
+    def get(self, name: str) -> Corpus:
+        corpus = self.loaded(name)
+        if corpus is not None:
+            return corpus
+        with self._lock:
+            load_lock = self._loading.setdefault(name, threading.Lock())
+        with load_lock:
+            # 等锁期间可能已被其他线程加载
+            corpus = self.loaded(name)
+            if corpus is not None:
+                return corpus
+            start = time.perf_counter()
+            try:
+                corpus = self.opener(name)
+                corpus.load_seconds = time.perf_counter() - start
+                COLLECTION_LOAD_SECONDS.labels(collection=name).observe(corpus.load_seconds)
+                logging.info(
+                    f"Collection {name} loaded in {corpus.load_seconds:.2f}s "
+                    f"(~{corpus.memory_bytes / 1024 / 1024:.1f} MB)"
+                )
+                with self._lock:
+                    self._open[name] = corpus
+                    self._evict(keep=name)
+            finally:
+                with self._lock:
+                    self._loading.pop(name, None)
+        return corpus
+
+    def pin(self, name: str) -> Corpus:
+        corpus = self.get(name)
+        self.pinned.add(name)
+        return corpus
+
+    def memory_bytes(self) -> int:
+        return sum(corpus.memory_bytes for corpus in self._open.values())
+
+    def _evict(self, keep: str):
+        """淘汰最久未用的集合，直到数量和估算内存都在预算内 (调用方持有 self._lock)"""
+        for name in list(self._open):
+            if len(self._open) <= self.max_open and self.memory_bytes() <= self.memory_budget_bytes:
+                break
+            if name == keep or name in self.pinned:
+                continue
+            evicted = self._open.pop(name)
+            COLLECTION_EVICTIONS.labels(collection=name).inc()
+            logging.info(f"Collection {name} evicted (~{evicted.memory_bytes / 1024 / 1024:.1f} MB)")
+        COLLECTIONS_OPEN.set(len(self._open))
+        COLLECTION_MEMORY_BYTES.set(self.memory_bytes())
+
+    def describe(self, available: Iterable[str] = ()) -> Dict[str, Any]:
+        with self._lock:
+            corpora = [corpus.describe() for corpus in reversed(self._open.values())]
+        return {
+            "default": DEFAULT_COLLECTION,
+            "default_version": DEFAULT_LANDSCAPE_VERSION,
+            "memory_budget_mb": round(self.memory_budget_bytes / 1024 / 1024, 2),
+            "max_open": self.max_open,
+            "open": corpora,  # 最近使用的在前
+            "available": list(available),
+        }
@@ -0,0 +1,71 @@
+import argparse
+import hashlib
+import logging
+import os
+import sys
+import time
+
+from inject_data import (
+    CHROMA_DB_PATH, SOURCE_JSON_FILE, SOURCE_SPOOL_FILE, stream_json_objects, stream_jsonl_objects,
+)
+
+# 与 API 共用的模块位于上一级目录 (diagramRAG/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from capability_graph import CapabilityGraphBuilder  # noqa: E402
+
+# --- Configuration ---
+CAPABILITY_CSV_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..',
+    'Customer Journey to_Business Capability and L2Process Mapping(Value Stream Stage).csv',
+)
+# 与 ChromaDB 数据放在同一目录，随 chroma_db_diagrams.tar.gz 一起部署
+GRAPH_FILE = os.path.join(CHROMA_DB_PATH, 'capability_graph.json')
+MAX_DIAGRAMS_PER_CAPABILITY = 20
+
+
+def iter_diagrams(source_file: str):
+    """从爬虫输出读取图表，id 与 inject_data.py 写入 ChromaDB 的 id 一致"""
+    if source_file.endswith(('.jl', '.jsonl')):
+        items = stream_jsonl_objects(source_file)
+    else:
+        items = stream_json_objects(source_file)
+    for item in items:
+        if not item.get('svg_content'):
+            continue
+        metadata = item.get('metadata') or {}
+        yield {
+            'id': item.get('svg_hash') or hashlib.sha256(item['svg_content'].encode('utf-8')).hexdigest(),
+            'text_elements': item.get('text_elements') or [],
+            'source_url': item.get('source_url'),
+            'bizzid': metadata.get('bizzid'),
+            'bizzconcept': metadata.get('bizzconcept'),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="从客户旅程映射 CSV 构建业务能力图谱，并通过文本元素链接到 BIAN 图表")
+    parser.add_argument('--csv', default=CAPABILITY_CSV_FILE, help="客户旅程映射 CSV 文件")
+    parser.add_argument('--source', help=f"爬虫输出 (.jl spool 或 Scrapy JSON)，默认优先使用 {SOURCE_SPOOL_FILE}，否则 {SOURCE_JSON_FILE}")
+    parser.add_argument('--output', default=GRAPH_FILE, help="图谱输出文件")
+    parser.add_argument('--max-per-capability', type=int, default=MAX_DIAGRAMS_PER_CAPABILITY, help="每个能力最多链接的图表数")
+    args = parser.parse_args()
+
+    source_file = args.source or (SOURCE_SPOOL_FILE if os.path.exists(SOURCE_SPOOL_FILE) else SOURCE_JSON_FILE)
+    start_time = time.time()
+
+    builder = CapabilityGraphBuilder()
+    rows = builder.add_csv(args.csv)
+    logging.info(f"已解析 {rows} 个服务时刻: {args.csv}")
+
+    if os.path.exists(source_file):
+        builder.add_diagrams(iter_diagrams(source_file), max_per_capability=args.max_per_capability)
+    else:
+        logging.warning(f"源文件不存在: {source_file}，图谱将不包含图表链接")
+
+    graph = builder.build()
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    graph.save(args.output)
+    logging.info(
+        f"图谱已保存到 {args.output}: {len(graph)} 个节点, {graph.edge_count} 条边, "
+        f"{graph.counts()}，耗时 {time.time() - start_time:.2f} 秒"
+    )
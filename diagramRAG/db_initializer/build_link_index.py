@@ -0,0 +1,75 @@
+import argparse
+import hashlib
+import logging
+import os
+import sys
+import time
+
+from inject_data import (
+    CHROMA_DB_PATH, SOURCE_JSON_FILE, SOURCE_SPOOL_FILE, default_source_file, stream_json_objects, stream_jsonl_objects,
+)
+
+# 与 API 共用的模块位于上一级目录 (diagramRAG/)，URL 规范化与爬虫共用
+_HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(_HERE, '..'))
+sys.path.insert(0, os.path.join(_HERE, '..', 'bian_scraper'))
+from bian_scraper.urls import canonicalize_url  # noqa: E402
+from corpora import artifact_path, collection_name  # noqa: E402
+from diagram_links import MAX_DOMAIN_FANOUT, MAX_SHARED_PER_DIAGRAM, DiagramLinkIndexBuilder  # noqa: E402
+
+# --- Configuration ---
+# 与 ChromaDB 数据放在同一目录，随 chroma_db_diagrams.tar.gz 一起部署
+LINK_INDEX_FILE = os.path.join(CHROMA_DB_PATH, 'diagram_links.json')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="根据爬虫输出的链接和文本元素构建图表关联索引")
+    parser.add_argument('--source', help=f"爬虫输出 (.jl spool 或 Scrapy JSON)，默认优先使用 {SOURCE_SPOOL_FILE}，否则 {SOURCE_JSON_FILE}；--version 时为该版本的 spool")
+    parser.add_argument('--output', default=None, help=f"索引输出文件，默认 {LINK_INDEX_FILE} (其他集合插入集合名)")
+    parser.add_argument('--version', help="BIAN landscape 版本 (例如 13-0-0)，为集合 bian_diagrams_<版本> 构建")
+    parser.add_argument('--collection', help="直接指定集合名 (优先于 --version)")
+    parser.add_argument('--max-shared', type=int, default=MAX_SHARED_PER_DIAGRAM, help="每个图表保留的共享服务域邻居数")
+    parser.add_argument('--max-fanout', type=int, default=MAX_DOMAIN_FANOUT, help="忽略出现在超过该数量图表中的服务域")
+    args = parser.parse_args()
+    output = args.output or artifact_path(LINK_INDEX_FILE, collection_name(args.version, args.collection))
+
+    try:
+        source_file = args.source or default_source_file(args.version, args.collection)
+    except ValueError as e:
+        logging.error(str(e))
+        exit(1)
+    if not os.path.exists(source_file):
+        logging.error(f"源文件不存在: {source_file}")
+        exit(1)
+    start_time = time.time()
+
+    if source_file.endswith(('.jl', '.jsonl')):
+        items = stream_jsonl_objects(source_file)
+    else:
+        items = stream_json_objects(source_file)
+
+    builder = DiagramLinkIndexBuilder()
+    without_links = 0
+    for item in items:
+        if not item.get('svg_content') or not item.get('source_url'):
+            continue
+        # 只用图表自身的链接: page_links 是整页的导航链接，会把菜单页都当作关联。
+        # 旧的爬虫输出没有 links 字段，只能通过概念引用建立关联
+        if 'links' not in item:
+            without_links += 1
+        links = item.get('links') or []
+        builder.add(
+            # id 与 inject_data.py 写入 ChromaDB 的 id 一致
+            item.get('svg_hash') or hashlib.sha256(item['svg_content'].encode('utf-8')).hexdigest(),
+            canonicalize_url(item['source_url']),
+            (item.get('metadata') or {}).get('bizzconcept'),
+            item.get('text_elements') or [],
+            links,
+        )
+    if without_links:
+        logging.warning(f"{without_links} 个图表没有链接信息 (爬虫输出早于链接字段)")
+
+    index = builder.build(max_shared=args.max_shared, max_fanout=args.max_fanout)
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    index.save(output)
+    logging.info(f"关联索引已保存到 {output}: {len(index)} 个图表，耗时 {time.time() - start_time:.2f} 秒")
@@ -0,0 +1,94 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from inject_data import (
+    CHROMA_DB_PATH, SOURCE_JSON_FILE, SOURCE_SPOOL_FILE, default_source_file, stream_json_objects, stream_jsonl_objects,
+)
+
+# 与 API 共用的模块位于上一级目录 (diagramRAG/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from rasters import load_manifest, render_diagram  # noqa: E402
+
+# --- Configuration ---
+# 与 ChromaDB 数据放在同一目录，随 chroma_db_diagrams.tar.gz 一起部署 (API 的 RASTER_PATH 默认值)。
+# 按 svg_hash 存放，所有版本的集合共用
+RASTER_DIR = os.path.join(CHROMA_DB_PATH, 'rasters')
+
+
+def render_one(svg_content: str, svg_hash: str, output_dir: str) -> dict:
+    # 在子进程中执行: cairo 渲染是 CPU 密集型的
+    return render_diagram(svg_content, svg_hash, output_dir)
+
+
+def directory_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把爬取的 SVG 图表渲染为缩略图和多级瓦片 (需要 requirements-raster.txt)")
+    parser.add_argument('--source', help=f"爬虫输出 (.jl spool 或 Scrapy JSON)，默认优先使用 {SOURCE_SPOOL_FILE}，否则 {SOURCE_JSON_FILE}；--version 时为该版本的 spool")
+    parser.add_argument('--version', help="BIAN landscape 版本 (例如 13-0-0)，渲染该版本 spool 中的图表 (输出目录各版本共用)")
+    parser.add_argument('--output', default=RASTER_DIR, help="输出目录")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="渲染进程数")
+    args = parser.parse_args()
+
+    try:
+        source_file = args.source or default_source_file(args.version)
+    except ValueError as e:
+        logging.error(str(e))
+        exit(1)
+    if not os.path.exists(source_file):
+        logging.error(f"源文件不存在: {source_file}")
+        exit(1)
+    start_time = time.time()
+
+    if source_file.endswith(('.jl', '.jsonl')):
+        items = stream_jsonl_objects(source_file)
+    else:
+        items = stream_json_objects(source_file)
+
+    stats = {"rendered": 0, "existing": 0, "failed": 0, "tiles": 0}
+    seen = set()
+    pending = {}
+
+    def collect(done):
+        for future in done:
+            svg_hash = pending.pop(future)
+            try:
+                stats["tiles"] += future.result()["tiles"]
+                stats["rendered"] += 1
+            except Exception as e:
+                stats["failed"] += 1
+                logging.warning(f"渲染 {svg_hash[:12]} 失败: {e}")
+
+    os.makedirs(args.output, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for item in items:
+            svg_content = item.get('svg_content')
+            if not svg_content:
+                continue
+            # id 与 inject_data.py 写入 ChromaDB 的 id 一致
+            svg_hash = item.get('svg_hash') or hashlib.sha256(svg_content.encode('utf-8')).hexdigest()
+            if svg_hash in seen:
+                continue
+            seen.add(svg_hash)
+            if load_manifest(args.output, svg_hash) is not None:
+                stats["existing"] += 1
+                continue
+            # 限制排队的任务数，避免把整个 spool 的 SVG 都读进内存
+            if len(pending) >= args.workers * 4:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending[pool.submit(render_one, svg_content, svg_hash, args.output)] = svg_hash
+        collect(wait(pending).done)
+
+    stats["seconds"] = round(time.time() - start_time, 2)
+    stats["output_mb"] = round(directory_bytes(args.output) / 1024 / 1024, 1)
+    logging.info(f"栅格化完成: 新渲染 {stats['rendered']}，已存在 {stats['existing']}，失败 {stats['failed']}")
+    print(json.dumps(stats, indent=2))
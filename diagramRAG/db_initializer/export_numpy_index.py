@@ -0,0 +1,34 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+import chromadb
+
+from inject_data import CHROMA_DB_PATH, COLLECTION_NAME
+
+# 与 API 共用的模块位于上一级目录 (diagramRAG/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from corpora import artifact_path, collection_name  # noqa: E402
+from vector_store import export_numpy_index  # noqa: E402
+
+# --- Configuration ---
+# 与 ChromaDB 数据放在同一目录，随 chroma_db_diagrams.tar.gz 一起部署 (API 的 NUMPY_INDEX_PATH 默认值)
+NUMPY_INDEX_DIR = os.path.join(CHROMA_DB_PATH, 'numpy_index')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把 ChromaDB 集合导出为 NumPy 精确检索索引 (VECTOR_BACKEND=numpy)")
+    parser.add_argument('--db-path', default=CHROMA_DB_PATH, help="ChromaDB 数据目录")
+    parser.add_argument('--collection', default=None, help=f"集合名称，默认 {COLLECTION_NAME}")
+    parser.add_argument('--version', help="BIAN landscape 版本 (例如 13-0-0)，导出集合 bian_diagrams_<版本>")
+    parser.add_argument('--output', default=None, help=f"索引输出目录，默认 {NUMPY_INDEX_DIR} (其他集合插入集合名)")
+    args = parser.parse_args()
+
+    name = collection_name(args.version, args.collection)
+    output = args.output or artifact_path(NUMPY_INDEX_DIR, name)
+    collection = chromadb.PersistentClient(path=args.db_path).get_collection(name=name)
+    manifest = export_numpy_index(collection, output)
+    logging.info(f"NumPy 索引已导出到 {output}")
+    print(json.dumps(manifest, indent=2))
@@ -0,0 +1,60 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+# 与 API 共用的模块位于上一级目录 (diagramRAG/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from encoders import (  # noqa: E402
+    MODEL_NAME, ONNX_MODEL_DIR, PARITY_MIN_COSINE, PARITY_MIN_COSINE_QUANTIZED,
+    OnnxEncoder, SentenceTransformerEncoder, cosine_parity, export_onnx,
+)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# 一致性检查用的文本: 典型查询关键词和 inject_data.py 生成的描述
+PARITY_TEXTS = [
+    "customer onboarding",
+    "payment order, payment execution",
+    "loan origination credit assessment",
+    "Party Reference Data Directory",
+    "BIAN Diagram ID 55046. Primary Concept: Customer Offer. Semantic Type: ServiceDomain. "
+    "Key elements mentioned: Customer Offer, Party Reference Data Directory, Product Directory.",
+    "BIAN Diagram ID 32900. Primary Concept: Current Account. Semantic Type: BusinessScenario. "
+    "Key elements mentioned: :Current Account, :Payment Order, Initiate Payment, Execute Payment.",
+    "sd Analyse Customer Segment Performance",
+    "如何开立活期账户",
+    "x",
+    " ".join(["Customer Relationship Management"] * 80),  # 超过 256 token，验证截断
+]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="将编码模型导出为 ONNX (可选 int8 量化) 并检查与 PyTorch 输出的一致性")
+    parser.add_argument('--model', default=MODEL_NAME, help="sentence-transformers 模型名")
+    parser.add_argument('--output-dir', default=ONNX_MODEL_DIR, help="ONNX 模型与 tokenizer.json 输出目录")
+    parser.add_argument('--no-quantize', action='store_true', help="不生成 int8 量化模型")
+    args = parser.parse_args()
+
+    written = export_onnx(args.model, args.output_dir, quantize=not args.no_quantize)
+    for path in written:
+        logging.info(f"已导出 {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+
+    reference = SentenceTransformerEncoder(args.model)
+    report = {}
+    failed = False
+    for quantized, threshold in ((False, PARITY_MIN_COSINE), (True, PARITY_MIN_COSINE_QUANTIZED)):
+        if quantized and args.no_quantize:
+            continue
+        candidate = OnnxEncoder(args.output_dir, quantized=quantized)
+        parity = cosine_parity(reference, candidate, PARITY_TEXTS)
+        parity["threshold"] = threshold
+        parity["passed"] = parity["min_cosine"] >= threshold
+        report[os.path.basename(candidate.model_path)] = parity
+        failed = failed or not parity["passed"]
+
+    print(json.dumps(report, indent=2))
+    if failed:
+        logging.error("ONNX 模型与 PyTorch 输出不一致，不要使用该导出结果")
+        exit(1)
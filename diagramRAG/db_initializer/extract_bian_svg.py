@@ -1,12 +1,14 @@
+import os
+import sys
+
 import requests
-from bs4 import BeautifulSoup
-from lxml import etree
-import io
+
+# The extractor lives in the Scrapy project so the spider and this script share it
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bian_scraper'))
+from bian_scraper import svg_extractor  # noqa: E402
 
 # --- Configuration ---
 TARGET_URL = "https://bian.org/servicelandscape-12-0-0/object_21.html?object=35553"
-# BIAN specific attributes to extract from the root <svg> tag
-SVG_METADATA_ATTRIBUTES = ['bizzid', 'bizzsemantic', 'bizzconcept']
 # Standard headers to mimic a browser
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
@@ -28,55 +30,20 @@ def fetch_html(url: str) -> str | None:
 
 def find_svg_content(html_content: str) -> list[str]:
     """Finds all SVG tag content within the HTML."""
-    print("Parsing HTML to find SVG elements...")
-    soup = BeautifulSoup(html_content, 'lxml') # Use lxml parser for speed and robustness
-    svg_tags = soup.find_all('svg')
+    print("Scanning HTML to find SVG elements...")
+    svg_tags = list(svg_extractor.iter_svg_fragments(html_content))
     print(f"Found {len(svg_tags)} SVG element(s).")
-    # Return the string representation of each SVG tag
-    return [str(svg) for svg in svg_tags]
+    # Return the source text of each SVG tag
+    return svg_tags
 
 def extract_svg_data(svg_string: str) -> dict | None:
     """Parses a single SVG string and extracts metadata and text."""
-    try:
-        # lxml works best with bytes, especially if encoding is involved
-        parser = etree.XMLParser(remove_blank_text=True)
-        # Use io.BytesIO to handle the string as a file-like object of bytes
-        svg_bytes = io.BytesIO(svg_string.encode('utf-8'))
-        tree = etree.parse(svg_bytes, parser)
-        root = tree.getroot()
-
-        # Define the SVG namespace - essential for XPath queries
-        ns = {'svg': 'http://www.w3.org/2000/svg'}
-
-        extracted_data = {
-            'metadata': {},
-            'text_elements': []
-        }
-
-        # Extract specified metadata attributes from the root <svg> element
-        for attr in SVG_METADATA_ATTRIBUTES:
-            value = root.get(attr)
-            if value:
-                extracted_data['metadata'][attr] = value
-            else:
-                 extracted_data['metadata'][attr] = None # Indicate if attribute is missing
-
-
-        # Extract text content from all <text> elements using XPath with namespace
-        # This finds text directly within <text> and within its children like <tspan>
-        text_nodes = root.xpath('.//svg:text//text()', namespaces=ns)
-        extracted_data['text_elements'] = [text.strip() for text in text_nodes if text.strip()]
-
-        return extracted_data
-
-    except etree.XMLSyntaxError as e:
-        print(f"Error parsing SVG XML: {e}")
+    extracted_data = svg_extractor.extract_svg_data(svg_string)
+    if extracted_data is None:
+        print("Error parsing SVG XML: not a parseable <svg> element")
         # Optionally print problematic part of SVG:
         # print(f"Problematic SVG snippet: {svg_string[:500]}...")
-        return None
-    except Exception as e:
-        print(f"An unexpected error occurred during SVG parsing: {e}")
-        return None
+    return extracted_data
 
 
 # --- Main Execution ---
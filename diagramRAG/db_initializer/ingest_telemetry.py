@@ -0,0 +1,190 @@
+"""
+注入过程的结构化遥测: 按阶段 (parse/hash/describe/encode/upsert) 统计耗时、条目数、字节数，
+按批次记录吞吐量、RSS 和队列深度，运行结束后写出机器可读的 JSON 运行报告，
+并可选地通过 HTTP 提供实时进度。
+
+运行报告包含构建标识 (BUILD_ID 环境变量或 git 提交) 和主机信息，便于在不同构建之间比较。
+"""
+import json
+import logging
+import os
+import platform
+import subprocess
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STAGES = ('parse', 'hash', 'describe', 'encode', 'upsert')
+REPORT_DIR = os.getenv("INGEST_REPORT_DIR", "ingest_reports")
+
+
+def current_rss_bytes() -> int | None:
+    """当前进程 RSS (Linux 读取 /proc，其他平台退化为峰值 RSS)"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        return None
+
+
+def build_info() -> dict:
+    revision = None
+    try:
+        revision = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return {
+        'build_id': os.getenv('BUILD_ID'),
+        'git_revision': revision,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'hostname': platform.node(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+class IngestTelemetry:
+    """收集一次注入运行的遥测数据"""
+
+    def __init__(self, config: dict | None = None, run_id: str | None = None):
+        self.run_id = run_id or time.strftime('%Y%m%dT%H%M%S') + '-' + uuid.uuid4().hex[:6]
+        self.config = config or {}
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.stages = {name: {'seconds': 0.0, 'items': 0, 'bytes': 0, 'calls': 0} for name in STAGES}
+        self.batches = []
+        self.peak_rss = current_rss_bytes() or 0
+        self.queue_depth = 0  # 已解析、等待 encode/upsert 的条目数
+        self.source_path = None  # 正在读取的源文件 (用于计算未读积压字节数)
+        self.source_offset = 0
+        self.wait_seconds = 0.0  # follow 模式下等待爬虫写入的时间
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @contextmanager
+    def stage(self, name: str, items: int = 0, nbytes: int = 0):
+        """计时一个阶段；parse 阶段会扣除其间等待数据源的时间"""
+        wait_before = self.wait_seconds
+        start = time.perf_counter()
+        record = {'items': items, 'bytes': nbytes}
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter() - start - (self.wait_seconds - wait_before)
+            with self._lock:
+                totals = self.stages.setdefault(name, {'seconds': 0.0, 'items': 0, 'bytes': 0, 'calls': 0})
+                totals['seconds'] += max(elapsed, 0.0)
+                totals['items'] += record['items']
+                totals['bytes'] += record['bytes']
+                totals['calls'] += 1
+
+    def add_wait(self, seconds: float):
+        self.wait_seconds += seconds
+
+    def backlog_bytes(self) -> int | None:
+        if not self.source_path or not os.path.exists(self.source_path):
+            return None
+        return max(os.path.getsize(self.source_path) - self.source_offset, 0)
+
+    def record_batch(self, batch_number: int, items: int, seconds: float):
+        rss = current_rss_bytes()
+        if rss and rss > self.peak_rss:
+            self.peak_rss = rss
+        batch = {
+            'batch': batch_number,
+            'items': items,
+            'seconds': round(seconds, 4),
+            'items_per_second': round(items / seconds, 2) if seconds > 0 else None,
+            'rss_mb': round(rss / (1024 * 1024), 2) if rss else None,
+            'queue_depth': self.queue_depth,
+            'backlog_bytes': self.backlog_bytes(),
+            'elapsed': round(time.perf_counter() - self._start, 3),
+        }
+        with self._lock:
+            self.batches.append(batch)
+        logging.debug(json.dumps({'event': 'ingest_batch', 'run_id': self.run_id, **batch}))
+
+    def snapshot(self) -> dict:
+        elapsed = time.perf_counter() - self._start
+        with self._lock:
+            stages = {
+                name: {
+                    **totals,
+                    'seconds': round(totals['seconds'], 4),
+                    'items_per_second': round(totals['items'] / totals['seconds'], 2) if totals['seconds'] > 0 else None,
+                    'mb_per_second': round(totals['bytes'] / totals['seconds'] / (1024 * 1024), 3)
+                    if totals['seconds'] > 0 and totals['bytes'] else None,
+                }
+                for name, totals in self.stages.items()
+            }
+            batches = list(self.batches)
+        return {
+            'run_id': self.run_id,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(self.started_at)),
+            'elapsed_seconds': round(elapsed, 3),
+            'wait_seconds': round(self.wait_seconds, 3),
+            'peak_rss_mb': round(self.peak_rss / (1024 * 1024), 2) if self.peak_rss else None,
+            'queue_depth': self.queue_depth,
+            'backlog_bytes': self.backlog_bytes(),
+            'stages': stages,
+            'batch_count': len(batches),
+            'last_batch': batches[-1] if batches else None,
+            'stats': self.stats,
+        }
+
+    def write_report(self, report_dir: str = REPORT_DIR) -> str:
+        """写出完整运行报告 (包含所有批次记录)，返回报告路径"""
+        report = {
+            'report': 'ingest_run',
+            'build': build_info(),
+            'config': self.config,
+            **self.snapshot(),
+            'batches': self.batches,
+        }
+        report.pop('last_batch', None)
+        os.makedirs(report_dir, exist_ok=True)
+        path = os.path.join(report_dir, f"ingest_report_{self.run_id}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        logging.info(f"注入运行报告已写入: {path}")
+        return path
+
+    def start_progress_server(self, port: int, host: str = '127.0.0.1'):
+        """在后台线程中提供实时进度: GET http://host:port/ 返回当前快照 JSON"""
+        telemetry = self
+
+        class ProgressHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(telemetry.snapshot(), ensure_ascii=False).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), ProgressHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logging.info(f"实时进度端点: http://{host}:{port}/")
+
+    def stop_progress_server(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
@@ -1,28 +1,42 @@
+import argparse
 import json
 import chromadb
-from sentence_transformers import SentenceTransformer
 import os
 import logging
 import hashlib
 import gc
+import sys
 import time
 from typing import Dict, List, Generator, Tuple, Set, Any
 
+from ingest_telemetry import REPORT_DIR, IngestTelemetry
+
+# 与 API 共用的模块位于上一级目录 (diagramRAG/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from corpora import DEFAULT_COLLECTION, artifact_path, collection_name, spool_path  # noqa: E402
+from encoders import ENCODER_BACKEND, load_encoder  # noqa: E402
+from filters import landscape_version  # noqa: E402
+from vector_store import export_numpy_index  # noqa: E402
+
 # --- Configuration ---
 SOURCE_JSON_FILE = 'bian_scraper/output.json'  # Path to the Scrapy output file
+SOURCE_SPOOL_FILE = 'bian_scraper/svg_spool.jl'  # JSON Lines spool written by SvgSpoolPipeline
+SPOOL_POLL_INTERVAL = 1.0  # --follow 模式下等待爬虫写入新行的轮询间隔 (秒)
 CHROMA_DB_PATH = "./chroma_db_diagrams"  # Directory to store ChromaDB data
 COLLECTION_NAME = "bian_diagrams"
 EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
 BATCH_SIZE = 5  # 处理批次大小，可根据内存情况调整
 CHECKPOINT_FILE = "injection_checkpoint.json"  # 断点续传文件
+DESCRIPTION_MAX_TEXTS = 15  # 描述中最多包含的文本元素数 (benchmarks/eval_retrieval.py 可比较不同取值)
 
 # --- Logging Setup ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # --- SVG Description Generation Function ---
-def generate_svg_description(metadata, text_elements):
+def generate_svg_description(metadata, text_elements, max_texts=DESCRIPTION_MAX_TEXTS):
     """
     Generates a textual description for an SVG based on its metadata and text.
+    At most `max_texts` text elements are included.
     """
     bizzid = metadata.get('bizzid', 'Unknown ID')
     concept = metadata.get('bizzconcept')  # Might be None
@@ -33,11 +47,58 @@ def generate_svg_description(metadata, text_elements):
     if semantic:
         description_parts.append(f"Semantic Type: {semantic}.")
     if text_elements:
-        key_texts = ", ".join(filter(None, text_elements[:15]))
+        key_texts = ", ".join(filter(None, text_elements[:max_texts]))
         if key_texts:
             description_parts.append(f"Key elements mentioned: {key_texts}.")
     return " ".join(description_parts)
 
+# --- ChromaDB Metadata ---
+def build_chroma_metadata(item: Dict) -> Dict[str, Any]:
+    """根据爬取的条目构建写入 ChromaDB 的元数据 (过滤掉空值)"""
+    chroma_metadata = {
+        "source_url": item['source_url'],
+        "landscape_version": landscape_version(item['source_url']),
+        "svg_index": item['svg_index'],
+        "bizzid": str(item['metadata'].get('bizzid', 'N/A')),
+        "bizzconcept": item['metadata'].get('bizzconcept'),
+        "bizzsemantic": item['metadata'].get('bizzsemantic'),
+        "svg_content": item['svg_content'],
+        "text_elements_preview": json.dumps(item['text_elements'][:10] if item['text_elements'] else [])
+    }
+    return {k: v for k, v in chroma_metadata.items() if v is not None}
+
+def default_source_file(version=None, collection=None, follow=False) -> str:
+    """
+    未指定 --source 时的源文件。默认集合优先使用 spool，否则 Scrapy JSON；其他版本使用
+    该版本的 spool (爬虫 -a version=... 写入 svg_spool.<版本>.jl)，不会读到默认版本的数据。
+    只给出 --collection 时无法推断版本，必须指定 --source
+    """
+    if collection_name(version, collection) == DEFAULT_COLLECTION:
+        return SOURCE_SPOOL_FILE if (follow or os.path.exists(SOURCE_SPOOL_FILE)) else SOURCE_JSON_FILE
+    if collection or not version:
+        raise ValueError("--collection 需要同时指定 --source (无法推断该集合对应的爬虫输出)")
+    return spool_path(SOURCE_SPOOL_FILE, version)
+
+def backfill_landscape_version(collection, page_size: int = 500) -> int:
+    """为旧数据补写 landscape_version 元数据 (从 source_url 推导)，返回更新的条目数"""
+    updated = 0
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        ids, metadatas = [], []
+        for doc_id, metadata in zip(page["ids"], page["metadatas"]):
+            version = landscape_version((metadata or {}).get("source_url", ""))
+            if version and (metadata or {}).get("landscape_version") != version:
+                ids.append(doc_id)
+                metadatas.append({**metadata, "landscape_version": version})
+        if ids:
+            collection.update(ids=ids, metadatas=metadatas)
+            updated += len(ids)
+        offset += len(page["ids"])
+    return updated
+
 # --- Streaming JSON Processing ---
 def stream_json_objects(file_path: str) -> Generator[Dict, None, None]:
     """
@@ -137,6 +198,58 @@ def stream_json_objects(file_path: str) -> Generator[Dict, None, None]:
         logging.error(f"文件流处理错误: {e}")
         raise
 
+# --- Streaming JSON Lines Processing ---
+def stream_jsonl_objects(file_path: str, follow: bool = False, telemetry: IngestTelemetry = None) -> Generator[Dict, None, None]:
+    """
+    逐行读取 SvgSpoolPipeline 写入的 JSON Lines spool 文件。
+    follow=True 时类似 tail -f: 持续等待爬虫追加新行，直到出现 <spool>.done 标记，
+    从而让注入与爬取同时进行。提供 telemetry 时记录读取位置和等待时间。
+    """
+    logging.info(f"Starting streaming of JSON Lines from {file_path} (follow={follow})")
+    done_marker = file_path + '.done'
+
+    if telemetry:
+        telemetry.source_path = file_path
+
+    while follow and not os.path.exists(file_path):
+        logging.info(f"等待爬虫创建 spool 文件: {file_path}")
+        time.sleep(SPOOL_POLL_INTERVAL)
+        if telemetry:
+            telemetry.add_wait(SPOOL_POLL_INTERVAL)
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        pending = ''
+        while True:
+            # 先检查标记再读取，确保标记出现前写入的所有行都会被读到
+            finished = not follow or os.path.exists(done_marker)
+            line = f.readline()
+            while line:
+                pending += line
+                if telemetry:
+                    # 按字节计: backlog 与 os.path.getsize 比较，SVG 文本中常有非 ASCII 字符
+                    telemetry.source_offset += len(line.encode('utf-8'))
+                if pending.endswith('\n'):
+                    text = pending.strip()
+                    pending = ''
+                    if text:
+                        try:
+                            yield json.loads(text)
+                        except json.JSONDecodeError as e:
+                            logging.warning(f"JSON Lines 解析错误: {e}")
+                line = f.readline()
+            if finished:
+                break
+            time.sleep(SPOOL_POLL_INTERVAL)
+            if telemetry:
+                telemetry.add_wait(SPOOL_POLL_INTERVAL)
+
+        # 最后一行可能没有换行符 (例如爬虫被中断)
+        if pending.strip():
+            try:
+                yield json.loads(pending)
+            except json.JSONDecodeError as e:
+                logging.warning(f"忽略不完整的最后一行: {e}")
+
 # --- 加载处理检查点 ---
 def load_checkpoint() -> Set[str]:
     """加载已处理的SVG哈希值以支持断点续传"""
@@ -162,8 +275,10 @@ def save_checkpoint(processed_hashes: Set[str]):
         logging.error(f"保存检查点失败: {e}")
 
 # --- 处理和批量注入 ---
-def process_and_inject_in_batches(model, collection, json_stream, processed_hashes):
-    """批量处理和注入数据到ChromaDB"""
+def process_and_inject_in_batches(model, collection, json_stream, processed_hashes, telemetry: IngestTelemetry = None):
+    """批量处理和注入数据到ChromaDB，各阶段耗时记录到 telemetry"""
+    telemetry = telemetry or IngestTelemetry()
+
     # 批处理缓冲区
     ids_batch = []
     metadata_batch = []
@@ -183,8 +298,16 @@ def process_and_inject_in_batches(model, collection, json_stream, processed_hash
     # 已处理的哈希值（包括此次运行新处理的）
     newly_processed = set()
     
-    # 处理数据流
-    for item in json_stream:
+    # 处理数据流 (手动迭代，以便单独统计解析耗时)
+    json_iterator = iter(json_stream)
+    while True:
+        with telemetry.stage('parse') as parse_record:
+            item = next(json_iterator, None)
+            if item is not None:
+                parse_record['items'] = 1
+                parse_record['bytes'] = len(item.get('svg_content') or '')
+        if item is None:
+            break
         try:
             # 基本验证
             required_keys = ['source_url', 'svg_index', 'metadata', 'text_elements', 'svg_content']
@@ -199,7 +322,11 @@ def process_and_inject_in_batches(model, collection, json_stream, processed_hash
                 missing_count += 1
                 continue
             
-            svg_hash = hashlib.sha256(item['svg_content'].encode('utf-8')).hexdigest()
+            # spool 记录已由 SvgDedupPipeline 计算过哈希，无需重复计算
+            svg_hash = item.get('svg_hash')
+            if not svg_hash:
+                with telemetry.stage('hash', items=1, nbytes=len(item['svg_content'])):
+                    svg_hash = hashlib.sha256(item['svg_content'].encode('utf-8')).hexdigest()
             
             # 检查是否已处理过
             if svg_hash in processed_hashes:
@@ -207,20 +334,12 @@ def process_and_inject_in_batches(model, collection, json_stream, processed_hash
                 continue
             
             # 生成描述
-            description = generate_svg_description(item['metadata'], item['text_elements'])
+            with telemetry.stage('describe', items=1) as describe_record:
+                description = generate_svg_description(item['metadata'], item['text_elements'])
+                describe_record['bytes'] = len(description)
             
             # 准备元数据
-            chroma_metadata = {
-                "source_url": item['source_url'],
-                "svg_index": item['svg_index'],
-                "bizzid": str(item['metadata'].get('bizzid', 'N/A')),
-                "bizzconcept": item['metadata'].get('bizzconcept'),
-                "bizzsemantic": item['metadata'].get('bizzsemantic'),
-                "svg_content": item['svg_content'],
-                "text_elements_preview": json.dumps(item['text_elements'][:10] if item['text_elements'] else [])
-            }
-            # 过滤掉空值
-            chroma_metadata = {k: v for k, v in chroma_metadata.items() if v is not None}
+            chroma_metadata = build_chroma_metadata(item)
             
             # 添加到批处理
             ids_batch.append(svg_hash)
@@ -230,10 +349,11 @@ def process_and_inject_in_batches(model, collection, json_stream, processed_hash
             # 记录新处理的哈希
             newly_processed.add(svg_hash)
             current_batch_items += 1
+            telemetry.queue_depth = len(ids_batch)
             
             # 当达到批处理大小时处理当前批次
             if len(ids_batch) >= BATCH_SIZE:
-                process_batch(model, collection, ids_batch, metadata_batch, documents_batch)
+                process_batch(model, collection, ids_batch, metadata_batch, documents_batch, telemetry)
                 
                 # 更新统计信息
                 processed_count += len(ids_batch)
@@ -244,6 +364,8 @@ def process_and_inject_in_batches(model, collection, json_stream, processed_hash
                 items_per_second = current_batch_items / batch_time if batch_time > 0 else 0
                 
                 logging.info(f"批次 {batch_count} 完成: 处理了 {current_batch_items} 项 ({items_per_second:.2f} 项/秒)")
+                telemetry.queue_depth = 0
+                telemetry.record_batch(batch_count, current_batch_items, batch_time)
                 
                 # 每10个批次保存一次检查点
                 if batch_count % 10 == 0:
@@ -267,15 +389,17 @@ def process_and_inject_in_batches(model, collection, json_stream, processed_hash
     
     # 处理最后一个不完整的批次
     if ids_batch:
-        process_batch(model, collection, ids_batch, metadata_batch, documents_batch)
+        process_batch(model, collection, ids_batch, metadata_batch, documents_batch, telemetry)
         processed_count += len(ids_batch)
         batch_count += 1
+        telemetry.queue_depth = 0
+        telemetry.record_batch(batch_count, current_batch_items, time.time() - current_batch_start_time)
     
     # 更新最终检查点
     processed_hashes.update(newly_processed)
     save_checkpoint(processed_hashes)
     
-    return {
+    stats = {
         "processed": processed_count,
         "skipped": skipped_count,
         "already_processed": already_processed_count,
@@ -283,20 +407,25 @@ def process_and_inject_in_batches(model, collection, json_stream, processed_hash
         "batch_count": batch_count,
         "newly_processed": len(newly_processed)
     }
+    telemetry.stats = stats
+    return stats
 
-def process_batch(model, collection, ids, metadatas, documents):
+def process_batch(model, collection, ids, metadatas, documents, telemetry: IngestTelemetry = None):
     """处理单个批次，计算嵌入并注入到数据库"""
+    telemetry = telemetry or IngestTelemetry()
     try:
         # 计算嵌入
-        embeddings = model.encode(documents, show_progress_bar=False).tolist()
+        with telemetry.stage('encode', items=len(documents), nbytes=sum(len(d) for d in documents)):
+            embeddings = model.encode(documents, show_progress_bar=False).tolist()
         
         # 注入到ChromaDB
-        collection.upsert(
-            ids=ids,
-            embeddings=embeddings,
-            metadatas=metadatas,
-            documents=documents
-        )
+        with telemetry.stage('upsert', items=len(ids), nbytes=sum(len(m.get('svg_content', '')) for m in metadatas)):
+            collection.upsert(
+                ids=ids,
+                embeddings=embeddings,
+                metadatas=metadatas,
+                documents=documents
+            )
         
     except Exception as e:
         logging.error(f"批处理失败: {e}")
@@ -304,36 +433,79 @@ def process_batch(model, collection, ids, metadatas, documents):
 
 # --- 主执行逻辑 ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="将爬取的 BIAN SVG 图表注入 ChromaDB")
+    parser.add_argument('--source', help=f"源文件 (.jl spool 或 Scrapy JSON 输出)，默认优先使用 {SOURCE_SPOOL_FILE}，否则 {SOURCE_JSON_FILE}；--version 时为该版本的 spool")
+    parser.add_argument('--follow', action='store_true', help="持续读取正在写入的 spool 文件，直到爬虫结束")
+    parser.add_argument('--report-dir', default=None, help="运行报告 (JSON) 输出目录，默认 $INGEST_REPORT_DIR 或 ingest_reports/")
+    parser.add_argument('--progress-port', type=int, default=None, help="在该端口提供实时进度 JSON (可选)")
+    parser.add_argument('--export-numpy', action='store_true', help=f"注入完成后导出 NumPy 精确检索索引到 {os.path.join(CHROMA_DB_PATH, 'numpy_index')}")
+    parser.add_argument('--backfill-metadata', action='store_true', help="只为已有条目补写 landscape_version 元数据，然后退出")
+    parser.add_argument('--version', help="BIAN landscape 版本 (例如 13-0-0)，注入到集合 bian_diagrams_<版本>")
+    parser.add_argument('--collection', help=f"直接指定集合名 (优先于 --version)，默认 {COLLECTION_NAME}")
+    args = parser.parse_args()
+
+    # 每个版本一个集合；检查点和 NumPy 索引按集合区分 (同一张图可能出现在多个版本中)
+    target_collection = collection_name(args.version, args.collection)
+    CHECKPOINT_FILE = artifact_path(CHECKPOINT_FILE, target_collection)
+    numpy_index_dir = artifact_path(os.path.join(CHROMA_DB_PATH, 'numpy_index'), target_collection)
+
+    if args.backfill_metadata:
+        collection = chromadb.PersistentClient(path=CHROMA_DB_PATH).get_or_create_collection(name=target_collection)
+        logging.info(f"已补写 {backfill_landscape_version(collection)} 个条目的 landscape_version")
+        exit(0)
+
+    try:
+        source_file = args.source or default_source_file(args.version, args.collection, follow=args.follow)
+    except ValueError as e:
+        logging.error(str(e))
+        exit(1)
+    is_spool = source_file.endswith(('.jl', '.jsonl'))
+
     start_time = time.time()
     logging.info("开始数据注入过程...")
     
-    # 检查源文件
-    if not os.path.exists(SOURCE_JSON_FILE):
-        logging.error(f"源JSON文件不存在: {SOURCE_JSON_FILE}")
+    # 检查源文件 (follow 模式下 spool 文件可能尚未创建)
+    if not os.path.exists(source_file) and not (args.follow and is_spool):
+        logging.error(f"源文件不存在: {source_file}")
         exit(1)
     
     # 加载检查点
     processed_hashes = load_checkpoint()
+
+    telemetry = IngestTelemetry(config={
+        "source": source_file,
+        "follow": args.follow,
+        "batch_size": BATCH_SIZE,
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        "encoder_backend": ENCODER_BACKEND,
+        "collection": target_collection,
+        "already_processed": len(processed_hashes),
+    })
+    if args.progress_port:
+        telemetry.start_progress_server(args.progress_port)
     
     try:
         # 初始化嵌入模型
         logging.info(f"加载嵌入模型: {EMBEDDING_MODEL_NAME}...")
-        model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        model = load_encoder(model_name=EMBEDDING_MODEL_NAME)
         logging.info("嵌入模型加载成功。")
         
         # 初始化ChromaDB
         logging.info(f"初始化ChromaDB客户端，路径: {CHROMA_DB_PATH}")
         client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
         
-        logging.info(f"获取或创建集合: {COLLECTION_NAME}")
-        collection = client.get_or_create_collection(name=COLLECTION_NAME)
+        logging.info(f"获取或创建集合: {target_collection}")
+        collection = client.get_or_create_collection(name=target_collection)
         logging.info(f"使用集合 '{collection.name}' (ID: {collection.id})")
         
         # 创建JSON对象流
-        json_stream = stream_json_objects(SOURCE_JSON_FILE)
+        if is_spool:
+            json_stream = stream_jsonl_objects(source_file, follow=args.follow, telemetry=telemetry)
+        else:
+            json_stream = stream_json_objects(source_file)
         
         # 批量处理和注入
-        stats = process_and_inject_in_batches(model, collection, json_stream, processed_hashes)
+        stats = process_and_inject_in_batches(model, collection, json_stream, processed_hashes, telemetry)
         
         # 显示统计信息
         total_time = time.time() - start_time
@@ -344,9 +516,22 @@ if __name__ == "__main__":
         
         # 显示集合信息
         logging.info(f"ChromaDB 集合现有 {collection.count()} 个项目")
+        telemetry.stats["collection_count"] = collection.count()
+        
+        if args.export_numpy:
+            with telemetry.stage('export'):
+                manifest = export_numpy_index(collection, numpy_index_dir)
+            logging.info(f"NumPy 索引已导出: {manifest['count']} 个向量")
+            telemetry.stats["numpy_index"] = manifest
         
     except Exception as e:
         logging.error(f"处理过程中发生错误: {e}")
+        telemetry.stats["error"] = str(e)
+        telemetry.write_report(args.report_dir or REPORT_DIR)
         exit(1)
+    finally:
+        telemetry.stop_progress_server()
+    
+    telemetry.write_report(args.report_dir or REPORT_DIR)
     
     logging.info("数据注入过程已完成")
@@ -0,0 +1,194 @@
+# 图表关联索引: 图表 -> 其链接页面上的图表 (linked)，图表 -> 涉及相同服务域的图表 (shared)
+#
+# 由 db_initializer/build_link_index.py 在注入阶段根据爬虫输出的链接和文本元素构建，
+# 与 ChromaDB 数据一起部署。/retrieve_diagrams 的 related 选项直接查表取邻居，
+# 不需要额外的向量检索。
+import json
+import logging
+import re
+from array import array
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+LINKED = "linked"
+SHARED = "shared"
+
+# 出现在太多图表中的服务域 (例如 "Customer") 不足以说明两张图相关
+MAX_DOMAIN_FANOUT = 50
+MAX_LINKED_PER_DIAGRAM = 50
+MAX_SHARED_PER_DIAGRAM = 20
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def domain_key(text: str) -> str:
+    """服务域名称的比较键: 时序图中的参与者带前导冒号 (':Customer Portfolio')"""
+    return _SPACE_RE.sub(" ", text.strip().lstrip(":").strip()).lower()
+
+
+def _csr(adjacency: List[List[int]], weights: Optional[List[List[int]]] = None):
+    offsets = array("I", [0])
+    targets = array("I")
+    target_weights = array("I")
+    for i, neighbors in enumerate(adjacency):
+        targets.extend(neighbors)
+        if weights is not None:
+            target_weights.extend(weights[i])
+        offsets.append(len(targets))
+    return offsets, targets, target_weights
+
+
+class DiagramLinkIndexBuilder:
+    """
+    逐条收集图表 (id, 页面 URL, 概念, 文本元素, 链接)，build() 时计算两类邻接:
+    - linked: 图表链接到的页面上的所有图表，以及文本中引用了其概念的图表
+    - shared: 与之共同涉及至少一个服务域的图表，按共享服务域数量排序
+    服务域取自链接的对象页面和与某张图表概念同名的文本元素
+    """
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self.page_urls: List[str] = []
+        self.concepts: List[Optional[str]] = []
+        self.texts: List[Set[str]] = []
+        self.links: List[List[str]] = []
+
+    def add(self, doc_id: str, page_url: str, concept: Optional[str], text_elements: Iterable[str], links: Iterable[str]):
+        if doc_id in self._positions:
+            return
+        self._positions[doc_id] = len(self.ids)
+        self.ids.append(doc_id)
+        self.page_urls.append(page_url)
+        self.concepts.append(domain_key(concept) if concept else None)
+        self.texts.append({domain_key(text) for text in text_elements if text and text.strip()})
+        self.links.append(list(links))
+
+    def build(
+        self,
+        max_linked: int = MAX_LINKED_PER_DIAGRAM,
+        max_shared: int = MAX_SHARED_PER_DIAGRAM,
+        max_fanout: int = MAX_DOMAIN_FANOUT,
+    ) -> "DiagramLinkIndex":
+        by_page: Dict[str, List[int]] = {}
+        by_concept: Dict[str, List[int]] = {}
+        for i, (page_url, concept) in enumerate(zip(self.page_urls, self.concepts)):
+            by_page.setdefault(page_url, []).append(i)
+            if concept:
+                by_concept.setdefault(concept, []).append(i)
+
+        linked: List[List[int]] = []
+        domains: List[Set[str]] = []
+        for i in range(len(self.ids)):
+            neighbors: Dict[int, None] = {}
+            diagram_domains: Set[str] = set()
+            for url in self.links[i]:
+                targets = by_page.get(url, ())
+                for target in targets:
+                    neighbors[target] = None
+                if "object_" in url:
+                    diagram_domains.add(url)
+            for text in self.texts[i]:
+                if text in by_concept:
+                    diagram_domains.add(text)
+                    for target in by_concept[text]:
+                        neighbors[target] = None
+            neighbors.pop(i, None)
+            linked.append(list(neighbors)[:max_linked])
+            domains.append(diagram_domains)
+
+        # 服务域 -> 涉及它的图表；过于常见的服务域不参与
+        by_domain: Dict[str, List[int]] = {}
+        for i, diagram_domains in enumerate(domains):
+            for domain in diagram_domains:
+                by_domain.setdefault(domain, []).append(i)
+        by_domain = {domain: members for domain, members in by_domain.items() if len(members) <= max_fanout}
+
+        shared: List[List[int]] = []
+        shared_weights: List[List[int]] = []
+        for i, diagram_domains in enumerate(domains):
+            counts: Dict[int, int] = {}
+            for domain in diagram_domains:
+                for other in by_domain.get(domain, ()):
+                    if other != i:
+                        counts[other] = counts.get(other, 0) + 1
+            ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:max_shared]
+            shared.append([other for other, _ in ranked])
+            shared_weights.append([count for _, count in ranked])
+
+        linked_offsets, linked_targets, _ = _csr(linked)
+        shared_offsets, shared_targets, weights = _csr(shared, shared_weights)
+        index = DiagramLinkIndex(self.ids, linked_offsets, linked_targets, shared_offsets, shared_targets, weights)
+        logging.info(
+            f"Diagram link index: {len(self.ids)} diagrams, {len(linked_targets)} linked and "
+            f"{len(shared_targets)} shared-domain edges, {len(by_domain)} service domains"
+        )
+        return index
+
+
+class DiagramLinkIndex:
+    """只读的图表关联索引 (CSR 邻接数组)，按 ChromaDB id 查询"""
+
+    def __init__(self, ids, linked_offsets, linked_targets, shared_offsets, shared_targets, shared_weights):
+        self.ids = ids
+        self.positions = {doc_id: i for i, doc_id in enumerate(ids)}
+        self.linked_offsets = linked_offsets
+        self.linked_targets = linked_targets
+        self.shared_offsets = shared_offsets
+        self.shared_targets = shared_targets
+        self.shared_weights = shared_weights
+
+    def __len__(self):
+        return len(self.ids)
+
+    def estimated_bytes(self) -> int:
+        """CSR 数组加 id 表与位置字典的近似内存占用"""
+        arrays = (self.linked_offsets, self.linked_targets, self.shared_offsets, self.shared_targets, self.shared_weights)
+        return sum(len(a) * a.itemsize for a in arrays) + len(self.ids) * 200
+
+    def linked(self, doc_id: str) -> List[str]:
+        i = self.positions.get(doc_id)
+        if i is None:
+            return []
+        return [self.ids[t] for t in self.linked_targets[self.linked_offsets[i]:self.linked_offsets[i + 1]]]
+
+    def shared(self, doc_id: str) -> List[str]:
+        i = self.positions.get(doc_id)
+        if i is None:
+            return []
+        return [self.ids[t] for t in self.shared_targets[self.shared_offsets[i]:self.shared_offsets[i + 1]]]
+
+    def related(self, doc_id: str, limit: int, exclude: Set[str] = frozenset()) -> List[Tuple[str, str]]:
+        """先取直接链接的图表，再按共享服务域数量补足，返回 (id, 关系)"""
+        found: List[Tuple[str, str]] = []
+        seen = set(exclude)
+        for relation, neighbors in ((LINKED, self.linked(doc_id)), (SHARED, self.shared(doc_id))):
+            for neighbor in neighbors:
+                if len(found) >= limit:
+                    return found
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    found.append((neighbor, relation))
+        return found
+
+    def save(self, path: str):
+        data = {
+            "ids": self.ids,
+            "linked_offsets": list(self.linked_offsets),
+            "linked_targets": list(self.linked_targets),
+            "shared_offsets": list(self.shared_offsets),
+            "shared_targets": list(self.shared_targets),
+            "shared_weights": list(self.shared_weights),
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> "DiagramLinkIndex":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            data["ids"],
+            array("I", data["linked_offsets"]), array("I", data["linked_targets"]),
+            array("I", data["shared_offsets"]), array("I", data["shared_targets"]),
+            array("I", data["shared_weights"]),
+        )
@@ -0,0 +1,170 @@
+# 可插拔的文本编码器后端，API 与注入脚本共用
+#
+# - sentence-transformers: 原有的 PyTorch 实现 (默认)
+# - onnx: 导出为 ONNX 的同一模型，由 ONNX Runtime 执行 (可选 int8 动态量化)，
+#   分词使用 HuggingFace tokenizers，整个推理路径不导入 torch
+#
+# 两个后端的输出一致: 均值池化 + L2 归一化后的 float32 向量 (与 all-MiniLM-L6-v2 的
+# sentence-transformers 管道相同)，可以混用在同一个集合中。
+import logging
+import os
+import time
+from typing import List, Optional
+
+import numpy as np
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_DIMENSION = 384
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "sentence-transformers")  # sentence-transformers | onnx
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx_model"))
+ONNX_QUANTIZED = os.getenv("ONNX_QUANTIZED", "true").lower() in ("1", "true", "yes")  # 存在量化模型时优先使用
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # 0 = 由 ONNX Runtime 决定
+MAX_SEQ_LENGTH = 256  # all-MiniLM-L6-v2 的 max_seq_length
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_QUANTIZED_FILE = "model_quantized.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+# 导出后的一致性检查: 与 PyTorch 输出的余弦相似度下限
+PARITY_MIN_COSINE = 0.99
+PARITY_MIN_COSINE_QUANTIZED = 0.95
+
+
+class SentenceTransformerEncoder:
+    """PyTorch 后端"""
+
+    backend = "sentence-transformers"
+
+    def __init__(self, model_name: str = MODEL_NAME):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        return self.model.encode(
+            texts, batch_size=batch_size, show_progress_bar=show_progress_bar,
+            convert_to_numpy=True, normalize_embeddings=True,
+        )
+
+    # 与 ChromaDB EmbeddingFunction 相同的调用方式
+    def __call__(self, input: List[str]) -> np.ndarray:
+        return self.encode(input)
+
+
+class OnnxEncoder:
+    """ONNX Runtime 后端，只依赖 onnxruntime、tokenizers 和 numpy"""
+
+    backend = "onnx"
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, quantized: bool = ONNX_QUANTIZED):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(model_dir, ONNX_QUANTIZED_FILE)
+        if not (quantized and os.path.exists(model_path)):
+            model_path = os.path.join(model_dir, ONNX_MODEL_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"ONNX model not found in {model_dir}; run db_initializer/export_onnx.py first"
+            )
+        self.model_path = model_path
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id("[PAD]") or 0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, EMBEDDING_DIMENSION), dtype=np.float32)
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(list(texts[start:start + batch_size]))
+            input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+            token_embeddings = self.session.run(None, feeds)[0]
+            # 均值池化 (忽略 padding)，再做 L2 归一化
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            batches.append(pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None))
+        return np.concatenate(batches).astype(np.float32, copy=False)
+
+    def __call__(self, input: List[str]) -> np.ndarray:
+        return self.encode(input)
+
+
+def load_encoder(backend: Optional[str] = None, model_name: str = MODEL_NAME):
+    """按 ENCODER_BACKEND (或参数) 创建编码器"""
+    backend = backend or ENCODER_BACKEND
+    start = time.perf_counter()
+    if backend == "onnx":
+        encoder = OnnxEncoder()
+        detail = encoder.model_path
+    elif backend == "sentence-transformers":
+        encoder = SentenceTransformerEncoder(model_name)
+        detail = model_name
+    else:
+        raise ValueError(f"Unknown encoder backend: {backend} (expected 'sentence-transformers' or 'onnx')")
+    logging.info(f"Loaded {backend} encoder ({detail}) in {time.perf_counter() - start:.2f}s")
+    return encoder
+
+
+def export_onnx(model_name: str = MODEL_NAME, output_dir: str = ONNX_MODEL_DIR, quantize: bool = True) -> List[str]:
+    """
+    把 sentence-transformers 模型的 Transformer 部分导出为 ONNX (池化和归一化在 OnnxEncoder 中完成)，
+    保存 tokenizer.json，可选地做 int8 动态量化。需要 torch，只在构建阶段运行。
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(output_dir, exist_ok=True)
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0].auto_model.eval()
+    model.tokenizer.save_pretrained(output_dir)
+
+    sample = model.tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    model_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+    written = [model_path]
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantized_path = os.path.join(output_dir, ONNX_QUANTIZED_FILE)
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        written.append(quantized_path)
+    return written
+
+
+def cosine_parity(reference, candidate, texts: List[str]) -> dict:
+    """两个编码器对同一批文本的向量余弦相似度 (两者输出均已归一化)"""
+    expected = np.asarray(reference.encode(texts), dtype=np.float32)
+    actual = np.asarray(candidate.encode(texts), dtype=np.float32)
+    cosines = (expected * actual).sum(axis=1)
+    return {
+        "texts": len(texts),
+        "min_cosine": round(float(cosines.min()), 6),
+        "mean_cosine": round(float(cosines.mean()), 6),
+    }
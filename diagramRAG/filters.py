@@ -0,0 +1,156 @@
+# 检索过滤: 将请求中的类型化过滤字段编译为 ChromaDB where 子句，
+# 并在启动时为常用元数据字段预计算位图 (id 集合)，用于在检索前判断过滤结果规模
+import logging
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+# 请求字段 -> ChromaDB 元数据键
+FILTER_FIELDS = {
+    "semantic": "bizzsemantic",
+    "concept": "bizzconcept",
+    "bizzid": "bizzid",
+    "landscapeVersion": "landscape_version",
+}
+
+# 建立位图的元数据键 (取值个数有限，且是最常见的过滤条件)
+# 其他字段 (bizzid 几乎每张图一个取值) 只保存 取值 -> 行号列表，求掩码时再组装位图
+BITMAP_KEYS = ("bizzsemantic", "bizzconcept", "landscape_version")
+
+# 启动时分页读取元数据，避免一次性把所有 svg_content 读入内存
+INDEX_PAGE_SIZE = 500
+
+_LANDSCAPE_VERSION_RE = re.compile(r"servicelandscape[-_.]?(\d+)[-_.](\d+)[-_.](\d+)", re.IGNORECASE)
+
+
+def landscape_version(source_url: str) -> Optional[str]:
+    """从来源 URL 中解析 BIAN landscape 版本, 例如 '.../servicelandscape-12-0-0/...' -> '12-0-0'"""
+    match = _LANDSCAPE_VERSION_RE.search(source_url or "")
+    return "-".join(match.groups()) if match else None
+
+
+def compile_where(filters: Dict[str, List[str]]) -> Optional[Dict[str, Any]]:
+    """
+    将过滤条件编译为 ChromaDB where 子句: 同一字段内多个取值为 $in (或)，不同字段之间为 $and
+    没有有效条件时返回 None
+    """
+    clauses = []
+    for field, key in FILTER_FIELDS.items():
+        values = [str(v) for v in filters.get(field) or [] if v is not None and str(v) != ""]
+        if not values:
+            continue
+        clauses.append({key: values[0]} if len(values) == 1 else {key: {"$in": values}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+class FilterIndex:
+    """
+    元数据位图索引: BITMAP_KEYS 的每个 (元数据键, 取值) 对应一个 Python int 位图，第 i 位表示集合中
+    第 i 个 id；高基数字段按取值保存行号，避免 n 个取值 × n 位的位图
+    Chroma 后端的过滤在检索内部执行 (where)，位图用于零开销地求出命中数量，
+    从而跳过必然为空的检索，并把 n_results 限制在命中数量以内；
+    NumPy 后端直接把位图作为打分掩码
+    """
+
+    def __init__(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        self.ids = list(ids)
+        self.bitmaps: Dict[str, Dict[str, int]] = {key: {} for key in BITMAP_KEYS}
+        self.positions: Dict[str, Dict[str, List[int]]] = {
+            key: {} for key in FILTER_FIELDS.values() if key not in BITMAP_KEYS
+        }
+        for position, metadata in enumerate(metadatas):
+            bit = 1 << position
+            for key, by_value in self.bitmaps.items():
+                value = (metadata or {}).get(key)
+                if value is None:
+                    continue
+                value = str(value)
+                by_value[value] = by_value.get(value, 0) | bit
+            for key, by_value in self.positions.items():
+                value = (metadata or {}).get(key)
+                if value is not None:
+                    by_value.setdefault(str(value), []).append(position)
+        self.all_mask = (1 << len(self.ids)) - 1
+
+    @classmethod
+    def build(cls, store, page_size: int = INDEX_PAGE_SIZE) -> "FilterIndex":
+        """
+        从向量存储 (vector_store.py) 分页读取元数据构建位图，位序与存储的行序一致。
+        旧数据没有 landscape_version 字段时: NumPy 后端直接用位图做掩码，从 source_url 推导即可；
+        Chroma 后端用 where 子句过滤，只能匹配已写入的字段，因此不推导 (否则位图计数与检索结果
+        不一致)，并提示运行 inject_data.py --backfill-metadata
+        """
+        start = time.perf_counter()
+        derive_versions = getattr(store, "backend", None) != "chroma"
+        missing_versions = 0
+        ids: List[str] = []
+        metadatas: List[Dict[str, Any]] = []
+        for page_ids, page_metadatas in store.iter_metadata(page_size):
+            for doc_id, metadata in zip(page_ids, page_metadatas):
+                metadata = metadata or {}
+                version = metadata.get("landscape_version")
+                if version is None:
+                    derived = landscape_version(metadata.get("source_url", ""))
+                    if derived is not None:
+                        missing_versions += 1
+                        if derive_versions:
+                            version = derived
+                ids.append(doc_id)
+                metadatas.append({
+                    key: (version if key == "landscape_version" else metadata.get(key))
+                    for key in FILTER_FIELDS.values()
+                })
+        index = cls(ids, metadatas)
+        logging.info(
+            f"Filter index built: {len(ids)} diagrams, "
+            + ", ".join(f"{key}={len(index.bitmaps[key])} values" for key in BITMAP_KEYS)
+            + f" in {time.perf_counter() - start:.2f}s"
+        )
+        if missing_versions and not derive_versions:
+            logging.error(
+                f"{missing_versions} diagrams lack landscape_version metadata; the landscapeVersion filter "
+                "excludes them until `db_initializer/inject_data.py --backfill-metadata` is run"
+            )
+        return index
+
+    def mask(self, filters: Dict[str, List[str]]) -> int:
+        """求出满足所有过滤条件的 id 位图"""
+        result = self.all_mask
+        for field, key in FILTER_FIELDS.items():
+            values = [str(v) for v in filters.get(field) or [] if v is not None and str(v) != ""]
+            if not values:
+                continue
+            field_mask = 0
+            if key in self.bitmaps:
+                by_value = self.bitmaps[key]
+                for value in values:
+                    field_mask |= by_value.get(value, 0)
+            else:
+                for value in values:
+                    for position in self.positions[key].get(value, ()):
+                        field_mask |= 1 << position
+            result &= field_mask
+            if not result:
+                break
+        return result
+
+    def estimated_bytes(self) -> int:
+        """位图 (每个取值 n/8 字节)、行号表和 id 列表的近似内存占用"""
+        bitmaps = sum(len(by_value) for by_value in self.bitmaps.values()) * ((len(self.ids) + 7) // 8 + 64)
+        positions = sum(len(by_value) * 120 + sum(map(len, by_value.values())) * 8 for by_value in self.positions.values())
+        return bitmaps + positions + len(self.ids) * 120
+
+    def count(self, filters: Dict[str, List[str]]) -> int:
+        return self.mask(filters).bit_count()
+
+    def matching_ids(self, filters: Dict[str, List[str]]) -> List[str]:
+        mask = self.mask(filters)
+        return [doc_id for position, doc_id in enumerate(self.ids) if mask >> position & 1]
+
+    def values(self, key: str) -> Dict[str, int]:
+        """每个取值对应的图表数量 (用于 /filters 端点)"""
+        if key in self.positions:
+            return {value: len(positions) for value, positions in sorted(self.positions[key].items())}
+        return {value: bitmap.bit_count() for value, bitmap in sorted(self.bitmaps.get(key, {}).items())}
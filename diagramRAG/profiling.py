@@ -0,0 +1,155 @@
+# 生产环境按需诊断端点: 采样 CPU 剖析 (flamegraph 折叠栈格式)、tracemalloc 内存分配和事件循环延迟
+#
+# 所有端点都需要 ADMIN_TOKEN (请求头 Authorization: Bearer <token> 或 X-Admin-Token)；
+# 未配置 ADMIN_TOKEN 时端点整体禁用。
+import asyncio
+import logging
+import os
+import secrets
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from telemetry import EVENT_LOOP_LAG_SECONDS, EVENT_LOOP_LAG_MAX_SECONDS
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_MIN_INTERVAL_MS = 5.0  # 采样间隔下限，限制对线上流量的开销
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+
+# 同一时间只允许一个剖析任务
+_profile_lock = threading.Lock()
+_loop_lag = {"last": 0.0, "max": 0.0, "samples": 0}
+
+
+def require_admin(authorization: Optional[str] = Header(None), x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled")
+    token = x_admin_token
+    if not token and authorization and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    if not token or not secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def sample_stacks(seconds: float, interval: float) -> tuple[Counter, int]:
+    """
+    在当前线程中以固定间隔采样所有其他线程的调用栈，返回折叠栈计数。
+    栈从线程名开始由根到叶排列，可直接用于 flamegraph.pl 或 speedscope。
+    """
+    own_id = threading.get_ident()
+    names = {}
+    stacks = Counter()
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if len(names) != threading.active_count():
+            names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(thread_id, f"thread-{thread_id}"))
+            stacks[";".join(reversed(labels))] += 1
+        samples += 1
+        time.sleep(interval)
+    return stacks, samples
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(10.0, gt=0, description="采样时长 (秒)"),
+    interval_ms: float = Query(10.0, description="采样间隔 (毫秒)"),
+):
+    """采样 CPU 剖析，返回 flamegraph 折叠栈格式文本 ('frame;frame;frame count')"""
+    seconds = min(seconds, PROFILE_MAX_SECONDS)
+    interval = max(interval_ms, PROFILE_MIN_INTERVAL_MS) / 1000
+    if not _profile_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    try:
+        logging.info(f"Starting sampling profile: {seconds}s at {interval * 1000:.0f}ms")
+        # 采样在独立线程中进行，事件循环继续处理线上请求
+        stacks, samples = await asyncio.to_thread(sample_stacks, seconds, interval)
+    finally:
+        _profile_lock.release()
+    lines = [f"{stack} {count}" for stack, count in stacks.most_common()]
+    return PlainTextResponse(
+        "\n".join(lines) + "\n",
+        headers={"X-Profile-Samples": str(samples), "X-Profile-Interval-Ms": f"{interval * 1000:.1f}"},
+    )
+
+
+@router.post("/tracemalloc/start")
+async def tracemalloc_start(frames: int = Query(1, ge=1, le=25, description="每次分配记录的栈深度")):
+    """开始跟踪内存分配。跟踪期间每次分配都有额外开销，诊断结束后应调用 stop。"""
+    if tracemalloc.is_tracing():
+        return {"tracing": True, "frames": tracemalloc.get_traceback_limit()}
+    tracemalloc.start(frames)
+    return {"tracing": True, "frames": frames}
+
+
+@router.post("/tracemalloc/stop")
+async def tracemalloc_stop():
+    tracemalloc.stop()
+    return {"tracing": False}
+
+
+@router.get("/tracemalloc")
+async def tracemalloc_snapshot(
+    limit: int = Query(20, ge=1, le=200),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+):
+    """当前已跟踪内存和占用最多的分配位置"""
+    if not tracemalloc.is_tracing():
+        raise HTTPException(status_code=409, detail="tracemalloc is not running; POST /admin/tracemalloc/start first")
+    snapshot = await asyncio.to_thread(tracemalloc.take_snapshot)
+    current, peak = tracemalloc.get_traced_memory()
+    top = snapshot.statistics(group_by)[:limit]
+    return {
+        "traced_current_bytes": current,
+        "traced_peak_bytes": peak,
+        "top": [
+            {
+                "size_bytes": stat.size,
+                "count": stat.count,
+                "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+            }
+            for stat in top
+        ],
+    }
+
+
+@router.get("/loop_lag")
+async def loop_lag():
+    """事件循环延迟: 最近一次测量值和自启动以来的最大值 (秒)"""
+    return {"last_seconds": _loop_lag["last"], "max_seconds": _loop_lag["max"], "samples": _loop_lag["samples"]}
+
+
+async def monitor_event_loop_lag():
+    """后台任务: 测量 asyncio.sleep 的实际唤醒延迟，反映事件循环被阻塞的程度"""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        lag = max(0.0, time.perf_counter() - start - LOOP_LAG_INTERVAL)
+        _loop_lag["last"] = lag
+        _loop_lag["max"] = max(_loop_lag["max"], lag)
+        _loop_lag["samples"] += 1
+        EVENT_LOOP_LAG_SECONDS.observe(lag)
+        EVENT_LOOP_LAG_MAX_SECONDS.set(_loop_lag["max"])
@@ -0,0 +1,147 @@
+# 图表栅格化: 注入阶段把每张 SVG 渲染为缩略图和多级瓦片 (按 svg_hash 存放)，
+# 聊天前端先显示缩略图，放大时按需加载瓦片，只有继续放大才加载完整 SVG。
+# 大型视图图表的 SVG 有几 MB，在移动端解析和绘制都很慢。
+#
+# 目录结构 (内容寻址，SVG 不变则文件不变，可以永久缓存):
+#   <root>/<hash[:2]>/<hash>/manifest.json
+#   <root>/<hash[:2]>/<hash>/thumb.webp
+#   <root>/<hash[:2]>/<hash>/<z>/<x>_<y>.webp     z = 0 为整图缩小到一张瓦片，z 越大越清晰
+#
+# 渲染依赖 cairosvg 和 Pillow (requirements-raster.txt)，只在构建阶段需要；
+# API 只读取生成的文件。
+import io
+import json
+import math
+import os
+import re
+import shutil
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Optional, Tuple
+
+RASTER_FORMAT = "webp"
+RASTER_MEDIA_TYPE = "image/webp"
+TILE_SIZE = 256
+THUMBNAIL_WIDTH = 480
+RASTER_SCALE = 2.0  # 最高一级相对 SVG 固有尺寸的倍数 (高分屏)
+MAX_RASTER_PIXELS = 32_000_000  # 最高一级的像素上限，超出时降低倍数
+RASTER_QUALITY = 85
+MANIFEST_FILE = "manifest.json"
+THUMBNAIL_FILE = f"thumb.{RASTER_FORMAT}"
+
+_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+_LENGTH_RE = re.compile(r"^\s*([0-9.]+)\s*(px)?\s*$")
+
+
+def is_svg_hash(value: str) -> bool:
+    return bool(_HASH_RE.match(value or ""))
+
+
+def raster_dir(root: str, svg_hash: str) -> str:
+    return os.path.join(root, svg_hash[:2], svg_hash)
+
+
+def tile_path(root: str, svg_hash: str, z: int, x: int, y: int) -> str:
+    return os.path.join(raster_dir(root, svg_hash), str(z), f"{x}_{y}.{RASTER_FORMAT}")
+
+
+def svg_size(svg_content: str) -> Optional[Tuple[float, float]]:
+    """SVG 的固有尺寸: width/height (像素或无单位)，否则取 viewBox"""
+    try:
+        root = ET.fromstring(svg_content)
+    except ET.ParseError:
+        return None
+    width, height = (_LENGTH_RE.match(root.get(name) or "") for name in ("width", "height"))
+    if width and height:
+        return float(width.group(1)), float(height.group(1))
+    view_box = (root.get("viewBox") or "").replace(",", " ").split()
+    if len(view_box) == 4:
+        return float(view_box[2]), float(view_box[3])
+    return None
+
+
+def load_manifest(root: str, svg_hash: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(raster_dir(root, svg_hash), MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def render_diagram(svg_content: str, svg_hash: str, root: str) -> Dict[str, Any]:
+    """
+    渲染一张图表的缩略图和瓦片金字塔，返回 manifest。已存在时直接返回 (内容寻址，无需重建)。
+    先写临时目录再改名，API 不会读到生成了一半的瓦片。
+    """
+    existing = load_manifest(root, svg_hash)
+    if existing is not None:
+        return existing
+
+    import cairosvg
+    from PIL import Image
+
+    size = svg_size(svg_content)
+    if size is None or min(size) <= 0:
+        raise ValueError(f"Cannot determine the size of SVG {svg_hash[:12]}")
+    scale = min(RASTER_SCALE, math.sqrt(MAX_RASTER_PIXELS / (size[0] * size[1])))
+    width, height = max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+    png = cairosvg.svg2png(
+        bytestring=svg_content.encode("utf-8"),
+        output_width=width,
+        output_height=height,
+        background_color="white",
+        unsafe=False,  # 不解析外部实体、不读取本地文件
+    )
+    image = Image.open(io.BytesIO(png)).convert("RGB")
+
+    target = raster_dir(root, svg_hash)
+    tmp_dir = target + ".tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    thumbnail = image.copy()
+    thumbnail.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 4), Image.LANCZOS)
+    thumbnail.save(os.path.join(tmp_dir, THUMBNAIL_FILE), quality=RASTER_QUALITY, method=6)
+
+    # 从最清晰的一级开始逐级缩小一半，直到整图放得进一张瓦片
+    max_level = max(0, math.ceil(math.log2(max(image.width, image.height) / TILE_SIZE)))
+    levels = []
+    level_image = image
+    tile_count = 0
+    for z in range(max_level, -1, -1):
+        if z < max_level:
+            level_image = level_image.resize(
+                (max(1, math.ceil(level_image.width / 2)), max(1, math.ceil(level_image.height / 2))),
+                Image.LANCZOS,
+            )
+        cols = math.ceil(level_image.width / TILE_SIZE)
+        rows = math.ceil(level_image.height / TILE_SIZE)
+        os.makedirs(os.path.join(tmp_dir, str(z)))
+        for y in range(rows):
+            for x in range(cols):
+                box = (x * TILE_SIZE, y * TILE_SIZE,
+                       min((x + 1) * TILE_SIZE, level_image.width), min((y + 1) * TILE_SIZE, level_image.height))
+                level_image.crop(box).save(
+                    os.path.join(tmp_dir, str(z), f"{x}_{y}.{RASTER_FORMAT}"), quality=RASTER_QUALITY, method=4,
+                )
+                tile_count += 1
+        levels.append({"z": z, "width": level_image.width, "height": level_image.height, "cols": cols, "rows": rows})
+
+    manifest = {
+        "svg_hash": svg_hash,
+        "format": RASTER_FORMAT,
+        "tile_size": TILE_SIZE,
+        "width": image.width,
+        "height": image.height,
+        "svg_width": size[0],
+        "svg_height": size[1],
+        "thumbnail": {"width": thumbnail.width, "height": thumbnail.height},
+        "levels": sorted(levels, key=lambda level: level["z"]),
+        "tiles": tile_count,
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    os.replace(tmp_dir, target)
+    return manifest
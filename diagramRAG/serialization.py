@@ -0,0 +1,88 @@
+# 检索响应的快速序列化: 每个图表预先用 orjson 序列化为片段并按 id 缓存，
+# 响应体直接拼接字节，不再构建 Pydantic 模型，也不经过第二次校验/序列化
+#
+# 片段中与请求无关的部分 (描述、文件名、体积最大的 svg_content、来源 URL) 按 id 缓存；
+# 依赖请求的显示名称 (按排名编号) 和元数据 (关联关系) 每次单独序列化后拼入。
+# 字段顺序与 DiagramDocument 保持一致。
+import os
+from typing import Any, Dict, Iterable, NamedTuple, Optional
+
+import orjson
+
+from cache import LRUCache
+
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "512"))  # 缓存的图表片段数量
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# 键为 (集合名, 图表 id)。图表 id 为 SVG 内容哈希，内容不变则片段不变，无需失效；
+# 同一张图在不同版本的集合中来源 URL 不同，因此按集合区分
+fragment_cache = LRUCache("document_fragment", FRAGMENT_CACHE_SIZE)
+
+
+class DocumentFragment(NamedTuple):
+    head: bytes  # {"text":...,"filename":...,"source_display_name":
+    middle: bytes  # ,"svg_content":...,"source_url":...,"metadata":
+    metadata: Dict[str, Any]
+    middle_without_svg: bytes  # ,"svg_content":"","source_url":...,"metadata": (includeSvg=false)
+
+
+def build_fragment(doc_id: str, metadata: Dict[str, Any], stored_document: str) -> DocumentFragment:
+    """把 ChromaDB 中的一条记录序列化为可复用的片段"""
+    text_elements = metadata.get('text_elements', [])
+    # inject_data.py 将生成的描述存为 ChromaDB document
+    description = metadata.get('description', '') or stored_document
+    if not description and text_elements:
+        description = " ".join(text_elements)
+    original_metadata = metadata.get('metadata', {})
+    if not isinstance(original_metadata, dict):
+        original_metadata = {}
+
+    head = b''.join((
+        b'{"text":', orjson.dumps(description),
+        b',"filename":', orjson.dumps(f"diagram_{doc_id}.svg"),
+        b',"source_display_name":',
+    ))
+    tail = b''.join((b',"source_url":', orjson.dumps(metadata.get('source_url', '')), b',"metadata":'))
+    middle = b''.join((b',"svg_content":', orjson.dumps(metadata.get('svg_content', '')), tail))
+    return DocumentFragment(head, middle, original_metadata, b',"svg_content":""' + tail)
+
+
+def render_document(fragment: DocumentFragment, display_name: str, extra_metadata: Optional[Dict[str, Any]] = None,
+                    include_svg: bool = True) -> bytes:
+    """拼出一个完整的 DiagramDocument JSON 对象；include_svg=False 时 svg_content 为空 (客户端按需加载)"""
+    metadata = {**fragment.metadata, **extra_metadata} if extra_metadata else fragment.metadata
+    return b''.join((
+        fragment.head,
+        orjson.dumps(metadata.get('title', display_name)),
+        fragment.middle if include_svg else fragment.middle_without_svg,
+        orjson.dumps(metadata),
+        b'}',
+    ))
+
+
+def cached_fragments(ids: Iterable[str], collection: str = "") -> Dict[str, DocumentFragment]:
+    fragments = {}
+    for doc_id in ids:
+        fragment = fragment_cache.get((collection, doc_id))
+        if fragment is not None:
+            fragments[doc_id] = fragment
+    return fragments
+
+
+def fetch_fragments(store, ids: list, collection: str = "") -> Dict[str, DocumentFragment]:
+    """从向量存储读取 ids 对应的记录 (一次 get)，序列化并写入缓存"""
+    if not ids:
+        return {}
+    records = store.get(ids)
+    fragments = {}
+    for k, doc_id in enumerate(records["ids"]):
+        fragment = build_fragment(doc_id, records["metadatas"][k] or {}, records["documents"][k] or "")
+        fragment_cache.put((collection, doc_id), fragment)
+        fragments[doc_id] = fragment
+    return fragments
+
+
+def retrieval_body(documents: list, related: list) -> bytes:
+    """DiagramRetrievalResponse 的 JSON 字节"""
+    return b''.join((b'{"documents":[', b','.join(documents), b'],"related":[', b','.join(related), b']}'))
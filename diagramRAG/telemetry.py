@@ -0,0 +1,127 @@
+# 查询路径的性能遥测: Prometheus 指标、分阶段计时、Server-Timing 头和采样的结构化日志
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# 每个请求都记录到指标中；日志只按比例采样，慢请求总是记录
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+# 是否在响应中附加 Server-Timing 头 (浏览器开发者工具可直接展示各阶段耗时)
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(10))  # 1 KB .. 256 MB
+
+STAGE_SECONDS = Histogram(
+    "diagram_rag_stage_seconds",
+    "Time spent in each stage of the retrieval path",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "diagram_rag_request_seconds",
+    "End-to-end request latency",
+    ["path", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+RESPONSE_BYTES = Histogram(
+    "diagram_rag_response_bytes",
+    "Size of retrieval response bodies",
+    ["path"],
+    buckets=SIZE_BUCKETS,
+)
+RESULTS_RETURNED = Histogram(
+    "diagram_rag_results_returned",
+    "Number of diagrams returned per retrieval",
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50),
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "diagram_rag_requests_in_flight",
+    "Requests currently being processed",
+)
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "diagram_rag_event_loop_lag_seconds",
+    "Delay between a scheduled event-loop wakeup and when it actually ran",
+    buckets=LATENCY_BUCKETS,
+)
+EVENT_LOOP_LAG_MAX_SECONDS = Gauge(
+    "diagram_rag_event_loop_lag_max_seconds",
+    "Largest event-loop lag observed since startup",
+)
+CACHE_REQUESTS = Counter(
+    "diagram_rag_cache_requests_total",
+    "Cache lookups by cache and result (hit/miss); hit ratio = hit / (hit + miss)",
+    ["cache", "result"],
+)
+
+COLLECTION_LOAD_SECONDS = Histogram(
+    "diagram_rag_collection_load_seconds",
+    "Time to open a collection on first use (vector store, filter index, link index)",
+    ["collection"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+COLLECTIONS_OPEN = Gauge(
+    "diagram_rag_collections_open",
+    "Collections currently held in the collection registry",
+)
+COLLECTION_MEMORY_BYTES = Gauge(
+    "diagram_rag_collection_memory_bytes",
+    "Estimated resident memory of the open collections",
+)
+COLLECTION_EVICTIONS = Counter(
+    "diagram_rag_collection_evictions_total",
+    "Collections evicted from the registry to stay within its memory budget",
+    ["collection"],
+)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def metrics_response_body() -> tuple[bytes, str]:
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class RequestTimings:
+    """记录一次请求中各阶段的耗时，并同步写入 Prometheus 直方图"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            STAGE_SECONDS.labels(stage=name).observe(elapsed)
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def server_timing_header(self) -> str:
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items()]
+        parts.append(f"total;dur={self.total_ms():.2f}")
+        return ", ".join(parts)
+
+
+def log_request(event: dict, timings: RequestTimings):
+    """按 LOG_SAMPLE_RATE 采样输出一行 JSON 结构化日志；慢请求总是输出"""
+    total_ms = timings.total_ms()
+    slow = total_ms >= SLOW_REQUEST_MS
+    if not slow and random.random() >= LOG_SAMPLE_RATE:
+        return
+    record = dict(event)
+    record["total_ms"] = round(total_ms, 2)
+    record["stages_ms"] = {name: round(seconds * 1000, 2) for name, seconds in timings.stages.items()}
+    record["slow"] = slow
+    logging.log(logging.WARNING if slow else logging.INFO, json.dumps(record, ensure_ascii=False))
@@ -0,0 +1,313 @@
+# 向量存储后端: API 和注入脚本通过同一接口访问图表向量与元数据
+#
+# - chroma: 原有的 ChromaDB 集合 (HNSW 近似检索 + SQLite 元数据)
+# - numpy: 从集合导出的只读索引。几千个 384 维向量只有几 MB，一次矩阵乘法
+#   加 argpartition 即可得到精确 top-k，查询时不依赖任何数据库
+#
+# 两者接口相同:
+#   search(query_embeddings, n_results, filters=None, filter_index=None) -> 每个查询的 id 列表
+#   get(ids) -> {"ids", "metadatas", "documents"}
+#   iter_metadata(page_size) -> 逐页产出 (ids, metadatas)，用于构建过滤位图
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from filters import compile_where
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")  # chroma | numpy
+EXPORT_PAGE_SIZE = 500
+
+# NumPy 索引目录中的文件
+EMBEDDINGS_FILE = "embeddings.npy"  # float32 (n, dim)，已归一化，以 mmap 方式打开
+IDS_FILE = "ids.json"
+RECORDS_FILE = "records.jsonl"  # 每行一条 {"metadata", "document"}，按行偏移随机读取
+OFFSETS_FILE = "offsets.npy"  # int64 (n + 1)，records.jsonl 中每行的起始字节
+FILTER_METADATA_FILE = "filter_metadata.json"  # 去掉 svg_content 的元数据，启动时构建位图用
+MANIFEST_FILE = "manifest.json"
+
+# 不写入 filter_metadata.json 的大字段
+_LARGE_METADATA_KEYS = ("svg_content",)
+
+
+# 估算常驻内存时每个 id 的开销 (64 字符哈希字符串 + 字典项)
+ID_OVERHEAD_BYTES = 200
+# HNSW 图每个向量的近似额外开销 (默认 M=16 的邻居表 + 标签映射)
+HNSW_OVERHEAD_BYTES = 256
+
+# 同一路径只创建一个 PersistentClient，多个集合共用 (及其段缓存)
+_chroma_clients: Dict[str, Any] = {}
+_chroma_clients_lock = threading.Lock()
+
+
+def chroma_client(path: str, memory_limit_bytes: Optional[int] = None):
+    """
+    共享的 ChromaDB 客户端。给出 memory_limit_bytes 时启用 Chroma 的 LRU 段缓存，
+    由 Chroma 自己卸载最久未用集合的 HNSW 索引
+    """
+    import chromadb
+    from chromadb.config import Settings
+
+    with _chroma_clients_lock:
+        client = _chroma_clients.get(path)
+        if client is None:
+            settings = Settings(anonymized_telemetry=False)
+            if memory_limit_bytes:
+                settings = Settings(
+                    anonymized_telemetry=False,
+                    chroma_segment_cache_policy="LRU",
+                    chroma_memory_limit_bytes=memory_limit_bytes,
+                )
+            client = chromadb.PersistentClient(path=path, settings=settings)
+            _chroma_clients[path] = client
+        return client
+
+
+class ChromaVectorStore:
+    backend = "chroma"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    @classmethod
+    def open(cls, path: str, collection_name: str, memory_limit_bytes: Optional[int] = None) -> "ChromaVectorStore":
+        return cls(chroma_client(path, memory_limit_bytes).get_collection(name=collection_name))
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def estimated_bytes(self) -> int:
+        """HNSW 索引加载后的近似内存占用 (向量 + 图)"""
+        count = self.count()
+        if not count:
+            return 0
+        sample = self.collection.get(limit=1, include=["embeddings"])
+        embeddings = sample.get("embeddings")
+        dimension = len(embeddings[0]) if embeddings is not None and len(embeddings) else 0
+        return count * (dimension * 4 + HNSW_OVERHEAD_BYTES + ID_OVERHEAD_BYTES)
+
+    def search(self, query_embeddings: Sequence[Sequence[float]], n_results: int,
+               filters: Optional[Dict[str, List[str]]] = None, filter_index=None) -> List[List[str]]:
+        # 过滤条件编译为 where 子句，在 HNSW 检索内部执行
+        results = self.collection.query(
+            query_embeddings=[list(map(float, q)) for q in query_embeddings],
+            n_results=n_results,
+            where=compile_where(filters) if filters else None,
+            include=["distances"],
+        )
+        return results["ids"] if results and results["ids"] else [[] for _ in query_embeddings]
+
+    def get(self, ids: List[str]) -> Dict[str, list]:
+        return self.collection.get(ids=ids, include=["metadatas", "documents"])
+
+    def iter_metadata(self, page_size: int = EXPORT_PAGE_SIZE) -> Iterator[Tuple[List[str], List[Dict[str, Any]]]]:
+        offset = 0
+        while True:
+            page = self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            page_ids = page.get("ids") or []
+            if not page_ids:
+                return
+            yield page_ids, page.get("metadatas") or [{}] * len(page_ids)
+            offset += len(page_ids)
+            if len(page_ids) < page_size:
+                return
+
+
+class NumpyVectorStore:
+    """只读的精确检索索引: mmap 的向量矩阵 + 按偏移读取的记录文件"""
+
+    backend = "numpy"
+
+    def __init__(self, directory: str):
+        start = time.perf_counter()
+        self.directory = directory
+        self.embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r")
+        with open(os.path.join(directory, IDS_FILE), encoding="utf-8") as f:
+            self.ids: List[str] = json.load(f)
+        self.positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self.offsets = np.load(os.path.join(directory, OFFSETS_FILE))
+        # os.pread 不移动文件指针，多个线程可共用同一个描述符
+        self._records_fd = os.open(os.path.join(directory, RECORDS_FILE), os.O_RDONLY)
+        self._mask_cache: Tuple[Optional[int], Optional[np.ndarray]] = (None, None)
+        if len(self.ids) != self.embeddings.shape[0] or len(self.offsets) != len(self.ids) + 1:
+            raise ValueError(f"Inconsistent NumPy index in {directory}")
+        logging.info(
+            f"NumPy vector index opened: {len(self.ids)} x {self.embeddings.shape[1]} "
+            f"in {time.perf_counter() - start:.3f}s"
+        )
+
+    @classmethod
+    def open(cls, directory: str) -> "NumpyVectorStore":
+        return cls(directory)
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def estimated_bytes(self) -> int:
+        """向量矩阵按全部读入页缓存计算，加上 id 表和偏移表"""
+        return int(self.embeddings.nbytes + self.offsets.nbytes) + len(self.ids) * ID_OVERHEAD_BYTES
+
+    def _allowed(self, filters: Optional[Dict[str, List[str]]], filter_index) -> Optional[np.ndarray]:
+        """把过滤位图 (Python int) 转为布尔数组；位图必须由本存储的 iter_metadata 构建 (行序一致)"""
+        if not filters or filter_index is None:
+            return None
+        if len(filter_index.ids) != len(self.ids):
+            raise ValueError("Filter index was not built from this vector store")
+        bitmap = filter_index.mask(filters)
+        if bitmap == filter_index.all_mask:
+            return None
+        cached_bitmap, cached_mask = self._mask_cache
+        if cached_bitmap == bitmap:
+            return cached_mask
+        packed = np.frombuffer(bitmap.to_bytes((len(self.ids) + 7) // 8 or 1, "little"), dtype=np.uint8)
+        mask = np.unpackbits(packed, bitorder="little")[:len(self.ids)].astype(bool)
+        self._mask_cache = (bitmap, mask)
+        return mask
+
+    def scores(self, query_embeddings: Sequence[Sequence[float]]) -> np.ndarray:
+        """所有查询对全部向量的余弦相似度，一次矩阵乘法完成 (q, n)"""
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.clip(norms, 1e-12, None)
+        return queries @ self.embeddings.T
+
+    def search(self, query_embeddings: Sequence[Sequence[float]], n_results: int,
+               filters: Optional[Dict[str, List[str]]] = None, filter_index=None) -> List[List[str]]:
+        total = len(self.ids)
+        if not total or n_results <= 0:
+            return [[] for _ in query_embeddings]
+        scores = self.scores(query_embeddings)
+        allowed = self._allowed(filters, filter_index)
+        if allowed is not None:
+            scores[:, ~allowed] = -np.inf
+            total = int(allowed.sum())
+        k = min(n_results, total)
+        if k <= 0:
+            return [[] for _ in range(scores.shape[0])]
+        if k < scores.shape[1]:
+            # argpartition 只保证前 k 个是最大的 k 个，再对这 k 个排序
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(scores.shape[1]), (scores.shape[0], scores.shape[1]))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        ranked = np.take_along_axis(top, order, axis=1)
+        return [[self.ids[i] for i in row] for row in ranked.tolist()]
+
+    def _read_record(self, position: int) -> Dict[str, Any]:
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        return json.loads(os.pread(self._records_fd, end - start, start))
+
+    def get(self, ids: List[str]) -> Dict[str, list]:
+        found_ids, metadatas, documents = [], [], []
+        for doc_id in ids:
+            position = self.positions.get(doc_id)
+            if position is None:
+                continue
+            record = self._read_record(position)
+            found_ids.append(doc_id)
+            metadatas.append(record.get("metadata") or {})
+            documents.append(record.get("document") or "")
+        return {"ids": found_ids, "metadatas": metadatas, "documents": documents}
+
+    def iter_metadata(self, page_size: int = EXPORT_PAGE_SIZE) -> Iterator[Tuple[List[str], List[Dict[str, Any]]]]:
+        with open(os.path.join(self.directory, FILTER_METADATA_FILE), encoding="utf-8") as f:
+            metadatas = json.load(f)
+        for start in range(0, len(self.ids), page_size):
+            yield self.ids[start:start + page_size], metadatas[start:start + page_size]
+
+    def close(self):
+        if self._records_fd is not None:
+            os.close(self._records_fd)
+            self._records_fd = None
+
+    def __del__(self):
+        # 集合注册表淘汰时只丢弃引用，仍在进行的流式响应读完后才关闭描述符
+        if getattr(self, "_records_fd", None) is not None:
+            self.close()
+
+
+def open_vector_store(backend: Optional[str], chroma_path: str, collection_name: str, numpy_path: str,
+                      memory_limit_bytes: Optional[int] = None):
+    backend = backend or VECTOR_BACKEND
+    if backend == "numpy":
+        return NumpyVectorStore.open(numpy_path)
+    if backend == "chroma":
+        return ChromaVectorStore.open(chroma_path, collection_name, memory_limit_bytes)
+    raise ValueError(f"Unknown vector backend: {backend} (expected 'chroma' or 'numpy')")
+
+
+def export_numpy_index(collection, output_dir: str, page_size: int = EXPORT_PAGE_SIZE) -> Dict[str, Any]:
+    """
+    把 ChromaDB 集合导出为 NumPy 索引目录。先写入临时目录，再把旧目录改名移开后换入，
+    正在运行的 API 不会读到写了一半的文件，也几乎不会遇到目录不存在
+    """
+    start = time.perf_counter()
+    tmp_dir = output_dir.rstrip(os.sep) + ".tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    ids: List[str] = []
+    vectors: List[np.ndarray] = []
+    offsets = [0]
+    filter_metadata = []
+    with open(os.path.join(tmp_dir, RECORDS_FILE), "wb") as records:
+        offset = 0
+        while True:
+            page = collection.get(include=["embeddings", "metadatas", "documents"], limit=page_size, offset=offset)
+            page_ids = page.get("ids") or []
+            if not page_ids:
+                break
+            for k, doc_id in enumerate(page_ids):
+                metadata = page["metadatas"][k] or {}
+                line = json.dumps(
+                    {"metadata": metadata, "document": page["documents"][k] or ""},
+                    ensure_ascii=False, separators=(",", ":"),
+                ).encode("utf-8") + b"\n"
+                records.write(line)
+                offsets.append(offsets[-1] + len(line))
+                ids.append(doc_id)
+                vectors.append(np.asarray(page["embeddings"][k], dtype=np.float32))
+                filter_metadata.append({key: value for key, value in metadata.items() if key not in _LARGE_METADATA_KEYS})
+            offset += len(page_ids)
+            if len(page_ids) < page_size:
+                break
+
+    matrix = np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+    if len(matrix):
+        matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+    np.save(os.path.join(tmp_dir, EMBEDDINGS_FILE), matrix)
+    np.save(os.path.join(tmp_dir, OFFSETS_FILE), np.asarray(offsets, dtype=np.int64))
+    with open(os.path.join(tmp_dir, IDS_FILE), "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+    with open(os.path.join(tmp_dir, FILTER_METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump(filter_metadata, f, ensure_ascii=False, separators=(",", ":"))
+    manifest = {
+        "count": len(ids),
+        "dimension": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        "embeddings_bytes": int(matrix.nbytes),
+        "records_bytes": offsets[-1],
+        "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "export_seconds": round(time.perf_counter() - start, 3),
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    # 旧索引先改名移开再删除: 目录缺失的窗口只有两次 rename 之间，而不是整个 rmtree 期间。
+    # 已打开的旧索引 (mmap 和描述符) 在删除后仍可读，直到 API 重新打开集合
+    old_dir = output_dir.rstrip(os.sep) + ".old"
+    if os.path.exists(old_dir):
+        shutil.rmtree(old_dir)
+    if os.path.exists(output_dir):
+        os.replace(output_dir, old_dir)
+    os.replace(tmp_dir, output_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return manifest